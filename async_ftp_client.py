@@ -0,0 +1,342 @@
+# Asyncio FTP/FTPS Client
+# Non-blocking alternative to the ftplib-based functions in ftp_client_core, so one event
+# loop can drive many control and data connections without a thread per connection.
+# Errors are raised as the same ftplib exception types (error_perm, error_temp, ...).
+
+import asyncio
+import ftplib
+import ssl
+
+import ftp_client_core
+import hashing
+
+BLOCK_SIZE = 64 * 1024
+
+
+class AsyncFTPClient:
+    """
+    One FTP/FTPS control connection driven by asyncio. Only passive mode is supported.
+    Commands on the same client are serialized; use several clients for concurrency.
+    """
+
+    def __init__(self, encoding='utf-8', timeout=60):
+        self.encoding = encoding
+        self.timeout = timeout
+        self.host = None
+        self.port = None
+        self.secure = False
+        self.ssl_context = None
+        self.server_features = None
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+    # --- Control channel -------------------------------------------------
+
+    async def _read_line(self):
+        line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+        if not line:
+            raise EOFError("Control connection closed by server.")
+        return line.decode(self.encoding, errors='replace').rstrip('\r\n')
+
+    async def _read_response(self):
+        """Reads a (possibly multi-line) reply and raises the matching ftplib error for 4xx/5xx."""
+        line = await self._read_line()
+        lines = [line]
+        if line[3:4] == '-':
+            code = line[:3]
+            while True:
+                line = await self._read_line()
+                lines.append(line)
+                if line[:3] == code and line[3:4] != '-':
+                    break
+        resp = '\n'.join(lines)
+        first = resp[:1]
+        if first in ('1', '2', '3'):
+            return resp
+        if first == '4':
+            raise ftplib.error_temp(resp)
+        if first == '5':
+            raise ftplib.error_perm(resp)
+        raise ftplib.error_proto(resp)
+
+    async def _send(self, cmd):
+        self._writer.write((cmd + '\r\n').encode(self.encoding))
+        await self._writer.drain()
+
+    async def sendcmd(self, cmd):
+        async with self._lock:
+            await self._send(cmd)
+            return await self._read_response()
+
+    async def voidcmd(self, cmd):
+        resp = await self.sendcmd(cmd)
+        if resp[:1] != '2':
+            raise ftplib.error_reply(resp)
+        return resp
+
+    # --- Connection ------------------------------------------------------
+
+    async def connect(self, host, port=21, username=None, password=None, secure=False):
+        """Connects and logs in (anonymously without credentials). FTPS uses explicit AUTH TLS."""
+        self.host = host
+        self.port = port or 21
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+        await self._read_response() # 220 welcome
+
+        if secure:
+            if not hasattr(self._writer, 'start_tls'):
+                raise RuntimeError("Async FTPS needs Python 3.11+ (StreamWriter.start_tls).")
+            self.ssl_context = ssl.create_default_context()
+            self.ssl_context.check_hostname = False
+            self.ssl_context.verify_mode = ssl.CERT_NONE # Same as ftplib.FTP_TLS's default
+            await self.voidcmd('AUTH TLS')
+            await self._writer.start_tls(self.ssl_context, server_hostname=self.host)
+            self.secure = True
+
+        resp = await self.sendcmd(f'USER {username or "anonymous"}')
+        if resp[:1] == '3':
+            resp = await self.sendcmd(f'PASS {password if username else "anonymous@"}')
+        if resp[:1] != '2':
+            raise ftplib.error_reply(resp)
+
+        if self.secure:
+            await self.voidcmd('PBSZ 0')
+            await self.voidcmd('PROT P')
+        await self.voidcmd('TYPE I')
+        print(f"Successfully connected (async {'FTPS' if secure else 'FTP'}) to {host} as {username or 'anonymous'}")
+        return self
+
+    async def quit(self):
+        if not self._writer:
+            return
+        try:
+            await self.sendcmd('QUIT')
+        except (ftplib.all_errors + (asyncio.TimeoutError,)):
+            pass
+        finally:
+            self._writer.close()
+            self._writer = None
+
+    # --- Data channel ----------------------------------------------------
+
+    async def _open_data_connection(self, cmd):
+        """Sends PASV and cmd on the control channel, returns the data (reader, writer). Caller holds the lock."""
+        await self._send('PASV')
+        host, port = ftplib.parse227(await self._read_response())
+        ssl_args = {'ssl': self.ssl_context, 'server_hostname': self.host} if self.secure else {}
+        data_conn = asyncio.open_connection(host, port, **ssl_args)
+        await self._send(cmd)
+        data_reader, data_writer = await asyncio.wait_for(data_conn, self.timeout)
+        try:
+            resp = await self._read_response()
+        except BaseException: # 4xx/5xx replies are raised
+            data_writer.close()
+            raise
+        if resp[:1] != '1':
+            data_writer.close()
+            raise ftplib.error_reply(resp)
+        return data_reader, data_writer
+
+    async def _finish_transfer(self, data_writer):
+        """Closes the data connection and reads the final reply. Caller holds the lock."""
+        data_writer.close()
+        try:
+            await data_writer.wait_closed()
+        except (OSError, ssl.SSLError):
+            pass
+        resp = await self._read_response() # 226
+        if resp[:1] != '2':
+            raise ftplib.error_reply(resp)
+        return resp
+
+    async def _abort_transfer(self, data_writer):
+        """Closes the data connection of a transfer that failed on our side and reads the server's final reply."""
+        try:
+            await self._finish_transfer(data_writer)
+        except (ftplib.all_errors + (asyncio.TimeoutError,)):
+            pass
+
+    async def _transfer(self, cmd, move_data):
+        """
+        Runs cmd with a data connection, awaiting move_data(data_reader, data_writer) to move
+        the data. The control channel is held from PASV until the final reply, so no other
+        command's reply read can pick up this transfer's 226.
+        """
+        async with self._lock:
+            data_reader, data_writer = await self._open_data_connection(cmd)
+            try:
+                await move_data(data_reader, data_writer)
+            except BaseException: # Cancelled too: the final reply must still be read
+                await self._abort_transfer(data_writer) # Keeps the control channel in step for the next command
+                raise
+            finally:
+                data_writer.close()
+            return await self._finish_transfer(data_writer)
+
+    async def retrlines(self, cmd, callback):
+        async def receive_lines(data_reader, data_writer):
+            while True:
+                line = await data_reader.readline()
+                if not line:
+                    break
+                callback(line.decode(self.encoding, errors='replace').rstrip('\r\n'))
+        return await self._transfer(cmd, receive_lines)
+
+    # --- Operations (same surface as ftp_client_core) --------------------
+
+    async def features(self):
+        """FEAT keywords (upper case), fetched once per connection."""
+        if self.server_features is None:
+            self.server_features = set()
+            try:
+                for line in (await self.sendcmd('FEAT')).splitlines()[1:-1]:
+                    parts = line.strip().split(None, 1)
+                    if parts:
+                        self.server_features.add(parts[0].upper())
+            except ftplib.error_perm:
+                pass
+        return self.server_features
+
+    async def list_directory(self, path="."):
+        """Returns entries like ftp_client_core.list_directory, using MLSD when the server has it."""
+        if 'MLST' in await self.features():
+            cmd, parse_line = f'MLSD {path}', ftp_client_core.parse_mlsd_line
+        else:
+            cmd, parse_line = f'LIST {path}', ftp_client_core.parse_list_line
+        entries = []
+        def on_line(line):
+            entry = parse_line(line)
+            if entry:
+                entries.append(entry)
+        await self.retrlines(cmd, on_line)
+        return entries
+
+    async def upload_file(self, local_path, remote_path, verify_integrity=False):
+        local_md5 = hashing.new_hasher('MD5') if verify_integrity else None # Hashed on the way out
+
+        async def send(data_reader, data_writer):
+            with open(local_path, 'rb') as f:
+                while True:
+                    block = f.read(BLOCK_SIZE)
+                    if not block:
+                        break
+                    if local_md5:
+                        local_md5.update(block)
+                    data_writer.write(block)
+                    await data_writer.drain()
+            if data_writer.can_write_eof():
+                data_writer.write_eof()
+
+        await self._transfer(f'STOR {remote_path}', send)
+        print(f"Successfully uploaded (async) {local_path} to {remote_path}")
+        if verify_integrity:
+            await self._verify(local_path, remote_path, local_md5.hexdigest())
+
+    async def download_file(self, remote_path, local_path, verify_integrity=False):
+        local_md5 = hashing.new_hasher('MD5') if verify_integrity else None
+
+        async def receive(data_reader, data_writer):
+            with open(local_path, 'wb') as f:
+                while True:
+                    block = await data_reader.read(BLOCK_SIZE)
+                    if not block:
+                        break
+                    if local_md5:
+                        local_md5.update(block)
+                    f.write(block)
+
+        await self._transfer(f'RETR {remote_path}', receive)
+        print(f"Successfully downloaded (async) {remote_path} to {local_path}")
+        if verify_integrity:
+            await self._verify(local_path, remote_path, local_md5.hexdigest())
+
+    async def delete_file(self, remote_path):
+        return await self.voidcmd(f'DELE {remote_path}')
+
+    async def rename_file(self, from_path, to_path):
+        resp = await self.sendcmd(f'RNFR {from_path}')
+        if resp[:1] != '3':
+            raise ftplib.error_reply(resp)
+        return await self.voidcmd(f'RNTO {to_path}')
+
+    async def make_directory(self, dir_name):
+        return await self.voidcmd(f'MKD {dir_name}')
+
+    async def get_remote_md5(self, remote_path):
+        """XMD5, then MD5. Returns the lowercase hash or None if the server has neither."""
+        for command in ('XMD5', 'MD5'):
+            try:
+                md5_hash = ftp_client_core.parse_md5_response(await self.sendcmd(f'{command} {remote_path}'))
+                if md5_hash:
+                    return md5_hash
+            except ftplib.error_perm as e:
+                print(f"{command} command failed for {remote_path}: {e}")
+        return None
+
+    async def _verify(self, local_path, remote_path, local_md5=None):
+        remote_md5 = await self.get_remote_md5(remote_path)
+        if not remote_md5:
+            print(f"Warning: Could not verify integrity for {remote_path}. Server might not support XMD5/MD5 command.")
+            return
+        if local_md5 is None:
+            local_md5 = await asyncio.get_running_loop().run_in_executor(None, hashing.hash_local_file, local_path, 'MD5')
+        if local_md5 != remote_md5:
+            raise ftp_client_core.IntegrityCheckFailedError(
+                f"Integrity check FAILED for {remote_path}. Local MD5: {local_md5}, Remote MD5: {remote_md5}")
+        print(f"Integrity check PASSED for {remote_path}.")
+
+
+async def connect_server(host, port=None, username=None, password=None, security_type="FTP"):
+    """Async counterpart of ftp_client_core.connect_server for FTP and FTPS."""
+    if security_type in ("None", "FTP"):
+        secure = False
+    elif security_type == "FTPS (SSL/TLS)":
+        secure = True
+    else:
+        raise ValueError(f"Unsupported security type for the async client: {security_type}")
+    return await AsyncFTPClient().connect(host, int(port) if port else 21, username, password, secure)
+
+
+async def transfer_many(connect_kwargs, jobs, max_connections=16, verify_integrity=False):
+    """
+    Runs many (direction, local_path, remote_path) jobs over up to max_connections
+    concurrent control connections on the current event loop.
+    Returns a list of (job, error) with error None on success.
+    """
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    results = []
+
+    async def worker():
+        try:
+            client = await connect_server(**connect_kwargs)
+        except Exception as e:
+            print(f"Async worker could not connect: {e}")
+            return
+        try:
+            while True:
+                try:
+                    job = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                direction, local_path, remote_path = job
+                try:
+                    if direction == 'upload':
+                        await client.upload_file(local_path, remote_path, verify_integrity)
+                    else:
+                        await client.download_file(remote_path, local_path, verify_integrity)
+                    results.append((job, None))
+                except Exception as e:
+                    print(f"Async {direction} of {local_path} failed: {e}")
+                    results.append((job, e))
+        finally:
+            await client.quit()
+
+    worker_count = max(1, min(max_connections, queue.qsize()))
+    await asyncio.gather(*(worker() for _ in range(worker_count)))
+    while not queue.empty(): # Left over only if no worker could connect
+        results.append((queue.get_nowait(), ConnectionError("No connection could be established.")))
+    return results
@@ -4,8 +4,8 @@ from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFormLayout,
                              QCheckBox, QSpinBox, QTabWidget, QWidget,
                              QTreeWidget, QTreeWidgetItem, QGroupBox,
                              QDialogButtonBox, QMessageBox, QTextEdit, QAction, 
-                             QFileDialog, QMainWindow) # QMainWindow, QTextEdit, QAction, QFileDialog explicitly added
-from PyQt5.QtCore import Qt, QDir # QDir explicitly added
+                             QFileDialog, QMainWindow, QTimeEdit) # QMainWindow, QTextEdit, QAction, QFileDialog explicitly added
+from PyQt5.QtCore import Qt, QDir, QTime # QDir explicitly added
 from PyQt5.QtGui import QFont, QIcon # QFont, QIcon explicitly added
 import json # Added for session saving
 import os   # Added for session saving and file path handling
@@ -17,7 +17,7 @@ class QuickConnectDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle('Quick Connect')
-        self.setFixedSize(400, 300)
+        self.setFixedSize(400, 600)
         self.initUI()
         self.load_last_session() # Load session on initialization
 
@@ -62,8 +62,59 @@ class QuickConnectDialog(QDialog):
         self.integrity_check_check.setChecked(False) # Default to off
         options_layout.addWidget(self.integrity_check_check)
 
+        self.resume_check = QCheckBox("Resume partial transfers")
+        self.resume_check.setChecked(True)
+        options_layout.addWidget(self.resume_check)
+
+        self.connections_spin = QSpinBox()
+        self.connections_spin.setRange(1, 32)
+        self.connections_spin.setValue(4)
+        options_layout.addWidget(QLabel('Simultaneous transfers:'))
+        options_layout.addWidget(self.connections_spin)
+
         layout.addWidget(options_group)
 
+        # Transfer tuning
+        tuning_group = QGroupBox('Transfer Tuning')
+        tuning_layout = QFormLayout(tuning_group)
+
+        self.block_size_spin = QSpinBox()
+        self.block_size_spin.setRange(8, 16384)
+        self.block_size_spin.setSuffix(' KB')
+        self.block_size_spin.setValue(256)
+        tuning_layout.addRow('Block size:', self.block_size_spin)
+
+        self.socket_buffer_spin = QSpinBox()
+        self.socket_buffer_spin.setRange(0, 65536)
+        self.socket_buffer_spin.setSuffix(' KB')
+        self.socket_buffer_spin.setSpecialValueText('System default') # 0
+        tuning_layout.addRow('Socket buffers:', self.socket_buffer_spin)
+
+        self.tcp_nodelay_check = QCheckBox('TCP_NODELAY on data connections')
+        tuning_layout.addRow(self.tcp_nodelay_check)
+
+        self.auto_tune_check = QCheckBox('Auto-tune after connecting (sends a probe file)')
+        tuning_layout.addRow(self.auto_tune_check)
+
+        layout.addWidget(tuning_group)
+
+        # Bandwidth
+        bandwidth_group = QGroupBox('Bandwidth')
+        bandwidth_layout = QFormLayout(bandwidth_group)
+
+        self.speed_limit_spin = QSpinBox()
+        self.speed_limit_spin.setRange(0, 10000000)
+        self.speed_limit_spin.setSuffix(' KB/s')
+        self.speed_limit_spin.setSpecialValueText('Unlimited') # 0
+        bandwidth_layout.addRow('Site speed limit:', self.speed_limit_spin)
+
+        self.priority_combo = QComboBox()
+        self.priority_combo.addItems(['High', 'Normal', 'Low'])
+        self.priority_combo.setCurrentText('Normal')
+        bandwidth_layout.addRow('Queue priority:', self.priority_combo)
+
+        layout.addWidget(bandwidth_group)
+
         # Buttons
         button_layout = QHBoxLayout()
         self.connect_btn = QPushButton('Connect')
@@ -84,7 +135,15 @@ class QuickConnectDialog(QDialog):
             'port': self.port_spin.value(),
             'passive': self.passive_check.isChecked(),
             'security': self.secure_combo.currentText(),
-            'verify_integrity': self.integrity_check_check.isChecked()
+            'verify_integrity': self.integrity_check_check.isChecked(),
+            'max_connections': self.connections_spin.value(),
+            'resume': self.resume_check.isChecked(),
+            'block_size_kb': self.block_size_spin.value(),
+            'socket_buffer_kb': self.socket_buffer_spin.value(),
+            'tcp_nodelay': self.tcp_nodelay_check.isChecked(),
+            'auto_tune': self.auto_tune_check.isChecked(),
+            'speed_limit_kbps': self.speed_limit_spin.value(),
+            'priority': self.priority_combo.currentText()
         }
 
     def load_last_session(self):
@@ -101,6 +160,14 @@ class QuickConnectDialog(QDialog):
                 if index != -1:
                     self.secure_combo.setCurrentIndex(index)
                 self.integrity_check_check.setChecked(details.get('verify_integrity', False))
+                self.connections_spin.setValue(details.get('max_connections', 4))
+                self.resume_check.setChecked(details.get('resume', True))
+                self.block_size_spin.setValue(details.get('block_size_kb', 256))
+                self.socket_buffer_spin.setValue(details.get('socket_buffer_kb', 0))
+                self.tcp_nodelay_check.setChecked(details.get('tcp_nodelay', False))
+                self.auto_tune_check.setChecked(details.get('auto_tune', False))
+                self.speed_limit_spin.setValue(details.get('speed_limit_kbps', 0))
+                self.priority_combo.setCurrentText(details.get('priority', 'Normal'))
             except Exception as e:
                 print(f"Error loading last session: {e}")
 
@@ -229,8 +296,54 @@ class SiteManagerDialog(QDialog):
         self.integrity_check_check = QCheckBox("Verify file integrity after transfer (FTP/FTPS only)")
         self.integrity_check_check.setChecked(False) # Default to off
         transfer_layout.addWidget(self.integrity_check_check)
+
+        connections_layout = QFormLayout()
+        self.connections_spin = QSpinBox()
+        self.connections_spin.setRange(1, 32)
+        self.connections_spin.setValue(4)
+        connections_layout.addRow('Simultaneous transfers:', self.connections_spin)
+        transfer_layout.addLayout(connections_layout)
         
         options_layout.addWidget(transfer_group)
+
+        tuning_group = QGroupBox('Transfer Tuning')
+        tuning_layout = QFormLayout(tuning_group)
+
+        self.block_size_spin = QSpinBox()
+        self.block_size_spin.setRange(8, 16384)
+        self.block_size_spin.setSuffix(' KB')
+        self.block_size_spin.setValue(256)
+        tuning_layout.addRow('Block size:', self.block_size_spin)
+
+        self.socket_buffer_spin = QSpinBox()
+        self.socket_buffer_spin.setRange(0, 65536)
+        self.socket_buffer_spin.setSuffix(' KB')
+        self.socket_buffer_spin.setSpecialValueText('System default')
+        tuning_layout.addRow('Socket buffers:', self.socket_buffer_spin)
+
+        self.tcp_nodelay_check = QCheckBox('TCP_NODELAY on data connections')
+        tuning_layout.addRow(self.tcp_nodelay_check)
+
+        self.auto_tune_check = QCheckBox('Auto-tune block and buffer sizes after connecting')
+        tuning_layout.addRow(self.auto_tune_check)
+
+        options_layout.addWidget(tuning_group)
+
+        bandwidth_group = QGroupBox('Bandwidth')
+        bandwidth_layout = QFormLayout(bandwidth_group)
+
+        self.speed_limit_spin = QSpinBox()
+        self.speed_limit_spin.setRange(0, 10000000)
+        self.speed_limit_spin.setSuffix(' KB/s')
+        self.speed_limit_spin.setSpecialValueText('Unlimited')
+        bandwidth_layout.addRow('Site speed limit:', self.speed_limit_spin)
+
+        self.priority_combo = QComboBox()
+        self.priority_combo.addItems(['High', 'Normal', 'Low'])
+        self.priority_combo.setCurrentText('Normal')
+        bandwidth_layout.addRow('Queue priority:', self.priority_combo)
+
+        options_layout.addWidget(bandwidth_group)
         options_layout.addStretch()
         
         tabs.addTab(options_tab, 'Options')
@@ -240,6 +353,7 @@ class SiteManagerDialog(QDialog):
 
         # Bottom buttons
         button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.button(QDialogButtonBox.Ok).setText('Connect')
         button_box.accepted.connect(self.accept)
         button_box.rejected.connect(self.reject)
         
@@ -249,10 +363,101 @@ class SiteManagerDialog(QDialog):
         
         self.setLayout(main_layout)
 
+    def get_connection_details(self):
+        """The selected site's settings, with the same keys as QuickConnectDialog's."""
+        return {
+            'host': self.host_edit.text(),
+            'username': self.username_edit.text(),
+            'password': self.password_edit.text(),
+            'port': self.port_spin.value(),
+            'passive': self.passive_check.isChecked(),
+            'security': self.security_combo.currentText(),
+            'verify_integrity': self.integrity_check_check.isChecked(),
+            'max_connections': self.connections_spin.value(),
+            'resume': self.auto_resume_check.isChecked(),
+            'block_size_kb': self.block_size_spin.value(),
+            'socket_buffer_kb': self.socket_buffer_spin.value(),
+            'tcp_nodelay': self.tcp_nodelay_check.isChecked(),
+            'auto_tune': self.auto_tune_check.isChecked(),
+            'speed_limit_kbps': self.speed_limit_spin.value(),
+            'priority': self.priority_combo.currentText()
+        }
+
+class SpeedLimitDialog(QDialog):
+    """Global speed limit for all transfers, optionally only in force during working hours."""
+
+    def __init__(self, settings=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Speed Limit')
+        self.initUI()
+        self.set_settings(settings or {})
+
+    def initUI(self):
+        layout = QVBoxLayout(self)
+        form_layout = QFormLayout()
+
+        self.global_limit_spin = QSpinBox()
+        self.global_limit_spin.setRange(0, 10000000)
+        self.global_limit_spin.setSuffix(' KB/s')
+        self.global_limit_spin.setSpecialValueText('Unlimited')
+        form_layout.addRow('All transfers:', self.global_limit_spin)
+        layout.addLayout(form_layout)
+
+        schedule_group = QGroupBox('Only during these hours')
+        schedule_group.setCheckable(True)
+        schedule_group.setChecked(False)
+        self.schedule_group = schedule_group
+        schedule_layout = QFormLayout(schedule_group)
+
+        self.start_time_edit = QTimeEdit(QTime(8, 0))
+        self.start_time_edit.setDisplayFormat('HH:mm')
+        schedule_layout.addRow('From:', self.start_time_edit)
+
+        self.end_time_edit = QTimeEdit(QTime(18, 0))
+        self.end_time_edit.setDisplayFormat('HH:mm')
+        schedule_layout.addRow('To:', self.end_time_edit)
+
+        self.weekdays_only_check = QCheckBox('Monday to Friday only')
+        self.weekdays_only_check.setChecked(True)
+        schedule_layout.addRow(self.weekdays_only_check)
+
+        self.off_hours_limit_spin = QSpinBox()
+        self.off_hours_limit_spin.setRange(0, 10000000)
+        self.off_hours_limit_spin.setSuffix(' KB/s')
+        self.off_hours_limit_spin.setSpecialValueText('Unlimited')
+        schedule_layout.addRow('Other times:', self.off_hours_limit_spin)
+
+        layout.addWidget(schedule_group)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+    def get_settings(self):
+        return {
+            'global_limit_kbps': self.global_limit_spin.value(),
+            'scheduled': self.schedule_group.isChecked(),
+            'start': self.start_time_edit.time().toString('HH:mm'),
+            'end': self.end_time_edit.time().toString('HH:mm'),
+            'weekdays_only': self.weekdays_only_check.isChecked(),
+            'off_hours_limit_kbps': self.off_hours_limit_spin.value()
+        }
+
+    def set_settings(self, settings):
+        self.global_limit_spin.setValue(settings.get('global_limit_kbps', 0))
+        self.schedule_group.setChecked(settings.get('scheduled', False))
+        self.start_time_edit.setTime(QTime.fromString(settings.get('start', '08:00'), 'HH:mm'))
+        self.end_time_edit.setTime(QTime.fromString(settings.get('end', '18:00'), 'HH:mm'))
+        self.weekdays_only_check.setChecked(settings.get('weekdays_only', True))
+        self.off_hours_limit_spin.setValue(settings.get('off_hours_limit_kbps', 0))
+
 # NEW CLASS: Text Editor Dialog
 class TextEditorDialog(QMainWindow): # QMainWindow explicitly imported from QtWidgets at top
-    def __init__(self, parent=None, file_path=None, is_remote=False, ftp_client=None, remote_current_path=None):
+    def __init__(self, parent=None, file_path=None, is_remote=False, ftp_client=None, remote_current_path=None, *, job_runner):
         super().__init__(parent)
+        # The main window's runner, so editor I/O is serialized with other work on the shared ftp_client
+        self.job_runner = job_runner
         self.file_path = file_path # Local path for the temp file (if remote), or actual local file
         self.is_remote = is_remote
         self.ftp_client = ftp_client # The connected FTP/SFTP client object
@@ -306,16 +511,11 @@ class TextEditorDialog(QMainWindow): # QMainWindow explicitly imported from QtWi
                         QDir().mkpath(temp_dir)
 
                     remote_full_path = os.path.join(self.remote_current_path, self.original_remote_file_name).replace('\\', '/')
-                    
-                    try:
-                        ftp_client_core.download_file(self.ftp_client, remote_full_path, self.local_temp_file_path)
-                    except Exception as e:
-                        raise IOError(f"Failed to download remote file: {e}")
-                    
-                    with open(self.local_temp_file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    self.text_edit.setText(content)
-                    self.setWindowTitle(f"Editing (Remote): {self.original_remote_file_name}")
+
+                    self.text_edit.setReadOnly(True) # Until the download arrives
+                    self.text_edit.setText(f"Downloading {remote_full_path}...")
+                    self.job_runner.submit(ftp_client_core.download_file, self.ftp_client, remote_full_path, self.local_temp_file_path,
+                                           on_finished=self._remote_file_downloaded)
                 elif not self.is_remote and os.path.exists(self.file_path):
                     with open(self.file_path, 'r', encoding='utf-8') as f:
                         content = f.read()
@@ -329,6 +529,21 @@ class TextEditorDialog(QMainWindow): # QMainWindow explicitly imported from QtWi
                 self.text_edit.setText(f"Error loading file: {e}")
                 self.setWindowTitle(f"Error: {self.original_remote_file_name or os.path.basename(self.file_path)}")
 
+    def _remote_file_downloaded(self, success, message):
+        self.text_edit.setReadOnly(False)
+        try:
+            if not success:
+                raise IOError(f"Failed to download remote file: {message}")
+            with open(self.local_temp_file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            self.text_edit.setText(content)
+            self.text_edit.document().setModified(False)
+            self.setWindowTitle(f"Editing (Remote): {self.original_remote_file_name}")
+        except Exception as e:
+            QMessageBox.critical(self, "Load Error", f"Could not load file: {e}")
+            self.text_edit.setText(f"Error loading file: {e}")
+            self.setWindowTitle(f"Error: {self.original_remote_file_name}")
+
     def save_file(self):
         content = self.text_edit.toPlainText()
         try:
@@ -340,9 +555,15 @@ class TextEditorDialog(QMainWindow): # QMainWindow explicitly imported from QtWi
                 
                 # Then upload the temporary file to overwrite the remote file
                 remote_full_path = os.path.join(self.remote_current_path, self.original_remote_file_name).replace('\\', '/')
-                ftp_client_core.upload_file(self.ftp_client, self.local_temp_file_path, remote_full_path)
-                QMessageBox.information(self, "Save Successful", f"Remote file '{self.original_remote_file_name}' saved.")
-                self.text_edit.document().setModified(False) # Mark as saved
+                self.text_edit.document().setModified(False) # Mark as saved; set again below if the upload fails
+
+                def on_error(e):
+                    self.text_edit.document().setModified(True)
+                    QMessageBox.critical(self, "Save Error", f"Could not save file: {e}")
+
+                self.job_runner.submit(ftp_client_core.upload_file, self.ftp_client, self.local_temp_file_path, remote_full_path,
+                                       on_result=lambda result: QMessageBox.information(self, "Save Successful", f"Remote file '{self.original_remote_file_name}' saved."),
+                                       on_error=on_error)
             elif not self.is_remote and self.file_path:
                 with open(self.file_path, 'w', encoding='utf-8') as f:
                     f.write(content)
@@ -392,7 +613,8 @@ if __name__ == '__main__':
     site_manager.exec_()
     
     # Test Text Editor (standalone, for local file)
-    # editor_dialog = TextEditorDialog(file_path="test_local_file.txt", is_remote=False)
+    # from job_runner import JobRunner
+    # editor_dialog = TextEditorDialog(file_path="test_local_file.txt", is_remote=False, job_runner=JobRunner())
     # editor_dialog.show()
 
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,456 @@
+# File Pane Model
+# Directory listings for the local and remote file panes, kept as parallel compact arrays
+# (names plus packed type, size and time columns) behind a Qt model. Rows are handed to
+# the view a page at a time as it scrolls (canFetchMore/fetchMore), display text is only
+# built for rows on screen, and sorting and filtering reorder an index array instead of
+# rebuilding widgets, so a 200k-entry directory opens quickly and stays small in memory.
+
+import fnmatch
+import math
+import os
+import posixpath
+import time
+from array import array
+
+from PyQt5.QtCore import Qt, QAbstractItemModel, QAbstractTableModel, QModelIndex, QMimeData, QUrl
+from PyQt5.QtGui import QColor
+
+FETCH_BATCH = 1000 # Rows handed to the view per fetchMore()
+
+# Extra data roles
+TYPE_ROLE = Qt.UserRole # 'dir' or 'file'
+SIZE_ROLE = Qt.UserRole + 1
+PATH_ROLE = Qt.UserRole + 2 # Full path of the entry
+
+_DIR_COLOR = QColor(Qt.blue) # Indicates navigability
+_NO_TIME = float('nan')
+
+
+def _format_size(size):
+    if size < 1024:
+        return f"{size} B"
+    for unit in ('KB', 'MB', 'GB', 'TB'):
+        size /= 1024
+        if size < 1024 or unit == 'TB':
+            return f"{size:.1f} {unit}"
+
+
+class FileListModel(QAbstractTableModel):
+    """
+    Entries of one directory. Entries come in as listing dicts (see ftp_client_core.make_entry)
+    and are stored column-wise; a row is only an index into the visible order, which holds
+    the entries passing the filter, in sort order. join builds an entry's full path from the
+    directory and its name (os.path.join locally, posixpath.join for remote paths).
+    """
+    COLUMNS = ('Name', 'Size', 'Modified')
+
+    def __init__(self, join=os.path.join, draggable=False, parent=None):
+        super().__init__(parent)
+        self.join = join
+        self.draggable = draggable # Rows can be dragged out as file URLs (local pane)
+        self.directory = None
+        self._sort_column = None # None keeps listing order
+        self._sort_order = Qt.AscendingOrder
+        self._filter = ''
+        self._reset_storage()
+
+    def _reset_storage(self):
+        self._names = []
+        self._is_dir = bytearray()
+        self._sizes = array('q')
+        self._mtimes = array('d')
+        self._order = array('l') # Visible entries (indices into the columns), in display order
+        self._fetched = 0 # Leading part of _order the view has been given
+        self._file_count = 0
+        self._dir_count = 0
+        self._total_size = 0
+
+    # --- Qt model interface ----------------------------------------------
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._fetched
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._fetched < len(self._order)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        self._expose(min(len(self._order), self._fetched + FETCH_BATCH))
+
+    def _expose(self, count):
+        if count > self._fetched:
+            self.beginInsertRows(QModelIndex(), self._fetched, count - 1)
+            self._fetched = count
+            self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self._order[index.row()]
+        if role == Qt.DisplayRole:
+            column = index.column()
+            if column == 0:
+                return self._names[entry]
+            if column == 1:
+                size = self._sizes[entry]
+                return '' if self._is_dir[entry] or size < 0 else _format_size(size)
+            mtime = self._mtimes[entry]
+            return '' if math.isnan(mtime) else time.strftime('%Y-%m-%d %H:%M', time.localtime(mtime))
+        if role == Qt.ForegroundRole:
+            return _DIR_COLOR if self._is_dir[entry] else None
+        if role == Qt.TextAlignmentRole and index.column() == 1:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        if role == TYPE_ROLE:
+            return 'dir' if self._is_dir[entry] else 'file'
+        if role == SIZE_ROLE:
+            return max(self._sizes[entry], 0)
+        if role == PATH_ROLE:
+            return self.path(index.row())
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and self.draggable:
+            flags |= Qt.ItemIsDragEnabled
+        return flags
+
+    def mimeTypes(self):
+        return ['text/uri-list']
+
+    def mimeData(self, indexes):
+        """Dragged rows as file URLs, so they can be dropped on the transfer queue."""
+        mime = QMimeData()
+        rows = sorted({index.row() for index in indexes})
+        mime.setUrls([QUrl.fromLocalFile(self.path(row)) for row in rows])
+        return mime
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self._sort_column = column
+        self._sort_order = order
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList() # Selection and current row follow their entries
+        moved = [self._order[index.row()] for index in persistent]
+        self._order = self._sorted(self._order)
+        if persistent:
+            rows = {entry: row for row, entry in enumerate(self._order)}
+            self.changePersistentIndexList(persistent, [
+                self.index(rows[entry], index.column()) if rows[entry] < self._fetched else QModelIndex()
+                for entry, index in zip(moved, persistent)])
+        self.layoutChanged.emit()
+
+    # --- Entries ---------------------------------------------------------
+
+    def clear(self, directory=None):
+        """Empties the model for a new listing of directory."""
+        self.beginResetModel()
+        self.directory = directory
+        self._reset_storage()
+        self.endResetModel()
+
+    def set_entries(self, entries, directory=None):
+        """Replaces the listing with entries of directory, in one reset."""
+        self.beginResetModel()
+        self.directory = directory
+        self._reset_storage()
+        self._append(entries)
+        self._order = self._sorted(self._order)
+        self._fetched = min(len(self._order), FETCH_BATCH)
+        self.endResetModel()
+
+    def add_entries(self, entries):
+        """
+        Appends a batch of a listing that is still arriving. New entries go after the ones
+        already shown; resort() puts everything in sort order once the listing is complete.
+        """
+        self._append(entries)
+        if self._fetched < FETCH_BATCH: # Fill the first page; the view fetches the rest as it scrolls down
+            self._expose(min(len(self._order), FETCH_BATCH))
+
+    def _append(self, entries):
+        first = len(self._names)
+        for entry in entries:
+            is_dir = entry['type'] == 'dir'
+            size = entry.get('size')
+            mtime = entry.get('mtime')
+            self._names.append(entry['name'])
+            self._is_dir.append(is_dir)
+            self._sizes.append(-1 if size is None else size)
+            self._mtimes.append(_NO_TIME if mtime is None else mtime)
+            if is_dir:
+                self._dir_count += 1
+            else:
+                self._file_count += 1
+                self._total_size += size or 0
+        self._order.extend(self._matching(range(first, len(self._names))))
+
+    def resort(self):
+        """Puts the listing back in the current sort order (after add_entries)."""
+        if self._sort_column is not None:
+            self.sort(self._sort_column, self._sort_order)
+
+    def update_entries(self, entries):
+        """
+        Applies new or changed entries (matched by name), e.g. reported by a folder watcher,
+        without reloading the listing. New entries are put in sort order.
+        """
+        positions = {name: entry for entry, name in enumerate(self._names)}
+        new = []
+        changed = False
+        for entry in entries:
+            index = positions.get(entry['name'])
+            if index is None:
+                new.append(entry)
+                continue
+            if not self._is_dir[index]:
+                self._total_size -= max(self._sizes[index], 0)
+                self._total_size += entry.get('size') or 0
+            self._sizes[index] = -1 if entry.get('size') is None else entry['size']
+            self._mtimes[index] = _NO_TIME if entry.get('mtime') is None else entry['mtime']
+            changed = True
+        if changed and self._fetched: # The view only repaints what is on screen
+            self.dataChanged.emit(self.index(0, 0), self.index(self._fetched - 1, len(self.COLUMNS) - 1))
+        if new:
+            shown_all = self._fetched == len(self._order)
+            self._append(new)
+            if shown_all:
+                self._expose(min(len(self._order), self._fetched + FETCH_BATCH))
+            self.resort()
+
+    def remove_names(self, names):
+        """Drops the entries with these names (ones not listed are ignored)."""
+        names = set(names)
+        doomed = {entry for entry, name in enumerate(self._names) if name in names}
+        if not doomed:
+            return
+        rows = [row for row in range(self._fetched) if self._order[row] in doomed]
+        ranges = [] # (first, last) runs of rows the view has, ascending
+        for row in rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1] = (ranges[-1][0], row)
+            else:
+                ranges.append((row, row))
+        for first, last in reversed(ranges):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._order[first:last + 1]
+            self._fetched -= last - first + 1
+            self.endRemoveRows()
+
+        # Compact the columns; rows keep their positions, so the view needn't hear of it
+        remap = array('l', [-1]) * len(self._names)
+        names_kept, is_dir_kept, sizes_kept, mtimes_kept = [], bytearray(), array('q'), array('d')
+        for entry, name in enumerate(self._names):
+            if entry in doomed:
+                if self._is_dir[entry]:
+                    self._dir_count -= 1
+                else:
+                    self._file_count -= 1
+                    self._total_size -= max(self._sizes[entry], 0)
+                continue
+            remap[entry] = len(names_kept)
+            names_kept.append(name)
+            is_dir_kept.append(self._is_dir[entry])
+            sizes_kept.append(self._sizes[entry])
+            mtimes_kept.append(self._mtimes[entry])
+        self._names, self._is_dir, self._sizes, self._mtimes = names_kept, is_dir_kept, sizes_kept, mtimes_kept
+        self._order = array('l', [remap[entry] for entry in self._order if remap[entry] != -1])
+
+    def set_filter(self, text):
+        """
+        Shows only entries whose name contains text, ignoring case; text with wildcards
+        (*, ?, [...]) must match the whole name instead. An empty text shows everything.
+        """
+        self._filter = text.strip().lower()
+        self.beginResetModel()
+        self._order = self._sorted(array('l', self._matching(range(len(self._names)))))
+        self._fetched = min(len(self._order), FETCH_BATCH)
+        self.endResetModel()
+
+    def _matching(self, entries):
+        pattern = self._filter
+        if not pattern:
+            return entries
+        names = self._names
+        if any(char in pattern for char in '*?['):
+            return [entry for entry in entries if fnmatch.fnmatchcase(names[entry].lower(), pattern)]
+        return [entry for entry in entries if pattern in names[entry].lower()]
+
+    def _sorted(self, order):
+        """order in the current sort order, folders first either way."""
+        if self._sort_column is None:
+            return order
+        if self._sort_column == 0:
+            names = self._names
+            key = lambda entry: names[entry].lower()
+        elif self._sort_column == 1:
+            key = self._sizes.__getitem__
+        else:
+            mtimes = self._mtimes
+            key = lambda entry: -math.inf if math.isnan(mtimes[entry]) else mtimes[entry]
+        ordered = sorted(order, key=key, reverse=self._sort_order == Qt.DescendingOrder)
+        is_dir = self._is_dir
+        return array('l', [entry for entry in ordered if is_dir[entry]] + [entry for entry in ordered if not is_dir[entry]])
+
+    # --- Row access ------------------------------------------------------
+
+    def count(self):
+        """Entries passing the filter, including rows the view hasn't fetched yet."""
+        return len(self._order)
+
+    def name(self, row):
+        return self._names[self._order[row]]
+
+    def is_dir(self, row):
+        return bool(self._is_dir[self._order[row]])
+
+    def size(self, row):
+        return max(self._sizes[self._order[row]], 0)
+
+    def path(self, row):
+        return self.join(self.directory, self.name(row))
+
+    def row_of_name(self, name):
+        """The row showing name, or -1 (fetching it first if the view hasn't yet)."""
+        for row, entry in enumerate(self._order):
+            if self._names[entry] == name:
+                self._expose(row + 1)
+                return row
+        return -1
+
+    def summary(self):
+        """Totals of the whole listing, for the pane's status line."""
+        total = self._file_count + self._dir_count
+        return (f"{self._file_count} Files, {self._dir_count} Folders, {total} Total "
+                f"({self._total_size / (1024 * 1024):.1f} MB)")
+
+
+class RemoteFolderModel(QAbstractItemModel):
+    """
+    The remote folder tree: one row for the listed directory with ".." and its subfolders
+    below it. Subfolder names are kept in a plain list and handed to the view a page at a
+    time when it scrolls down, like FileListModel's rows, so a directory with many folders
+    costs no widget per folder.
+    """
+    _TOP = 0 # internalId of the directory row
+    _CHILD = 1 # internalId of the rows below it
+
+    def __init__(self, header='', parent=None):
+        super().__init__(parent)
+        self.header = header
+        self.directory = None # Listed remote directory, None while nothing is shown
+        self._children = [] # '..' (below the root) and subfolder names, in listing order
+        self._fetched = 0
+
+    # --- Qt model interface ----------------------------------------------
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        return self.createIndex(row, column, self._CHILD if parent.isValid() else self._TOP)
+
+    def parent(self, index):
+        if not index.isValid() or index.internalId() == self._TOP:
+            return QModelIndex()
+        return self.createIndex(0, 0, self._TOP)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return 0 if self.directory is None else 1
+        return self._fetched if parent.internalId() == self._TOP else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        if parent.isValid() and parent.internalId() == self._TOP:
+            return bool(self._children) # Before they are fetched, too
+        return self.rowCount(parent) > 0
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return parent.isValid() and parent.internalId() == self._TOP and self._fetched < len(self._children)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self._expose(min(len(self._children), self._fetched + FETCH_BATCH))
+
+    def _expose(self, count):
+        if count > self._fetched:
+            self.beginInsertRows(self.createIndex(0, 0, self._TOP), self._fetched, count - 1)
+            self._fetched = count
+            self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        is_top = index.internalId() == self._TOP
+        if role == Qt.DisplayRole:
+            return self.directory if is_top else self._children[index.row()]
+        if role == Qt.ForegroundRole:
+            return None if is_top else _DIR_COLOR
+        if role == TYPE_ROLE:
+            return 'dir'
+        if role == PATH_ROLE:
+            return self.path(index)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.header
+        return None
+
+    # --- Folders ---------------------------------------------------------
+
+    def set_header(self, header):
+        self.header = header
+        self.headerDataChanged.emit(Qt.Horizontal, 0, 0)
+
+    def clear(self, header=None):
+        """Shows no directory, with header as the column title if given."""
+        self.beginResetModel()
+        self.directory = None
+        self._children = []
+        self._fetched = 0
+        self.endResetModel()
+        if header is not None:
+            self.set_header(header)
+
+    def begin_listing(self, directory):
+        """Shows directory (and ".." unless it is the root) with no subfolders yet."""
+        self.beginResetModel()
+        self.directory = directory
+        self._children = ['..'] if directory != '/' else []
+        self._fetched = len(self._children)
+        self.endResetModel()
+
+    def add_folders(self, names):
+        """Appends subfolders of a listing that is still arriving, filling the first page."""
+        self._children.extend(names)
+        if self._fetched < FETCH_BATCH:
+            self._expose(min(len(self._children), FETCH_BATCH))
+
+    def top_index(self):
+        return self.index(0, 0) if self.directory is not None else QModelIndex()
+
+    def is_top(self, index):
+        return index.isValid() and index.internalId() == self._TOP
+
+    def path(self, index):
+        """The remote directory a row stands for, ending in '/' unless it is the root."""
+        if self.is_top(index):
+            target = self.directory
+        else:
+            name = self._children[index.row()]
+            if name == '..':
+                target = posixpath.dirname(self.directory.rstrip('/'))
+            else:
+                target = posixpath.join(self.directory, name)
+        target = posixpath.normpath(target or '/')
+        return target if target == '/' else target + '/'
@@ -1,15 +1,31 @@
 import sys
 import os
+import posixpath # Remote paths always use forward slashes
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
-                             QHBoxLayout, QTreeWidget, QTreeWidgetItem, QListWidget,
-                             QListWidgetItem, QSplitter, QMenuBar, QStatusBar,
+                             QHBoxLayout, QTreeWidget, QTreeWidgetItem, QListWidget, QSplitter,
+                             QMenuBar, QStatusBar,
                              QToolBar, QAction, QLabel, QProgressBar, QTabWidget,
-                             QPushButton, QMessageBox, QInputDialog) # Added QMessageBox, QInputDialog
+                             QPushButton, QMessageBox, QInputDialog, QFileDialog, QTableView,
+                             QAbstractItemView, QHeaderView, QTreeView, QLineEdit) # Added QMessageBox, QInputDialog
 from PyQt5.QtCore import Qt, QUrl # Added QUrl for local file system
-from PyQt5.QtGui import QIcon, QColor # Added QColor for item background
+from PyQt5.QtGui import QIcon
 import ftp_client_core # Import the ftp client core
-from ftp_client_core import IntegrityCheckFailedError # Import custom exception
-from dialogs import QuickConnectDialog, SiteManagerDialog # Import QuickConnectDialog and SiteManagerDialog
+from ftp_client_core import IntegrityCheckFailedError, ResumeJournal # Import custom exception
+from transfer_engine import TransferEngine, TransferJob, DEFAULT_MAX_CONNECTIONS
+from job_runner import JobRunner
+import sync_engine
+from remote_index import RemoteIndex
+from job_store import JobStore
+from file_pane_model import FileListModel, RemoteFolderModel
+import folder_watcher
+from folder_watcher import FolderWatcher, ADDED, REMOVED
+from queue_model import TransferQueueModel, QueueEntry, QUEUED, RUNNING, FAILED, CHECKSUM_MISMATCH
+import rate_limiter
+SEGMENTED_DOWNLOAD_THRESHOLD = 64 * 1024 * 1024 # Remote files at least this big are downloaded over several connections
+SYNC_INDEX_MAX_AGE = 24 * 3600 # Remote directories not listed for this long are re-listed before a sync
+LOCAL_CHILDREN_ROLE = Qt.UserRole + 1 # Local tree items: None until their subfolders are read, then 'loading'/'loaded'
+MAX_LOGGED_ITEMS = 100 # Batches larger than this are logged as one summary line instead of one line per item
+from dialogs import QuickConnectDialog, SiteManagerDialog, SpeedLimitDialog # Import QuickConnectDialog and SiteManagerDialog
 import ftplib # Add this line
 class FlashFXPClone(QMainWindow):
     def __init__(self):
@@ -18,10 +34,34 @@ class FlashFXPClone(QMainWindow):
         self.current_remote_path = "/" # Initialize current remote path
         self.local_tree_widget = None # Will be set in createFilePane
         self.local_file_list = None # Will be set in createFilePane
-        self.remote_tree_widget = None # Will be set in createFilePane
+        self.remote_tree_view = None # Will be set in createFilePane
+        self.remote_folder_model = None # Folders behind the remote tree, set in createFilePane
         self.remote_file_list = None # Will be set in createFilePane
-        self.current_transfer_settings = {'verify_integrity': False} # Store transfer settings
+        self.local_file_model = None # Listings behind the file lists, set in createFilePane
+        self.remote_file_model = None
+        self.local_pane_status = None # "n Files, n Folders" lines under the file lists
+        self.remote_pane_status = None
+        self.current_transfer_settings = {'verify_integrity': False, 'max_connections': DEFAULT_MAX_CONNECTIONS, 'resume': True,
+                                          'priority': rate_limiter.PRIORITY_NORMAL} # Store transfer settings
+        self.speed_limit_settings = {} # SpeedLimitDialog settings of the global limit
+        self.resume_journal = ResumeJournal() # Partial transfers survive restarts here
+        self.job_store = JobStore() # The upload queue survives restarts here
+        self.remote_index = RemoteIndex() # Remote tree state per site, so syncs needn't re-list everything
+        self.connection_pool = ftp_client_core.ConnectionPool(max_per_site=DEFAULT_MAX_CONNECTIONS) # Warm worker connections
+        self.connection_pool.start_keepalive()
+        self.connect_kwargs = None # connect_server() arguments of the current site, used to open worker connections
+        self.job_runner = JobRunner(self) # All network I/O runs here, off the GUI thread
+        self.current_local_path = os.path.expanduser("~")
+        self._local_tree_generation = 0 # Bumped whenever the local tree is rebuilt
+        self._local_listing = None # The local listing whose batches go to the file list
+        self.watch_local_folder = True # Apply changes to the listed local folder as they happen
+        self.local_watcher = FolderWatcher(parent=self) # Follows the folder shown in the local pane
+        self.local_watcher.changed.connect(self._apply_local_changes)
+        self.upload_watcher = None # FolderWatcher of "Watch Folder and Upload", while one runs
+        self.upload_watch_dir = None
+        self.deferred_watch_uploads = {} # Changed local path -> remote folder, held back while an upload of it runs
         self.initUI()
+        self._load_saved_queue()
         
         # Populate local files on startup
         self.populate_local_files(os.path.expanduser("~"), self.local_tree_widget, self.local_file_list)
@@ -38,30 +78,59 @@ class FlashFXPClone(QMainWindow):
             security_type = "FTP"
         passive_mode = details.get('passive', True)
         self.current_transfer_settings['verify_integrity'] = details.get('verify_integrity', False)
+        self.current_transfer_settings['max_connections'] = details.get('max_connections', DEFAULT_MAX_CONNECTIONS)
+        self.connection_pool.max_per_site = self.current_transfer_settings['max_connections']
+        self.current_transfer_settings['resume'] = details.get('resume', True)
+        self.current_transfer_settings['priority'] = rate_limiter.PRIORITY_NAMES.get(details.get('priority'), rate_limiter.PRIORITY_NORMAL)
 
-        print(f"Attempting to connect via connect_server with details: {details}")
-        try:
-            self.statusBar().showMessage(f"Connecting to {host} ({security_type})...")
-            self.ftp_connection = ftp_client_core.connect_server(
-                host, port, username, password, security_type, passive_mode
-            )
+        socket_buffer = details.get('socket_buffer_kb', 0) * 1024 or None # 0 keeps the OS default
+        tuning = ftp_client_core.make_transfer_tuning(details.get('block_size_kb', 256) * 1024, socket_buffer,
+                                                      socket_buffer, details.get('tcp_nodelay', False))
 
-            if self.ftp_connection:
+        print(f"Attempting to connect via connect_server with details: {details}")
+        # One tuning dict for the site: worker connections share it, so auto-tune results reach them too
+        connect_kwargs = {'host': host, 'port': port, 'username': username, 'password': password,
+                          'security_type': security_type, 'passive_mode': passive_mode, 'tuning': tuning}
+        rate_limiter.bandwidth_scheduler.set_site_limit(ftp_client_core.ConnectionPool.site_key(connect_kwargs),
+                                                        details.get('speed_limit_kbps', 0) * 1024 or None)
+        self.statusBar().showMessage(f"Connecting to {host} ({security_type})...")
+
+        def on_connected(client):
+            if client:
+                if self.ftp_connection: # Replace any previous session
+                    self.job_runner.submit(ftp_client_core.disconnect_ftp, self.ftp_connection)
+                    if self.connect_kwargs:
+                        self.job_runner.submit(self.connection_pool.close_site, self.connect_kwargs, uses_shared_connection=False)
+                self.ftp_connection = client
+                self.connect_kwargs = connect_kwargs
                 self.statusBar().showMessage(f"Successfully connected to {host} ({security_type}).")
                 print(f"Successfully connected to {host} ({security_type}).")
                 self.current_remote_path = "/" # Reset remote path on new connection
-                self.remote_tree_widget.clear() # Clear existing remote tree items
-                self.remote_tree_widget.setHeaderLabel(f"Connected to {host}") # Update header
+                self.remote_folder_model.clear(f"Connected to {host}") # Clear existing remote folders, update header
                 # After successful connection, refresh the remote file list
                 self.refresh_remote_files()
+                if details.get('auto_tune'):
+                    self.statusBar().showMessage(f"Auto-tuning transfers to {host}...")
+                    self.job_runner.submit(ftp_client_core.auto_tune_transfer, client,
+                                           on_result=self._auto_tune_finished,
+                                           on_error=lambda e: self.statusBar().showMessage(f"Auto-tune failed: {e}"))
             else:
                 self.statusBar().showMessage(f"Failed to connect to {host} ({security_type}).")
                 print(f"Failed to connect to {host} ({security_type}).")
                 QMessageBox.critical(self, "Connection Error", f"Failed to connect to {host} ({security_type}). Check details or server.")
-        except Exception as e:
+
+        def on_error(e):
             self.statusBar().showMessage(f"Connection Error: {e}")
             QMessageBox.critical(self, "Connection Error", f"An error occurred during connection: {e}")
 
+        self.job_runner.submit(ftp_client_core.connect_server, **connect_kwargs,
+                               on_result=on_connected, on_error=on_error)
+
+
+    def _auto_tune_finished(self, tuning):
+        buffer_size = tuning.get('send_buffer')
+        buffer_text = f"{buffer_size // 1024} KB" if buffer_size else "system default"
+        self.statusBar().showMessage(f"Transfer tuning: {tuning['block_size'] // 1024} KB blocks, {buffer_text} socket buffers.")
 
     def handle_connect_action(self):
         dialog = QuickConnectDialog(self)
@@ -72,93 +141,60 @@ class FlashFXPClone(QMainWindow):
         else:
             print("Quick Connect dialog canceled.")
 
+    def handle_speed_limit_action(self):
+        dialog = SpeedLimitDialog(self.speed_limit_settings, self)
+        if dialog.exec_() != SpeedLimitDialog.Accepted:
+            return
+        settings = self.speed_limit_settings = dialog.get_settings()
+        limit = settings['global_limit_kbps'] * 1024 or None
+        if settings['scheduled']:
+            schedule = rate_limiter.business_hours(limit, settings['start'], settings['end'],
+                                                   settings['off_hours_limit_kbps'] * 1024 or None,
+                                                   range(5) if settings['weekdays_only'] else None)
+            rate_limiter.bandwidth_scheduler.set_global_limit(schedule=schedule)
+        else:
+            rate_limiter.bandwidth_scheduler.set_global_limit(limit)
+        current = rate_limiter.bandwidth_scheduler.global_bucket.current_rate()
+        self.statusBar().showMessage(f"Speed limit now: {f'{current // 1024} KB/s' if current else 'unlimited'}.")
+
+    def _make_throttle(self):
+        """A throttle for a transfer outside the transfer engine (single and segmented downloads)."""
+        return rate_limiter.bandwidth_scheduler.throttle(ftp_client_core.ConnectionPool.site_key(self.connect_kwargs or {}),
+                                                         priority=self.current_transfer_settings['priority'])
+
     def handle_site_manager_action(self):
         dialog = SiteManagerDialog(self)
         # In a real app, you'd pass existing site data to the dialog
-        # and retrieve updated data when dialog is accepted.
-        dialog.exec_() # For now, just show it.
+        if dialog.exec_() == SiteManagerDialog.Accepted:
+            details = dialog.get_connection_details()
+            print(f"Site Manager accepted. Connecting to {details['host']}")
+            self.connect_to_ftp_server_detailed(details)
+        else:
+            print("Site Manager canceled.")
 
     def handle_disconnect_action(self):
         if self.ftp_connection:
-            try:
-                ftp_client_core.disconnect_ftp(self.ftp_connection)
-                self.ftp_connection = None
-                self.statusBar().showMessage("Disconnected from server.")
-                self.remote_tree_widget.clear()
-                self.remote_tree_widget.setHeaderLabel("Site (Disconnected)")
-                self.remote_file_list.clear()
-                self.current_remote_path = "/"
-            except Exception as e:
-                QMessageBox.critical(self, "Disconnect Error", f"Error during disconnection: {e}")
-                self.statusBar().showMessage(f"Error during disconnection: {e}")
+            # Queued behind any pending operations on the connection, so they finish first
+            self.job_runner.submit(ftp_client_core.disconnect_ftp, self.ftp_connection,
+                                   on_error=lambda e: self.statusBar().showMessage(f"Error during disconnection: {e}"))
+            self.job_runner.submit(self.connection_pool.close_site, self.connect_kwargs, uses_shared_connection=False)
+            self.ftp_connection = None
+            self.connect_kwargs = None
+            self.statusBar().showMessage("Disconnected from server.")
+            self.remote_folder_model.clear("Site (Disconnected)")
+            self.remote_file_model.clear()
+            self._update_pane_status(self.remote_file_model, self.remote_pane_status)
+            self.current_remote_path = "/"
         else:
             self.statusBar().showMessage("Not connected to any server.")
 
-    def remote_directory_changed(self, current_item, previous_item):
-        if current_item is None:
-            # No item selected, or selection cleared. This might happen during refresh.
+    def remote_directory_changed(self, current, previous):
+        if not current.isValid() or self.remote_folder_model.is_top(current):
+            # Selection cleared (e.g. during refresh), or the directory already shown
             return
-
-        selected_dir_name = current_item.text(0)
-
-        if selected_dir_name == "..":
-            # Navigate up one level
-            # Get the parent directory of the *current* remote path
-            # os.path.normpath handles '..' and '.' correctly
-            # os.path.split will correctly separate head/tail, and head is the parent
-            head, tail = os.path.split(self.current_remote_path.rstrip('/'))
-            
-            # If head is empty after split (e.g., for '/'), it means we are at the root
-            if not head:
-                self.current_remote_path = '/'
-            else:
-                self.current_remote_path = head + '/'
-            
-            # Ensure path uses forward slashes, important for FTP
-            self.current_remote_path = self.current_remote_path.replace('\\', '/')
-
-        else:
-            # Build path by traversing up from the current item to the root of the tree.
-            path_parts = []
-            item_iterator = current_item
-
-            while item_iterator is not None:
-                # Skip the root placeholder if it's the top-level server name
-                # Check if it's the invisible root's child and its text matches the header
-                if item_iterator.parent() is None and self.remote_tree_widget and \
-                   self.remote_tree_widget.headerItem() and \
-                   item_iterator.text(0) == self.remote_tree_widget.headerItem().text(0):
-                    break # This is the top-level server name, not part of actual path
-                
-                # Exclude the ".." entry from path construction if it's not a real directory name
-                if item_iterator.text(0) != "..":
-                    path_parts.insert(0, item_iterator.text(0)) # Prepend to get correct order
-                item_iterator = item_iterator.parent()
-
-            # Construct the full path
-            if not path_parts: # If only the header was clicked or no valid path parts
-                self.current_remote_path = "/"
-            else:
-                # Join parts with '/', then normalize to clean up any redundant slashes
-                # Ensure it starts with a slash and ends with a slash if it's a directory
-                temp_path = "/" + "/".join(path_parts)
-                self.current_remote_path = os.path.normpath(temp_path).replace('\\', '/')
-                
-                # Ensure it ends with a slash if it's not the root itself
-                if not self.current_remote_path.endswith('/') and self.current_remote_path != '/':
-                    self.current_remote_path += '/'
-                
-                # Special handling for Windows drive roots if any normalization resulted in a single backslash
-                # This should be less necessary with .replace('\\', '/') but as a safeguard.
-                if len(self.current_remote_path) > 1 and self.current_remote_path.startswith('/') and self.current_remote_path[1] == '/':
-                    self.current_remote_path = self.current_remote_path[1:] # Remove leading double slash if it forms
-                
-                # Ensure the root is just '/'
-                if self.current_remote_path == '//' or self.current_remote_path == '/.':
-                    self.current_remote_path = '/'
-
+        self.current_remote_path = self.remote_folder_model.path(current)
         print(f"Remote directory changed to: {self.current_remote_path}")
-        self.refresh_remote_files() # Refresh the file list for the new directory
+        self.refresh_remote_files(use_cache=True) # Refresh the file list for the new directory
 
     def initUI(self):
         self.setWindowTitle('FlashFXP Clone - Python FTP Client')
@@ -208,6 +244,7 @@ class FlashFXPClone(QMainWindow):
         # Options menu
         options_menu = menubar.addMenu('Options')
         options_menu.addAction('Preferences')
+        options_menu.addAction('Speed Limit...').triggered.connect(self.handle_speed_limit_action)
 
         # Queue menu
         queue_menu = menubar.addMenu('Queue')
@@ -222,11 +259,14 @@ class FlashFXPClone(QMainWindow):
         # Tools menu
         tools_menu = menubar.addMenu('Tools')
         tools_menu.addAction('Server File Search')
+        tools_menu.addAction('Synchronize Folder...').triggered.connect(self.synchronize_local_folder)
+        tools_menu.addAction('Watch Folder and Upload...').triggered.connect(self.watch_and_upload_folder)
+        tools_menu.addAction('Stop Watching Folder').triggered.connect(self.stop_watching_folder)
 
         # Directory menu
         directory_menu = menubar.addMenu('Directory')
         refresh_action = directory_menu.addAction('Refresh')
-        refresh_action.triggered.connect(self.refresh_remote_files) # Hook up refresh
+        refresh_action.triggered.connect(lambda: self.refresh_remote_files()) # Hook up refresh
         create_folder_action = directory_menu.addAction('Create Folder (Remote)')
         create_folder_action.triggered.connect(self.create_remote_folder)
 
@@ -235,6 +275,10 @@ class FlashFXPClone(QMainWindow):
         view_menu = menubar.addMenu('View')
         view_menu.addAction('Transfer Graph')
         view_menu.addAction('Single Connection Layout')
+        watch_action = view_menu.addAction('Watch Local Folder')
+        watch_action.setCheckable(True)
+        watch_action.setChecked(self.watch_local_folder)
+        watch_action.toggled.connect(self.toggle_local_watch)
 
         # Help menu
         help_menu = menubar.addMenu('Help')
@@ -264,7 +308,7 @@ class FlashFXPClone(QMainWindow):
 
         toolbar.addSeparator()
         refresh_action = QAction(QIcon.fromTheme("view-refresh"), "Refresh", self)
-        refresh_action.triggered.connect(self.refresh_remote_files)
+        refresh_action.triggered.connect(lambda: self.refresh_remote_files())
         toolbar.addAction(refresh_action)
         
         delete_action = QAction(QIcon.fromTheme("edit-delete"), "Delete", self)
@@ -286,13 +330,14 @@ class FlashFXPClone(QMainWindow):
         splitter.addWidget(left_pane_widget)
 
         # Right pane (Remote)
-        right_pane_widget, self.remote_tree_widget, self.remote_file_list = self.createFilePane("Site", "Not Connected", is_local=False)
+        right_pane_widget, self.remote_tree_view, self.remote_file_list = self.createFilePane("Site", "Not Connected", is_local=False)
         splitter.addWidget(right_pane_widget)
 
-        # Connect remote tree widget's current item changed signal
-        self.remote_tree_widget.currentItemChanged.connect(self.remote_directory_changed)
+        # Connect remote folder view's current index changed signal
+        self.remote_tree_view.selectionModel().currentChanged.connect(self.remote_directory_changed)
         # Connect local tree widget's current item changed signal to populate local file list
         self.local_tree_widget.currentItemChanged.connect(self.local_directory_changed)
+        self.local_tree_widget.itemExpanded.connect(self.local_item_expanded)
 
 
         # Set equal sizes for both panes
@@ -307,33 +352,70 @@ class FlashFXPClone(QMainWindow):
         title_label.setStyleSheet("font-weight: bold; padding: 5px; background-color: #e0e0e0;")
         pane_layout.addWidget(title_label)
 
-        # Create tree widget for folder navigation
-        tree_widget = QTreeWidget()
-        tree_widget.setHeaderLabel(root_name)
+        # Folder navigation: local folders expand lazily in a tree widget, remote folders come from a paged model
+        if is_local:
+            tree_widget = QTreeWidget()
+            tree_widget.setHeaderLabel(root_name)
+        else:
+            folder_model = RemoteFolderModel(root_name, parent=self)
+            tree_widget = QTreeView()
+            tree_widget.setModel(folder_model)
+            tree_widget.setUniformRowHeights(True)
         tree_widget.setMaximumHeight(150) # Keep folders view compact
         
         pane_layout.addWidget(tree_widget)
 
-        # Create list widget for file listing
-        file_list = QListWidget()
+        # Filter box; the model hides non-matching entries without touching the view's rows
+        filter_edit = QLineEdit()
+        filter_edit.setPlaceholderText("Filter (e.g. report or *.log)")
+        filter_edit.setClearButtonEnabled(True)
+        pane_layout.addWidget(filter_edit)
+
+        # File listing: a view on a compact model that only materializes the rows on screen
+        file_model = FileListModel(join=os.path.join if is_local else posixpath.join, draggable=is_local, parent=self)
+        file_list = QTreeView()
+        file_list.setModel(file_model)
+        file_list.setRootIsDecorated(False)
+        file_list.setUniformRowHeights(True) # Lets the view lay out huge listings without measuring every row
+        file_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        file_list.setSortingEnabled(True)
+        file_list.sortByColumn(0, Qt.AscendingOrder)
+        file_list.header().setStretchLastSection(False)
+        file_list.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        filter_edit.textChanged.connect(file_model.set_filter)
+
+        # Status info
+        status_label = QLabel("0 Files, 0 Folders, 0 Total (0 MB)") # Will update dynamically
+        status_label.setStyleSheet("padding: 5px; background-color: #f0f0f0; font-size: 10px;")
+
         if is_local:
             file_list.setDragEnabled(True) # Enable drag for local files
             self.local_file_list = file_list # Store reference
             self.local_tree_widget = tree_widget # Store reference
+            self.local_file_model = file_model
+            self.local_pane_status = status_label
         else:
             self.remote_file_list = file_list # Store reference
-            self.remote_tree_widget = tree_widget # Store reference
-            
-        pane_layout.addWidget(file_list)
+            self.remote_tree_view = tree_widget # Store reference
+            self.remote_folder_model = folder_model
+            self.remote_file_model = file_model
+            self.remote_pane_status = status_label
 
-        # Status info
-        status_label = QLabel("0 Files, 0 Folders, 0 Total (0 MB)") # Will update dynamically
-        status_label.setStyleSheet("padding: 5px; background-color: #f0f0f0; font-size: 10px;")
+        pane_layout.addWidget(file_list)
         pane_layout.addWidget(status_label)
 
         return pane_widget, tree_widget, file_list # Return all three for external access
 
 
+    @staticmethod
+    def _update_pane_status(file_model, status_label):
+        status_label.setText(file_model.summary())
+
+    @staticmethod
+    def _selected_rows(file_list):
+        """Selected rows of a file list view, top to bottom."""
+        return sorted(index.row() for index in file_list.selectionModel().selectedRows())
+
     def createTransferQueue(self, main_layout):
         # Create transfer queue section
         queue_widget = QTabWidget()
@@ -343,8 +425,19 @@ class FlashFXPClone(QMainWindow):
         queue_tab = QWidget()
         queue_layout = QVBoxLayout(queue_tab)
         
-        # Transfer list
-        self.transfer_list = QListWidget() # Made it an instance variable
+        # Transfer list: a view on the queue model, which only renders the visible rows
+        self.queue_model = TransferQueueModel(self)
+        self.transfer_list = QTableView() # Made it an instance variable
+        self.transfer_list.setModel(self.queue_model)
+        self.transfer_list.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.transfer_list.setShowGrid(False)
+        self.transfer_list.setWordWrap(False)
+        self.transfer_list.verticalHeader().hide()
+        self.transfer_list.verticalHeader().setSectionResizeMode(QHeaderView.Fixed) # Uniform rows, no per-row sizing
+        self.transfer_list.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.transfer_list.horizontalHeader().setStretchLastSection(True)
+        self.transfer_list.setColumnWidth(0, 350)
+        self.transfer_list.setColumnWidth(1, 250)
         self.transfer_list.setAcceptDrops(True)
         self.transfer_list.dragEnterEvent = self.dragEnterEvent
         self.transfer_list.dragMoveEvent = self.dragMoveEvent
@@ -394,141 +487,252 @@ class FlashFXPClone(QMainWindow):
 
     # File System Population Methods
     def populate_local_files(self, path, tree_widget, file_list_widget):
+        """Roots the local tree at path and lists it; deeper folders are only read when expanded."""
+        self._local_tree_generation += 1 # Scans still running for the old tree's items are dropped
         tree_widget.clear()
-        file_list_widget.clear()
 
-        root_item = QTreeWidgetItem(tree_widget, [os.path.basename(path) if path != "/" else "Computer"])
-        root_item.setExpanded(True)
+        root_item = self._make_local_dir_item(tree_widget, path, os.path.basename(path.rstrip(os.sep)) or "Computer")
         tree_widget.addTopLevelItem(root_item)
-        
-        self._add_local_directories_recursive(path, root_item)
-        self._add_local_files_to_list(path, file_list_widget)
-
-    def _add_local_directories_recursive(self, parent_path, parent_item):
-        try:
-            for entry in os.listdir(parent_path):
-                full_path = os.path.join(parent_path, entry)
-                if os.path.isdir(full_path):
-                    dir_item = QTreeWidgetItem(parent_item, [entry])
-                    # We won't pre-populate sub-directories, but expand later on demand
-                    # For a simple demo, you could expand one level, but it can be slow for large trees.
-        except PermissionError:
-            print(f"Permission denied for: {parent_path}")
-        except Exception as e:
-            print(f"Error listing local directory {parent_path}: {e}")
-
-    def _add_local_files_to_list(self, path, file_list_widget):
-        try:
-            for entry in os.listdir(path):
-                full_path = os.path.join(path, entry)
-                if os.path.isfile(full_path):
-                    item = QListWidgetItem(entry)
-                    item.setData(Qt.UserRole, full_path) # Store full path
-                    file_list_widget.addItem(item)
-        except PermissionError:
-            print(f"Permission denied for: {path}")
-        except Exception as e:
-            print(f"Error listing local files {path}: {e}")
+        self._list_local_directory(path, root_item)
+        root_item.setExpanded(True) # Its folders already come with the listing
+
+    @staticmethod
+    def _make_local_dir_item(parent, path, name):
+        dir_item = QTreeWidgetItem(parent, [name])
+        dir_item.setData(0, Qt.UserRole, path) # Full path, so selecting it needn't rebuild it from the tree
+        dir_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator) # Until it is read and turns out empty
+        return dir_item
+
+    @staticmethod
+    def _scan_local_directory(path, dirs_only=False, partial_callback=None):
+        """Runs on a job runner thread: streams path's entries to partial_callback(batch) as it is read."""
+        for batch in ftp_client_core.iter_local_directory_batches(path, dirs_only):
+            partial_callback(batch)
+        return path
+
+    def _list_local_directory(self, path, tree_item=None):
+        """
+        Lists path into the local file list off the GUI thread, in batches. If tree_item's
+        folders haven't been read yet, they are added from the same listing.
+        """
+        self.current_local_path = path
+        fill_tree = tree_item is not None and tree_item.data(0, LOCAL_CHILDREN_ROLE) is None
+        if fill_tree:
+            tree_item.setData(0, LOCAL_CHILDREN_ROLE, 'loading')
+        generation = self._local_tree_generation
+        listing = {'started': False, 'entries': []}
+        self._local_listing = listing # The list is reset when the first batch of the newest listing arrives
+
+        def begin():
+            if self._local_listing is not listing:
+                return False # Another folder was selected (or this one refreshed) meanwhile
+            if not listing['started']:
+                listing['started'] = True
+                self.local_file_model.clear(path)
+            return True
+
+        def on_partial(batch):
+            if fill_tree:
+                self._add_local_dir_items(tree_item, path, batch, generation)
+            if begin():
+                listing['entries'].extend(batch)
+                self.local_file_model.add_entries([entry for entry in batch if entry['type'] != 'dir'])
+                self._update_pane_status(self.local_file_model, self.local_pane_status)
+
+        def on_result(result):
+            if fill_tree:
+                self._local_children_done(tree_item, generation)
+            if begin():
+                self.local_file_model.resort()
+                self._update_pane_status(self.local_file_model, self.local_pane_status)
+                self._watch_local_directory(path, listing['entries']) # From here on changes come from the watcher
+
+        def on_error(e):
+            print(f"Error listing local directory {path}: {e}")
+            on_result(None)
+            self.statusBar().showMessage(f"Could not read local folder {path}: {e}")
+
+        self.job_runner.submit(self._scan_local_directory, path, uses_shared_connection=False,
+                               on_partial=on_partial, on_result=on_result, on_error=on_error)
+
+    def local_item_expanded(self, item):
+        """Reads a folder's subfolders the first time it is expanded (folders only, so no file is stat()ed)."""
+        if item.data(0, LOCAL_CHILDREN_ROLE) is not None:
+            return # Read already, or being read
+        item.setData(0, LOCAL_CHILDREN_ROLE, 'loading')
+        path = item.data(0, Qt.UserRole)
+        generation = self._local_tree_generation
+        self.job_runner.submit(self._scan_local_directory, path, True, uses_shared_connection=False,
+                               on_partial=lambda batch: self._add_local_dir_items(item, path, batch, generation),
+                               on_result=lambda result: self._local_children_done(item, generation),
+                               on_error=lambda e: self._local_children_done(item, generation))
+
+    def _add_local_dir_items(self, parent_item, parent_path, batch, generation):
+        if generation != self._local_tree_generation:
+            return # The tree was rebuilt; parent_item is gone
+        for entry in batch:
+            if entry['type'] == 'dir':
+                self._make_local_dir_item(parent_item, os.path.join(parent_path, entry['name']), entry['name'])
+
+    def _local_children_done(self, item, generation):
+        if generation != self._local_tree_generation:
+            return
+        item.setData(0, LOCAL_CHILDREN_ROLE, 'loaded')
+        item.sortChildren(0, Qt.AscendingOrder)
+        if not item.childCount():
+            item.setChildIndicatorPolicy(QTreeWidgetItem.DontShowIndicatorWhenChildless)
 
     def local_directory_changed(self, current_item, previous_item):
         if current_item is None:
             return
+        self._list_local_directory(current_item.data(0, Qt.UserRole), current_item)
 
-        path_parts = []
-        item_iterator = current_item
-        while item_iterator is not None:
-            path_parts.insert(0, item_iterator.text(0))
-            item_iterator = item_iterator.parent()
-        
-        # Reconstruct full path for the local system
-        # Handle Windows drive letters, C:\Users\..., or Unix /home/...
-        if sys.platform == "win32":
-            if len(path_parts) > 1 and len(path_parts[0]) == 1 and path_parts[0].isalpha(): # e.g., C:\
-                current_local_path = path_parts[0] + ":\\" + "\\".join(path_parts[1:])
-            else: # For paths like "My Documents" which are relative or user-specific
-                # This needs to be more robust. For simplicity, assume user's home for now.
-                current_local_path = os.path.join(os.path.expanduser("~"), *path_parts[1:])
-                # Or handle a fixed root if "My Computer" is literal
-                if path_parts[0] == "My Computer":
-                    current_local_path = os.path.expanduser("~") # Or system root like '/' or 'C:\'
-                else:
-                    current_local_path = os.path.join(os.path.expanduser("~"), *path_parts) # Simplistic fallback
-                current_local_path = os.path.normpath(current_local_path)
-        else: # Unix-like systems
-            current_local_path = "/" + "/".join(path_parts)
-            if current_local_path == "/My Computer": # Adjust for initial display name
-                current_local_path = "/"
-            current_local_path = os.path.normpath(current_local_path)
-
-        if os.path.isdir(current_local_path):
-            self._add_local_files_to_list(current_local_path, self.local_file_list)
-            # You might want to clear and re-populate the tree's children here
-            # to show expanded subdirectories if not already done.
+    def _watch_local_directory(self, path, entries):
+        """Follows the listed folder for changes while watching is switched on; entries is its listing."""
+        if self.watch_local_folder:
+            self.local_watcher.watch(path, folder_watcher.snapshot_from_entries(path, entries))
         else:
-            self.local_file_list.clear() # Clear if a file or non-existent path is selected
+            self.local_watcher.stop()
 
-    def refresh_remote_files(self):
+    def toggle_local_watch(self, enabled):
+        self.watch_local_folder = enabled
+        if enabled:
+            self._list_local_directory(self.current_local_path) # Watching starts from a fresh listing
+        else:
+            self.local_watcher.stop()
+
+    def _apply_local_changes(self, changes):
+        """
+        Applies (kind, path, entry) changes from a folder watcher, or from our own local
+        deletes and renames, to the local file list and tree without re-reading the folder.
+        """
+        updated, removed = [], []
+        for kind, path, entry in changes:
+            directory = os.path.dirname(path)
+            if entry['type'] == 'dir':
+                self._apply_local_folder_change(kind, directory, entry['name'])
+            elif directory == self.current_local_path:
+                if kind == REMOVED:
+                    removed.append(entry['name'])
+                else:
+                    updated.append(entry)
+        if removed:
+            self.local_file_model.remove_names(removed)
+        if updated:
+            self.local_file_model.update_entries(updated)
+        if removed or updated:
+            self._update_pane_status(self.local_file_model, self.local_pane_status)
+
+    def _apply_local_folder_change(self, kind, directory, name):
+        parent_item = self._find_local_dir_item(directory)
+        if parent_item is None or parent_item.data(0, LOCAL_CHILDREN_ROLE) != 'loaded':
+            return # Not in the tree, or its folders will be read when it is expanded
+        existing = next((parent_item.child(i) for i in range(parent_item.childCount()) if parent_item.child(i).text(0) == name), None)
+        if kind == REMOVED and existing is not None:
+            parent_item.removeChild(existing)
+        elif kind == ADDED and existing is None:
+            self._make_local_dir_item(parent_item, os.path.join(directory, name), name)
+            parent_item.sortChildren(0, Qt.AscendingOrder)
+            parent_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+
+    def _find_local_dir_item(self, path):
+        """The local tree item of folder path, if the tree has read that far."""
+        item = self.local_tree_widget.topLevelItem(0)
+        if item is None:
+            return None
+        relative = os.path.relpath(path, item.data(0, Qt.UserRole))
+        if relative == os.curdir:
+            return item
+        if relative.startswith(os.pardir):
+            return None
+        for name in relative.split(os.sep):
+            item = next((item.child(i) for i in range(item.childCount()) if item.child(i).text(0) == name), None)
+            if item is None:
+                return None
+        return item
+
+    @staticmethod
+    def _fetch_remote_listing(client, path, use_cache, partial_callback=None, index=None):
+        """
+        Runs on a job runner thread: changes into path and streams the listing to
+        partial_callback((path, batch)) while it arrives. Returns (path, entries) for a
+        cached listing, or (path, None) once every entry has gone out in batches.
+        """
+        if use_cache:
+            cached = ftp_client_core.listing_cache.get(client, path)
+            if cached is not None:
+                return path, cached
+        # For FTP, change directory first to ensure accurate listing of current_remote_path
+        if isinstance(client, ftplib.FTP):
+            client.cwd(path)
+        entries = []
+        for batch in ftp_client_core.iter_directory_batches(client, path):
+            entries.extend(batch)
+            if partial_callback:
+                partial_callback((path, batch))
+        ftp_client_core.listing_cache.put(client, path, entries)
+        site = index.site_of(client) if index is not None else None
+        if site:
+            index.record_listing(site, path, entries)
+        return path, None
+
+    def refresh_remote_files(self, use_cache=False):
+        """Lists current_remote_path. use_cache=True (navigation) reuses a recent listing; explicit refreshes don't."""
         if not self.ftp_connection:
             self.statusBar().showMessage("Not connected to refresh remote files.")
-            self.remote_file_list.clear()
-            self.remote_tree_widget.clear()
-            self.remote_tree_widget.setHeaderLabel("Site (Disconnected)")
+            self.remote_file_model.clear()
+            self._update_pane_status(self.remote_file_model, self.remote_pane_status)
+            self.remote_folder_model.clear("Site (Disconnected)")
             return
 
-        self.remote_file_list.clear()
-        self.remote_tree_widget.clear()
-        self.remote_tree_widget.setHeaderLabel(self.ftp_connection.__class__.__name__) # Show connection type
-
-        try:
-            # For FTP, change directory first to ensure accurate listing of current_remote_path
-            if isinstance(self.ftp_connection, ftplib.FTP):
-                self.ftp_connection.cwd(self.current_remote_path)
-            
-            dir_contents = ftp_client_core.list_directory(self.ftp_connection, self.current_remote_path)
-            
-            # Create root item for the remote tree, representing the current path
-            root_item_name = self.current_remote_path if self.current_remote_path != '/' else '/'
-            root_item = QTreeWidgetItem(self.remote_tree_widget, [root_item_name])
-            root_item.setExpanded(True)
-            self.remote_tree_widget.addTopLevelItem(root_item)
-            
-            # Populate files and folders
-            folders_count = 0
-            files_count = 0
-            total_size = 0
-
-            # Add a ".." (parent directory) entry if not at root
-            if self.current_remote_path != '/':
-                parent_dir_item = QTreeWidgetItem(root_item, [".."])
-                parent_dir_item.setData(0, Qt.UserRole, "dir") 
-                parent_dir_item.setForeground(0, QColor(Qt.blue)) # Indicate navigability
-                folders_count += 1
-            
-            for entry in dir_contents:
-                name = entry['name']
-                file_type = entry['type']
-                size = entry['size']
-
-                if file_type == 'dir':
-                    dir_item = QTreeWidgetItem(root_item, [name])
-                    dir_item.setData(0, Qt.UserRole, "dir") 
-                    dir_item.setForeground(0, QColor(Qt.blue)) # Indicate navigability
-                    folders_count += 1
-                else: # file
-                    file_item = QListWidgetItem(name)
-                    file_item.setData(Qt.UserRole, "file") # Store type
-                    file_item.setData(Qt.UserRole + 1, size) # Store size
-                    self.remote_file_list.addItem(file_item)
-                    files_count += 1
-                    total_size += size
-            
-            self.statusBar().showMessage(f"Refreshed remote directory: {self.current_remote_path}")
-            # Update status label on the remote pane (not currently linked, but good to add if you create a dedicated label)
-            # self.remote_status_label.setText(f"{files_count} Files, {folders_count} Folders, {files_count + folders_count} Total ({total_size / (1024*1024):.2f} MB)")
-
-        except Exception as e:
+        self.statusBar().showMessage(f"Listing remote directory: {self.current_remote_path}...")
+        requested_path = self.current_remote_path
+        listing = {'started': False} # The view is reset when the first batch of this listing arrives
+
+        def on_partial(result):
+            listed_path, batch = result
+            if self._begin_remote_listing(listed_path, listing):
+                self._add_remote_entries(batch)
+                listing['count'] += len(batch)
+                self.statusBar().showMessage(f"Listing remote directory: {listed_path}... {listing['count']} entries")
+
+        def on_result(result):
+            listed_path, entries = result
+            if self._begin_remote_listing(listed_path, listing):
+                if entries:
+                    self._add_remote_entries(entries)
+                self.remote_file_model.resort() # Streamed batches arrive in listing order
+                self.statusBar().showMessage(f"Refreshed remote directory: {listed_path}")
+
+        def on_error(e):
             self.statusBar().showMessage(f"Failed to refresh remote directory: {e}")
-            QMessageBox.critical(self, "Refresh Error", f"Could not refresh remote directory '{self.current_remote_path}': {e}")
+            QMessageBox.critical(self, "Refresh Error", f"Could not refresh remote directory '{requested_path}': {e}")
+
+        self.job_runner.submit(self._fetch_remote_listing, self.ftp_connection, requested_path, use_cache,
+                               index=self.remote_index, on_partial=on_partial, on_result=on_result, on_error=on_error)
+
+    def _begin_remote_listing(self, listed_path, listing):
+        """Clears the remote view for a new listing once. Returns False for stale listings."""
+        if listed_path != self.current_remote_path or not self.ftp_connection:
+            return False # The user navigated elsewhere (or disconnected) while this listing was in flight
+        if listing['started']:
+            return True
+        listing['started'] = True
+        listing['count'] = 0
+
+        self.remote_file_model.clear(self.current_remote_path)
+        # The current path with ".." (if not at root) and its subfolders below it
+        self.remote_folder_model.begin_listing(self.current_remote_path)
+        self.remote_folder_model.set_header(self.ftp_connection.__class__.__name__) # Show connection type
+        self.remote_tree_view.expand(self.remote_folder_model.top_index())
+        return True
+
+    def _add_remote_entries(self, dir_contents):
+        """Appends one batch of listing entries to the remote tree (folders) and list (files and folders)."""
+        self.remote_folder_model.add_folders([entry['name'] for entry in dir_contents if entry['type'] == 'dir'])
+        # Folders are also listed with the files, so whole folders can be selected for download/delete
+        self.remote_file_model.add_entries(dir_contents)
+        self._update_pane_status(self.remote_file_model, self.remote_pane_status)
 
 
     # Button logic implementations
@@ -539,98 +743,191 @@ class FlashFXPClone(QMainWindow):
             self.transfer_status_label.setText("Upload failed: Not connected.")
             return
 
-        items_to_process_snapshot = []
-        for i in range(self.transfer_list.count()):
-            items_to_process_snapshot.append(self.transfer_list.item(i))
-
-        if not items_to_process_snapshot:
+        # Entries already running belong to an earlier run; folders are expanded by the background job
+        uploads = [entry for entry in self.queue_model.entries() if entry.status != RUNNING]
+        if not uploads:
             self.transfer_status_label.setText("Queue is empty. Nothing to upload.")
             return
 
         self.transfer_progress_bar.setValue(0)
         self.transfer_status_label.setText("Starting uploads...")
 
-        for item_index, item in enumerate(items_to_process_snapshot):
-            try:
-                text = item.text()
-                # Assuming format: "local_path -> remote_path_base/"
-                parts = text.split(" -> ")
-                if len(parts) < 2:
-                    raise ValueError("Invalid queue item format.")
-                
-                local_path = parts[0].strip()
-                remote_base_path = parts[1].strip().rstrip('/') # Remove trailing slash for joining
-
-                file_name = os.path.basename(local_path)
-                # Construct the full remote path for the file
-                actual_remote_path = f"{remote_base_path}/{file_name}"
-                
-                self.transfer_status_label.setText(f"Uploading: {file_name}...")
-                self.transfer_progress_bar.setValue(int((item_index / len(items_to_process_snapshot)) * 100))
-
-
+        engine = self._make_transfer_engine()
+        self.job_store.mark_many_running([entry.job_id for entry in uploads])
+        self.queue_model.set_status(uploads, RUNNING)
+
+        self.transfer_status_label.setText(f"Uploading {len(uploads)} item(s) over up to {engine.max_connections} connection(s)...")
+        self.job_runner.submit(self._run_uploads, engine, uploads, uses_shared_connection=False, with_callbacks=True,
+                               on_progress=self.transfer_progress_bar.setValue,
+                               on_status=self.transfer_status_label.setText,
+                               on_result=self._upload_jobs_finished)
+
+    def _make_transfer_engine(self):
+        return TransferEngine(self.connect_kwargs,
+                              max_connections=self.current_transfer_settings.get('max_connections', DEFAULT_MAX_CONNECTIONS),
+                              verify_integrity=self.current_transfer_settings.get('verify_integrity', False),
+                              resume=self.current_transfer_settings.get('resume', True),
+                              journal=self.resume_journal,
+                              pool=self.connection_pool,
+                              priority=self.current_transfer_settings['priority'],
+                              store=self.job_store)
+
+    @staticmethod
+    def _run_uploads(engine, uploads, progress_callback, status_callback):
+        """
+        Runs on a job runner thread: turns each queued folder into its remote directory tree
+        plus one job per file, then runs everything on the engine. A folder's files are kept
+        in the job store, so one that was scanned before (e.g. before a restart) continues
+        with its unfinished files instead of being scanned again. A folder that couldn't be
+        scanned (or has nothing left to send) is reported as a single failed (or done) job.
+        """
+        settled = []
+        for entry in uploads:
+            local_path, remote_path = entry.local_path, entry.remote_path
+            if not entry.is_dir:
+                engine.add_job(TransferJob(local_path, remote_path, 'upload', tag=entry, store_id=entry.job_id))
+                continue
+            folder_job = TransferJob(local_path, remote_path, 'upload', tag=entry)
+            if engine.store.has_children(entry.job_id):
+                files = [(child['local_path'], child['remote_path'], child['id']) for child in engine.store.children(entry.job_id)]
+            else:
+                status_callback(f"Scanning {local_path}...")
+                client = engine.pool.borrow(engine.connect_kwargs)
                 try:
-                    # Actual FTP upload call, now with integrity check option
-                    ftp_client_core.upload_file(
-                        self.ftp_connection,
-                        local_path,
-                        actual_remote_path,
-                        verify_integrity=self.current_transfer_settings.get('verify_integrity', False)
-                    )
-                    print(f"FTP Upload call processed for: {local_path} to {actual_remote_path}")
-                    self.log_list.addItem(f"[Success] Uploaded: {file_name} to {actual_remote_path}")
-                    # If successful, remove the item. Important: work with snapshot then remove by actual item
-                    # Find the current index of the item (it might have shifted if previous items were removed)
-                    current_item_row = self.transfer_list.row(item)
-                    if current_item_row != -1: # Ensure it's still in the list
-                        self.transfer_list.takeItem(current_item_row)
-                    
-                except IntegrityCheckFailedError as icfe:
-                    print(f"GUI: Integrity Check FAILED for {file_name}: {icfe}")
-                    item.setText(f"{text} [Checksum Mismatch]")
-                    item.setBackground(QColor("red")) # Basic visual feedback
-                    self.log_list.addItem(f"[FAIL] Checksum Mismatch for {file_name}: {icfe}")
-                    # Item remains in queue, marked.
-                except Exception as e_upload: # Other upload errors
-                    print(f"GUI: Upload FAILED for {file_name}: {e_upload}")
-                    item.setText(f"{text} [Upload Error]")
-                    item.setBackground(QColor("lightcoral")) # Different color for other errors
-                    self.log_list.addItem(f"[ERROR] Upload failed for {file_name}: {e_upload}")
-                    # Item remains in queue, marked.
-
-            except ValueError as ve:
-                print(f"Error parsing item text: {text}. Expected format 'local_path -> remote_path_placeholder'. {ve}")
-                item.setText(f"{text} [Bad Format]") # Mark item
-                item.setBackground(QColor("orange"))
-                self.log_list.addItem(f"[ERROR] Bad format for item: {text} - {ve}")
-            except Exception as e_outer: # Catch-all for other unexpected issues in the loop
-                print(f"An unexpected error occurred while processing item {text}: {e_outer}")
-                if item: # If item reference is valid
-                    item.setText(f"{text} [Processing Error]")
-                    item.setBackground(QColor("purple"))
-                self.log_list.addItem(f"[ERROR] Unexpected error processing {text}: {e_outer}")
+                    if not client:
+                        raise ConnectionError("No connection could be established.")
+                    pairs = ftp_client_core.plan_tree_upload(client, local_path, remote_path)
+                except Exception as e:
+                    folder_job.status, folder_job.error = 'failed', e
+                    settled.append(folder_job)
+                    continue
+                finally:
+                    if client:
+                        engine.pool.give_back(client)
+                ids = engine.store.add_children(entry.job_id, 'upload', pairs)
+                files = [(file_local, file_remote, job_id) for (file_local, file_remote), job_id in zip(pairs, ids)]
+            engine.add_jobs(TransferJob(file_local, file_remote, 'upload', tag=entry, store_id=job_id)
+                            for file_local, file_remote, job_id in files)
+            if not files:
+                folder_job.status = 'done'
+                settled.append(folder_job)
+        if engine.jobs:
+            FlashFXPClone._run_transfer_engine(engine, progress_callback, status_callback)
+        return engine.jobs + settled
+
+    @staticmethod
+    def _run_transfer_engine(engine, progress_callback, status_callback):
+        """Runs on a job runner thread; reports progress as the engine's workers finish jobs."""
+        finished = [0]
+        total = len(engine.jobs)
+
+        def on_job_finished(job):
+            finished[0] += 1 # Only ever read for display, so an occasional lost update is harmless
+            progress_callback(int(finished[0] / total * 100))
+            status_callback(f"Transferred {finished[0]} of {total}: {os.path.basename(job.local_path)}")
+
+        return engine.run(on_job_finished=on_job_finished)
+
+    def _upload_jobs_finished(self, jobs):
+        # A queued folder becomes many jobs; its queue entry reports the first failure, if any
+        jobs_by_entry = {}
+        for job in jobs:
+            jobs_by_entry.setdefault(id(job.tag), (job.tag, []))[1].append(job)
+        finished, failed, mismatched = [], [], [] # Queue entries, updated in one batch each below
+        successes = []
+        for entry, entry_jobs in jobs_by_entry.values():
+            job = next((job for job in entry_jobs if job.status != 'done'), entry_jobs[0])
+            file_name = os.path.basename(job.local_path)
+            remote_path = job.remote_path
+            if entry.is_dir: # A folder, reported as a whole when it all went up
+                if job.status == 'done':
+                    file_count = sum(folder_job.local_path != entry.local_path for folder_job in entry_jobs) # Not the empty folder's own job
+                    file_name = f"{os.path.basename(entry.local_path)} ({file_count} files)"
+                    remote_path = entry.remote_path
+                else:
+                    file_name = os.path.relpath(job.local_path, os.path.dirname(entry.local_path))
+            if job.status == 'done':
+                finished.append(entry)
+                successes.append((file_name, remote_path))
+            elif isinstance(job.error, IntegrityCheckFailedError):
+                print(f"GUI: Integrity Check FAILED for {file_name}: {job.error}")
+                self.job_store.mark_failed(entry.job_id, job.error)
+                mismatched.append((entry, job.error))
+                self.log_list.addItem(f"[FAIL] Checksum Mismatch for {file_name}: {job.error}")
+                # Entry remains in queue, marked.
+            else: # Other upload errors
+                print(f"GUI: Upload FAILED for {file_name}: {job.error}")
+                self.job_store.mark_failed(entry.job_id, job.error)
+                failed.append((entry, job.error))
+                self.log_list.addItem(f"[ERROR] Upload failed for {file_name}: {job.error}")
+                # Entry remains in queue, marked.
+
+        # Finished work leaves the store (a folder's files with it) and the queue
+        self.job_store.remove_many([entry.job_id for entry in finished])
+        self.queue_model.remove_entries(finished)
+        for entry, error in failed:
+            self.queue_model.set_status([entry], FAILED, error)
+        for entry, error in mismatched:
+            self.queue_model.set_status([entry], CHECKSUM_MISMATCH, error)
+        if len(successes) <= MAX_LOGGED_ITEMS:
+            for file_name, remote_path in successes:
+                self.log_list.addItem(f"[Success] Uploaded: {file_name} to {remote_path}")
+        else: # One line instead of flooding the log
+            self.log_list.addItem(f"[Success] Uploaded {len(successes)} items.")
+        print(f"FTP Upload call processed for {len(successes)} item(s).")
 
         self.transfer_progress_bar.setValue(100)
         self.transfer_status_label.setText("Uploads completed.")
-        self.refresh_remote_files() # Refresh remote view after uploads
+        self.refresh_remote_files(use_cache=True) # Uploads invalidated the listing, so this re-lists
+        self._queue_deferred_watch_uploads()
 
 
     def clearQueue(self):
         print("Clear Queue clicked")
-        self.transfer_list.clear()
+        self.queue_model.clear()
+        self.job_store.clear()
         self.transfer_status_label.setText("Queue cleared.")
         self.transfer_progress_bar.setValue(0)
 
     def removeSelected(self):
         print("Remove Selected clicked")
-        selected_items = self.transfer_list.selectedItems()
-        if not selected_items:
+        selected_entries = [self.queue_model.entry(index.row()) for index in self.transfer_list.selectionModel().selectedRows()]
+        if not selected_entries:
             print("No items selected to remove.")
             return
-        for item in selected_items:
-            self.transfer_list.takeItem(self.transfer_list.row(item))
-        print(f"{len(selected_items)} item(s) removed from queue.")
-        self.transfer_status_label.setText(f"{len(selected_items)} item(s) removed from queue.")
+        self.job_store.remove_many([entry.job_id for entry in selected_entries])
+        self.queue_model.remove_entries(selected_entries)
+        print(f"{len(selected_entries)} item(s) removed from queue.")
+        self.transfer_status_label.setText(f"{len(selected_entries)} item(s) removed from queue.")
+
+    def _queue_uploads(self, local_paths, remote_dir):
+        """
+        Stores uploads of local_paths (files or folders) into remote_dir in one transaction and
+        appends their queue entries in one batch. Returns the entries.
+        """
+        items = []
+        for local_path in local_paths:
+            local_path = local_path.rstrip(os.sep) or os.sep
+            remote_path = f"{remote_dir.rstrip('/')}/{os.path.basename(local_path)}"
+            items.append((local_path, remote_path, os.path.isdir(local_path)))
+        job_ids = self.job_store.add_many('upload', items)
+        entries = [QueueEntry(job_id, *item) for job_id, item in zip(job_ids, items)]
+        self.queue_model.add_entries(entries)
+        return entries
+
+    def _queue_upload(self, local_path, remote_dir):
+        """Stores an upload of local_path (file or folder) into remote_dir and adds its queue entry."""
+        return self._queue_uploads([local_path], remote_dir)[0]
+
+    def _load_saved_queue(self):
+        """Shows the uploads left in the job store by the last session; ones it was running are pending again."""
+        self.job_store.recover()
+        entries = [QueueEntry(job['id'], job['local_path'], job['remote_path'], bool(job['is_dir']),
+                              FAILED if job['status'] == 'failed' else QUEUED, job['error'])
+                   for job in self.job_store.top_level() if job['status'] != 'done']
+        self.queue_model.add_entries(entries)
+        if entries:
+            self.log_list.addItem(f"[Queue] Restored {len(entries)} queued item(s) from the last session.")
 
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
@@ -645,29 +942,30 @@ class FlashFXPClone(QMainWindow):
             event.setDropAction(Qt.CopyAction)
             event.acceptProposedAction()
             
+            local_paths = []
             for url in event.mimeData().urls():
                 local_path = url.toLocalFile()
                 if os.path.exists(local_path):
-                    # For a directory, you might want to add all its contents recursively
-                    # For now, just add the directory itself as an item, or its files.
-                    if os.path.isfile(local_path):
-                        # Use current remote path from the remote tree selection
-                        remote_path = self.current_remote_path
-                        item_text = f"{local_path} -> {remote_path}"
-                        QListWidgetItem(item_text, self.transfer_list)
-                        self.log_list.addItem(f"[Queue] Added: {local_path} for upload to {remote_path}")
-                    elif os.path.isdir(local_path):
-                        # Optionally, if a directory is dragged, add all its files to queue
-                        QMessageBox.information(self, "Drag & Drop", f"Dragged directory: {local_path}. Not recursively adding contents yet. Drag individual files.")
+                    local_paths.append(local_path)
                 else:
                     self.log_list.addItem(f"[ERROR] Invalid local path dragged: {local_path}")
+            # A directory is queued as one item; startUpload recreates its whole tree remotely
+            # Use current remote path from the remote tree selection
+            remote_path = self.current_remote_path
+            entries = self._queue_uploads(local_paths, remote_path)
+            if len(entries) <= MAX_LOGGED_ITEMS:
+                for entry in entries:
+                    kind = "folder" if entry.is_dir else "file"
+                    self.log_list.addItem(f"[Queue] Added {kind}: {entry.local_path} for upload to {remote_path}")
+            else:
+                self.log_list.addItem(f"[Queue] Added {len(entries)} items for upload to {remote_path}")
         else:
             event.ignore()
 
     def upload_selected_local_files(self):
         """Adds selected local files directly to the queue and starts upload."""
-        selected_items = self.local_file_list.selectedItems()
-        if not selected_items:
+        selected_rows = self._selected_rows(self.local_file_list)
+        if not selected_rows:
             QMessageBox.information(self, "Upload", "No local files selected for upload.")
             return
         
@@ -675,20 +973,21 @@ class FlashFXPClone(QMainWindow):
             QMessageBox.warning(self, "Upload Error", "Not connected to any FTP/SFTP server.")
             return
 
-        for item in selected_items:
-            local_path = item.data(Qt.UserRole) # Retrieve full path
-            if local_path:
-                remote_path = self.current_remote_path
-                item_text = f"{local_path} -> {remote_path}"
-                QListWidgetItem(item_text, self.transfer_list)
-                self.log_list.addItem(f"[Queue] Added via button: {local_path} for upload to {remote_path}")
-        
+        local_paths = [self.local_file_model.path(row) for row in selected_rows] # Retrieve full paths
+        remote_path = self.current_remote_path
+        entries = self._queue_uploads(local_paths, remote_path)
+        if len(entries) <= MAX_LOGGED_ITEMS:
+            for entry in entries:
+                self.log_list.addItem(f"[Queue] Added via button: {entry.local_path} for upload to {remote_path}")
+        else:
+            self.log_list.addItem(f"[Queue] Added {len(entries)} items via button for upload to {remote_path}")
+
         self.startUpload() # Automatically start upload
 
     def download_selected_remote_files(self):
         """Initiates download of selected remote files."""
-        selected_items = self.remote_file_list.selectedItems()
-        if not selected_items:
+        selected_rows = self._selected_rows(self.remote_file_list)
+        if not selected_rows:
             QMessageBox.information(self, "Download", "No remote files selected for download.")
             return
 
@@ -701,36 +1000,87 @@ class FlashFXPClone(QMainWindow):
         if not download_dir:
             return # User cancelled
 
-        for item in selected_items:
-            file_name = item.text()
+        selected = [(self.remote_file_model.name(row), self.remote_file_model.is_dir(row), self.remote_file_model.size(row))
+                    for row in selected_rows] # Read up front; a refresh may replace the listing meanwhile
+        for file_name, is_dir, file_size in selected:
             remote_path = os.path.join(self.current_remote_path, file_name).replace("\\", "/")
             local_path = os.path.join(download_dir, file_name)
 
-            self.transfer_status_label.setText(f"Downloading: {file_name}...")
-            self.log_list.addItem(f"[Download] Starting: {remote_path} to {local_path}")
-            try:
-                ftp_client_core.download_file(self.ftp_connection, remote_path, local_path, 
-                                              verify_integrity=self.current_transfer_settings.get('verify_integrity', False))
+            self.log_list.addItem(f"[Download] Queued: {remote_path} to {local_path}")
+            if is_dir:
+                if not self.connect_kwargs:
+                    self.log_list.addItem(f"[ERROR] Folder download needs a connection opened via the connect dialogs: {remote_path}")
+                    continue
+                # Walks the folder over several connections and downloads it on the transfer engine
+                self.job_runner.submit(self._download_tree, self._make_transfer_engine(), remote_path, local_path,
+                                       uses_shared_connection=False, with_callbacks=True,
+                                       on_progress=self.transfer_progress_bar.setValue,
+                                       on_status=self.transfer_status_label.setText,
+                                       on_result=self._make_tree_download_handler(file_name),
+                                       on_error=lambda e, name=file_name: self.log_list.addItem(f"[ERROR] Download failed for folder {name}: {e}"))
+                continue
+            if self.connect_kwargs and file_size >= SEGMENTED_DOWNLOAD_THRESHOLD:
+                # Opens its own connections, so it runs alongside work on the main connection
+                self.job_runner.submit(ftp_client_core.download_file_segmented, self.connect_kwargs, remote_path, local_path,
+                                       segments=self.current_transfer_settings.get('max_connections', DEFAULT_MAX_CONNECTIONS),
+                                       pool=self.connection_pool, throttle=self._make_throttle(),
+                                       verify_integrity=self.current_transfer_settings.get('verify_integrity', False),
+                                       resume=self.current_transfer_settings.get('resume', True),
+                                       journal=self.resume_journal, uses_shared_connection=False,
+                                       on_finished=self._make_download_finished_handler(file_name, local_path))
+            else:
+                self.job_runner.submit(ftp_client_core.download_file, self.ftp_connection, remote_path, local_path,
+                                       verify_integrity=self.current_transfer_settings.get('verify_integrity', False),
+                                       resume=self.current_transfer_settings.get('resume', True),
+                                       journal=self.resume_journal, throttle=self._make_throttle(),
+                                       on_finished=self._make_download_finished_handler(file_name, local_path))
+
+        self.transfer_status_label.setText(f"Downloading {len(selected)} file(s)...")
+
+    @staticmethod
+    def _download_tree(engine, remote_dir, local_dir, progress_callback, status_callback):
+        """Runs on a job runner thread: walks remote_dir in parallel, then downloads every file on the engine."""
+        status_callback(f"Scanning {remote_dir}...")
+        pairs = ftp_client_core.plan_tree_download(remote_dir, local_dir, connect_kwargs=engine.connect_kwargs,
+                                                   max_connections=engine.max_connections, pool=engine.pool)
+        engine.add_jobs(TransferJob(local_path, remote_path, 'download') for local_path, remote_path in pairs)
+        if engine.jobs:
+            FlashFXPClone._run_transfer_engine(engine, progress_callback, status_callback)
+        return engine.jobs
+
+    def _make_tree_download_handler(self, folder_name):
+        def on_result(jobs):
+            failures = [job for job in jobs if job.status != 'done']
+            for job in failures:
+                self.log_list.addItem(f"[ERROR] Download failed for {job.remote_path}: {job.error}")
+            if failures:
+                self.transfer_status_label.setText(f"Downloaded folder {folder_name} with {len(failures)} error(s).")
+            else:
+                self.log_list.addItem(f"[Success] Downloaded folder: {folder_name} ({len(jobs)} files)")
+                self.transfer_status_label.setText(f"Downloaded folder: {folder_name}")
+            self.transfer_progress_bar.setValue(100)
+        return on_result
+
+    def _make_download_finished_handler(self, file_name, local_path):
+        def on_finished(success, message):
+            if success:
                 self.log_list.addItem(f"[Success] Downloaded: {file_name}")
                 self.statusBar().showMessage(f"Downloaded {file_name} to {local_path}")
-            except IntegrityCheckFailedError as icfe:
-                self.log_list.addItem(f"[FAIL] Download Checksum Mismatch for {file_name}: {icfe}")
-                QMessageBox.warning(self, "Download Failed", f"Integrity check failed for {file_name}.")
-            except Exception as e:
-                self.log_list.addItem(f"[ERROR] Download failed for {file_name}: {e}")
-                QMessageBox.critical(self, "Download Error", f"Failed to download {file_name}: {e}")
-        
-        self.transfer_status_label.setText("Downloads completed.")
+                self.transfer_status_label.setText(f"Downloaded: {file_name}")
+            else:
+                self.log_list.addItem(f"[ERROR] Download failed for {file_name}: {message}")
+                QMessageBox.critical(self, "Download Error", f"Failed to download {file_name}: {message}")
+        return on_finished
 
 
     def delete_selected_file_or_dir(self):
         """Deletes selected file/directory from either local or remote pane."""
-        if self.local_file_list.selectedItems():
-            selected_item = self.local_file_list.selectedItems()[0]
-            file_path = selected_item.data(Qt.UserRole)
+        if self._selected_rows(self.local_file_list):
+            file_path = self.local_file_model.path(self._selected_rows(self.local_file_list)[0])
             if QMessageBox.question(self, "Delete Local", f"Are you sure you want to delete local file: {os.path.basename(file_path)}?",
                                      QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
                 try:
+                    entry = folder_watcher.entry_at(file_path) # What to take out of the view afterwards
                     if os.path.isfile(file_path):
                         os.remove(file_path)
                         self.log_list.addItem(f"[Action] Deleted local file: {file_path}")
@@ -739,85 +1089,98 @@ class FlashFXPClone(QMainWindow):
                         # For simplicity, will just try rmdir for now
                         os.rmdir(file_path) 
                         self.log_list.addItem(f"[Action] Deleted local directory: {file_path}")
-                    self.populate_local_files(os.path.dirname(file_path), self.local_tree_widget, self.local_file_list) # Refresh local view
+                    if entry is not None:
+                        self._apply_local_changes([(REMOVED, file_path, entry)]) # Refresh local view
                     self.statusBar().showMessage(f"Deleted local: {os.path.basename(file_path)}")
                 except Exception as e:
                     QMessageBox.critical(self, "Local Delete Error", f"Failed to delete local: {e}")
                     self.log_list.addItem(f"[ERROR] Failed to delete local {file_path}: {e}")
 
-        elif self.remote_file_list.selectedItems():
+        elif self._selected_rows(self.remote_file_list):
             if not self.ftp_connection:
                 QMessageBox.warning(self, "Delete Remote", "Not connected to server.")
                 return
 
-            selected_item = self.remote_file_list.selectedItems()[0]
-            item_name = selected_item.text()
-            item_type = selected_item.data(Qt.UserRole) # 'file' or 'dir'
+            selected_row = self._selected_rows(self.remote_file_list)[0]
+            item_name = self.remote_file_model.name(selected_row)
+            item_type = 'dir' if self.remote_file_model.is_dir(selected_row) else 'file'
             remote_path_to_delete = os.path.join(self.current_remote_path, item_name).replace("\\", "/")
 
-            if QMessageBox.question(self, "Delete Remote", f"Are you sure you want to delete remote {item_type}: {item_name}?",
+            question = f"Are you sure you want to delete remote {item_type}: {item_name}?"
+            if item_type == 'dir':
+                question = f"Are you sure you want to delete remote folder {item_name} and everything in it?"
+            if QMessageBox.question(self, "Delete Remote", question,
                                      QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
-                try:
-                    if item_type == 'file':
-                        ftp_client_core.delete_file(self.ftp_connection, remote_path_to_delete)
-                        self.log_list.addItem(f"[Action] Deleted remote file: {remote_path_to_delete}")
-                    elif item_type == 'dir':
-                        # FTP_TLS.rmd() for directories
-                        if isinstance(self.ftp_connection, ftplib.FTP):
-                            self.ftp_connection.rmd(remote_path_to_delete)
-                        elif ftp_client_core.paramiko_available and isinstance(self.ftp_connection, paramiko.SFTPClient):
-                             self.ftp_connection.rmdir(remote_path_to_delete)
-                        else:
-                             raise TypeError("Unsupported client type for directory deletion.")
-                        self.log_list.addItem(f"[Action] Deleted remote directory: {remote_path_to_delete}")
+                def on_deleted(result):
+                    kind = 'file' if item_type == 'file' else 'directory'
+                    self.log_list.addItem(f"[Action] Deleted remote {kind}: {remote_path_to_delete}")
                     self.statusBar().showMessage(f"Deleted remote: {item_name}")
                     self.refresh_remote_files()
-                except Exception as e:
+
+                def on_error(e):
                     QMessageBox.critical(self, "Remote Delete Error", f"Failed to delete remote: {e}")
                     self.log_list.addItem(f"[ERROR] Failed to delete remote {remote_path_to_delete}: {e}")
+
+                self.job_runner.submit(self._delete_remote_entry, self.ftp_connection, remote_path_to_delete, item_type,
+                                       self.connect_kwargs, self.connection_pool,
+                                       on_result=on_deleted, on_error=on_error)
         else:
             QMessageBox.information(self, "Delete", "Please select an item to delete in either local or remote pane.")
 
 
+    @staticmethod
+    def _delete_remote_entry(client, remote_path, item_type, connect_kwargs=None, pool=None):
+        """Runs on a job runner thread. Folders are deleted with their contents."""
+        if item_type == 'file':
+            ftp_client_core.delete_file(client, remote_path)
+        elif item_type == 'dir':
+            # The walk fans out over pooled connections when connect_kwargs are known
+            ftp_client_core.delete_remote_tree(client, remote_path, connect_kwargs=connect_kwargs, pool=pool)
+
     def rename_selected_file_or_dir(self):
         """Renames selected file/directory from either local or remote pane."""
-        if self.local_file_list.selectedItems():
-            selected_item = self.local_file_list.selectedItems()[0]
-            old_name = selected_item.text()
-            old_path = selected_item.data(Qt.UserRole)
+        if self._selected_rows(self.local_file_list):
+            selected_row = self._selected_rows(self.local_file_list)[0]
+            old_name = self.local_file_model.name(selected_row)
+            old_path = self.local_file_model.path(selected_row)
 
             new_name, ok = QInputDialog.getText(self, "Rename Local", f"Rename '{old_name}' to:", text=old_name)
             if ok and new_name:
                 new_path = os.path.join(os.path.dirname(old_path), new_name)
                 try:
+                    old_entry = folder_watcher.entry_at(old_path)
                     os.rename(old_path, new_path)
                     self.log_list.addItem(f"[Action] Renamed local from {old_path} to {new_path}")
-                    self.populate_local_files(os.path.dirname(old_path), self.local_tree_widget, self.local_file_list) # Refresh local view
+                    new_entry = folder_watcher.entry_at(new_path)
+                    # Refresh local view
+                    self._apply_local_changes([(REMOVED, old_path, old_entry)] + ([(ADDED, new_path, new_entry)] if new_entry else []))
                     self.statusBar().showMessage(f"Renamed local: {old_name} to {new_name}")
                 except Exception as e:
                     QMessageBox.critical(self, "Local Rename Error", f"Failed to rename local: {e}")
                     self.log_list.addItem(f"[ERROR] Failed to rename local {old_path}: {e}")
 
-        elif self.remote_file_list.selectedItems():
+        elif self._selected_rows(self.remote_file_list):
             if not self.ftp_connection:
                 QMessageBox.warning(self, "Rename Remote", "Not connected to server.")
                 return
 
-            selected_item = self.remote_file_list.selectedItems()[0]
-            old_name = selected_item.text()
+            old_name = self.remote_file_model.name(self._selected_rows(self.remote_file_list)[0])
             remote_old_path = os.path.join(self.current_remote_path, old_name).replace("\\", "/")
 
             new_name, ok = QInputDialog.getText(self, "Rename Remote", f"Rename '{old_name}' to:", text=old_name)
             if ok and new_name:
                 remote_new_path = os.path.join(self.current_remote_path, new_name).replace("\\", "/")
-                try:
-                    ftp_client_core.rename_file(self.ftp_connection, remote_old_path, remote_new_path)
+                def on_renamed(result):
                     self.log_list.addItem(f"[Action] Renamed remote from {remote_old_path} to {remote_new_path}")
                     self.statusBar().showMessage(f"Renamed remote: {old_name} to {new_name}")
                     self.refresh_remote_files()
-                except Exception as e:
+
+                def on_error(e):
                     QMessageBox.critical(self, "Remote Rename Error", f"Failed to rename remote: {e}")
                     self.log_list.addItem(f"[ERROR] Failed to rename remote {remote_old_path}: {e}")
+
+                self.job_runner.submit(ftp_client_core.rename_file, self.ftp_connection, remote_old_path, remote_new_path,
+                                       on_result=on_renamed, on_error=on_error)
         else:
             QMessageBox.information(self, "Rename", "Please select an item to rename in either local or remote pane.")
 
@@ -829,15 +1192,225 @@ class FlashFXPClone(QMainWindow):
         folder_name, ok = QInputDialog.getText(self, "Create Remote Folder", "Enter new folder name:")
         if ok and folder_name:
             full_remote_path = os.path.join(self.current_remote_path, folder_name).replace("\\", "/")
-            try:
-                ftp_client_core.make_directory(self.ftp_connection, full_remote_path)
+            def on_created(result):
                 self.log_list.addItem(f"[Action] Created remote folder: {full_remote_path}")
                 self.statusBar().showMessage(f"Created remote folder: {folder_name}")
                 self.refresh_remote_files()
-            except Exception as e:
+
+            def on_error(e):
                 QMessageBox.critical(self, "Create Folder Error", f"Failed to create remote folder: {e}")
                 self.log_list.addItem(f"[ERROR] Failed to create remote folder {full_remote_path}: {e}")
 
+            self.job_runner.submit(ftp_client_core.make_directory, self.ftp_connection, full_remote_path,
+                                   on_result=on_created, on_error=on_error)
+
+
+    def synchronize_local_folder(self):
+        """Mirrors a local folder onto <current remote path>/<folder name>, sending only what changed."""
+        if not self.ftp_connection or not self.connect_kwargs:
+            QMessageBox.warning(self, "Synchronize", "Not connected to any FTP/SFTP server.")
+            return
+        local_dir = QFileDialog.getExistingDirectory(self, "Select Folder to Synchronize", os.path.expanduser("~"))
+        if not local_dir:
+            return # User cancelled
+        remote_dir = posixpath.join(self.current_remote_path, os.path.basename(os.path.normpath(local_dir)))
+        self._synchronize(local_dir, remote_dir)
+
+    def _synchronize(self, local_dir, remote_dir):
+        """Plans a sync of local_dir onto remote_dir and runs it once the user agrees to the plan."""
+        def on_planned(plan):
+            if plan.is_empty():
+                self.log_list.addItem(f"[Sync] {remote_dir} is already up to date ({plan})")
+                self.transfer_status_label.setText("Synchronize: nothing to do.")
+                return
+            if QMessageBox.question(self, "Synchronize", f"Synchronize {local_dir} to {remote_dir}?\n\n{plan}",
+                                    QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+                return
+            self.log_list.addItem(f"[Sync] Started: {local_dir} -> {remote_dir} ({plan})")
+            self.job_runner.submit(self._run_sync, plan, self.connect_kwargs, self.connection_pool, self.remote_index,
+                                   self.current_transfer_settings.get('max_connections', DEFAULT_MAX_CONNECTIONS),
+                                   self.current_transfer_settings.get('verify_integrity', False),
+                                   uses_shared_connection=False, with_callbacks=True,
+                                   on_progress=self.transfer_progress_bar.setValue,
+                                   on_status=self.transfer_status_label.setText,
+                                   on_result=on_synced, on_error=on_error)
+
+        def on_synced(result):
+            jobs, delete_failures = result
+            failures = [job for job in jobs if job.status != 'done']
+            for job in failures:
+                self.log_list.addItem(f"[ERROR] Sync upload failed for {job.remote_path}: {job.error}")
+            for item, error in delete_failures:
+                self.log_list.addItem(f"[ERROR] Sync delete failed for {item.rel_path}: {error}")
+            error_count = len(failures) + len(delete_failures)
+            self.log_list.addItem(f"[Sync] Finished {remote_dir}" + (f" with {error_count} error(s)" if error_count else ""))
+            self.transfer_status_label.setText("Synchronize completed.")
+            self.transfer_progress_bar.setValue(100)
+            self.refresh_remote_files(use_cache=True)
+
+        def on_error(e):
+            self.log_list.addItem(f"[ERROR] Synchronize failed for {local_dir}: {e}")
+            QMessageBox.critical(self, "Synchronize Error", f"Could not synchronize {local_dir}: {e}")
+
+        self.transfer_status_label.setText(f"Comparing {local_dir} with {remote_dir}...")
+        self.job_runner.submit(self._plan_sync, local_dir, remote_dir, self.connect_kwargs, self.connection_pool, self.remote_index,
+                               self.current_transfer_settings.get('max_connections', DEFAULT_MAX_CONNECTIONS),
+                               uses_shared_connection=False, on_result=on_planned, on_error=on_error)
+
+    def watch_and_upload_folder(self):
+        """
+        Watches a local folder and uploads whatever changes in it to <current remote path>/<folder name>,
+        from the filesystem's change notifications instead of rescanning the folder.
+        """
+        if not self.ftp_connection or not self.connect_kwargs:
+            QMessageBox.warning(self, "Watch Folder", "Not connected to any FTP/SFTP server.")
+            return
+        local_dir = QFileDialog.getExistingDirectory(self, "Select Folder to Watch", os.path.expanduser("~"))
+        if not local_dir:
+            return # User cancelled
+        local_dir = os.path.normpath(local_dir)
+        remote_dir = posixpath.join(self.current_remote_path, os.path.basename(local_dir))
+
+        self.stop_watching_folder()
+        watcher = FolderWatcher(recursive=True, parent=self)
+        watcher.changed.connect(lambda changes: self._upload_watched_changes(local_dir, remote_dir, changes))
+        self.upload_watcher = watcher
+        self.upload_watch_dir = local_dir
+
+        def on_snapshot(snapshot):
+            if self.upload_watcher is not watcher:
+                return # Stopped (or replaced) while the folder was being read
+            watcher.watch(local_dir, snapshot)
+            self.log_list.addItem(f"[Watch] Watching {local_dir} ({len(snapshot)} folders); changes are uploaded to {remote_dir}")
+
+        def on_error(e):
+            self.log_list.addItem(f"[ERROR] Could not watch {local_dir}: {e}")
+            if self.upload_watcher is watcher:
+                self.upload_watcher = None
+
+        # The watch starts from the folder as it is now, read off the GUI thread
+        self.job_runner.submit(folder_watcher.snapshot_tree, local_dir, uses_shared_connection=False,
+                               on_result=on_snapshot, on_error=on_error)
+        # Offer to bring the server up to date first, so later changes land in folders that exist there
+        self._synchronize(local_dir, remote_dir)
+
+    def stop_watching_folder(self):
+        if self.upload_watcher is None:
+            return
+        self.upload_watcher.stop()
+        self.upload_watcher.deleteLater()
+        self.upload_watcher = None
+        self.log_list.addItem(f"[Watch] Stopped watching {self.upload_watch_dir}")
+
+    @staticmethod
+    def _is_covered(path, paths):
+        """Whether path, or a folder it is in, is one of paths (i.e. uploading those uploads path too)."""
+        while path not in paths:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return False
+            path = parent
+        return True
+
+    def _upload_watched_changes(self, local_dir, remote_dir, changes):
+        """
+        Queues what was added or modified in a watched folder (a new folder as a whole) and starts uploading it.
+        A change to something that is being uploaded right now waits until that upload finished, since the
+        running upload may have read it already.
+        """
+        entries = self.queue_model.entries()
+        running = {entry.local_path for entry in entries if entry.status == RUNNING}
+        waiting = {entry.local_path for entry in entries if entry.status != RUNNING} # The next startUpload sends these anyway
+        by_remote_dir = {}
+        removed = []
+        deferred = 0
+        for kind, path, entry in changes:
+            if kind == REMOVED:
+                removed.append(path)
+                self.deferred_watch_uploads.pop(path, None)
+                continue
+            if self._is_covered(path, waiting):
+                continue
+            relative_dir = os.path.relpath(os.path.dirname(path), local_dir)
+            target = remote_dir if relative_dir == os.curdir else posixpath.join(remote_dir, *relative_dir.split(os.sep))
+            if self._is_covered(path, running):
+                self.deferred_watch_uploads[path] = target
+                deferred += 1
+                continue
+            by_remote_dir.setdefault(target, []).append(path)
+        if deferred:
+            self.log_list.addItem(f"[Watch] {deferred} changed item(s) are being uploaded right now; they are sent again afterwards.")
+
+        if len(removed) <= MAX_LOGGED_ITEMS:
+            for path in removed:
+                self.log_list.addItem(f"[Watch] Removed locally, left on the server: {path}")
+        else:
+            self.log_list.addItem(f"[Watch] {len(removed)} items removed locally, left on the server.")
+        queued = []
+        for target, local_paths in by_remote_dir.items():
+            queued.extend(self._queue_uploads(local_paths, target))
+        if not queued:
+            return
+        self.log_list.addItem(f"[Watch] Queued {len(queued)} changed item(s) from {local_dir}")
+        if self.ftp_connection:
+            self.startUpload()
+        else:
+            self.log_list.addItem("[Watch] Not connected; the changes wait in the queue.")
+
+    def _queue_deferred_watch_uploads(self):
+        """Queues the watched changes held back for uploads that have finished now (see _upload_watched_changes)."""
+        if not self.deferred_watch_uploads:
+            return
+        entries = self.queue_model.entries()
+        running = {entry.local_path for entry in entries if entry.status == RUNNING}
+        waiting = {entry.local_path for entry in entries if entry.status != RUNNING}
+        by_remote_dir = {}
+        for path, target in list(self.deferred_watch_uploads.items()):
+            if self._is_covered(path, running):
+                continue # Still going (part of another run)
+            del self.deferred_watch_uploads[path]
+            if not self._is_covered(path, waiting) and os.path.exists(path): # A failed entry left in the queue covers it
+                by_remote_dir.setdefault(target, []).append(path)
+        queued = []
+        for target, local_paths in by_remote_dir.items():
+            queued.extend(self._queue_uploads(local_paths, target))
+        if not queued:
+            return
+        self.log_list.addItem(f"[Watch] Queued {len(queued)} item(s) that changed during their upload")
+        if self.ftp_connection:
+            self.startUpload()
+
+    @staticmethod
+    def _plan_sync(local_dir, remote_dir, connect_kwargs, pool, index, max_connections):
+        """Runs on a job runner thread, over a pooled connection so the browser stays usable."""
+        client = pool.borrow(connect_kwargs)
+        if not client:
+            raise ConnectionError("No connection could be established.")
+        try:
+            return sync_engine.plan_sync(client, local_dir, remote_dir, delete_extra=True, connect_kwargs=connect_kwargs,
+                                         max_connections=max_connections, pool=pool, index=index,
+                                         index_max_age=SYNC_INDEX_MAX_AGE)
+        finally:
+            pool.give_back(client)
+
+    @staticmethod
+    def _run_sync(plan, connect_kwargs, pool, index, max_connections, verify_integrity, progress_callback, status_callback):
+        """
+        Runs on a job runner thread; reports progress as the plan's uploads finish.
+        run_sync borrows its control connection only around the directory batch and the
+        deletes, so the transfer engine (and its verifier) can use the whole pool.
+        """
+        finished = [0]
+        total = len(plan.uploads())
+
+        def on_job_finished(job):
+            finished[0] += 1
+            progress_callback(int(finished[0] / total * 100))
+            status_callback(f"Synchronized {finished[0]} of {total}: {job.tag.rel_path}")
+
+        return sync_engine.run_sync(plan, None, connect_kwargs, max_connections=max_connections,
+                                    verify_integrity=verify_integrity, pool=pool, on_job_finished=on_job_finished,
+                                    index=index)
 
 def main():
     app = QApplication(sys.argv)
@@ -0,0 +1,312 @@
+# Folder Watching
+# Turns filesystem notifications for a local folder (or a whole tree) into batched
+# add/remove/modify events, so the local pane and "watch and upload" follow what changed
+# instead of re-reading everything. On Linux the kernel's inotify is used directly: it
+# names the entry that changed and reports files rewritten in place. Elsewhere
+# QFileSystemWatcher says which folder changed and only that folder is compared.
+
+import ctypes
+import ctypes.util
+import os
+import stat
+import struct
+import sys
+import time
+
+from PyQt5.QtCore import QObject, QTimer, QFileSystemWatcher, QSocketNotifier, pyqtSignal
+
+import ftp_client_core
+
+# Change kinds
+ADDED = 'added'
+REMOVED = 'removed'
+MODIFIED = 'modified'
+
+SETTLE_DELAY_MS = 500 # Changes are reported once the watched folders have been quiet this long...
+MAX_DELAY = 5 # ...or at the latest this many seconds after the first unreported change
+
+# inotify(7)
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len
+
+# Attempt to load inotify (Linux only) from libc and set a flag
+inotify_available = False
+if sys.platform.startswith('linux'):
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        inotify_available = True
+    except (OSError, AttributeError):
+        print("Warning: inotify not available. Folder watching falls back to QFileSystemWatcher.")
+
+
+def _state(entry):
+    """What a change is detected on: type, size and modification time."""
+    return entry['type'] == 'dir', entry['size'], entry['mtime']
+
+
+def entry_at(path):
+    """The listing entry (see make_entry) of path as it is now, or None if it is gone."""
+    try:
+        path_stat = os.stat(path)
+    except OSError:
+        return None
+    name = os.path.basename(path)
+    if stat.S_ISDIR(path_stat.st_mode):
+        return ftp_client_core.make_entry(name, 'dir')
+    if not stat.S_ISREG(path_stat.st_mode):
+        return None # Sockets, pipes and devices aren't listed either
+    return ftp_client_core.make_entry(name, 'file', path_stat.st_size, path_stat.st_mtime)
+
+
+def snapshot_from_entries(directory, entries):
+    """A snapshot of one folder from a listing of it (e.g. the one the local pane just made)."""
+    return {directory: {entry['name']: entry for entry in entries}}
+
+
+def snapshot_tree(root, recursive=True):
+    """
+    {folder: {name: entry}} for root and, if recursive, every folder below it; what changes
+    are detected against. Reads with os.scandir; may be slow for big trees, so run it off
+    the GUI thread and hand the result to FolderWatcher.watch().
+    """
+    snapshot = {}
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = list(ftp_client_core.iter_local_directory(directory))
+        except OSError as e:
+            print(f"Not watching {directory}: {e}")
+            continue
+        snapshot[directory] = {entry['name']: entry for entry in entries}
+        if recursive:
+            pending.extend(os.path.join(directory, entry['name']) for entry in entries if entry['type'] == 'dir')
+    return snapshot
+
+
+class _InotifyBackend:
+    """One inotify instance, read from the GUI thread whenever its descriptor is readable."""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths = {} # watch descriptor -> folder
+        self._descriptors = {} # folder -> watch descriptor
+        self._notifier = QSocketNotifier(self.fd, QSocketNotifier.Read)
+        self._notifier.activated.connect(self._read_events)
+
+    def add(self, directory):
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            print(f"Could not watch {directory}: {os.strerror(ctypes.get_errno())}")
+            return
+        self._paths[wd] = directory
+        self._descriptors[directory] = wd
+
+    def remove(self, directory):
+        wd = self._descriptors.pop(directory, None)
+        if wd is not None and self._paths.get(wd) == directory:
+            del self._paths[wd]
+            _libc.inotify_rm_watch(self.fd, wd) # Fails harmlessly if the folder is already gone
+
+    def close(self):
+        self._notifier.setEnabled(False)
+        os.close(self.fd)
+        self._paths.clear()
+        self._descriptors.clear()
+
+    def _read_events(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW: # Events were lost: compare every watched folder
+                self.watcher._touched_everything()
+                continue
+            directory = self._paths.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED: # The watch went away with its folder
+                self._paths.pop(wd, None)
+                if self._descriptors.get(directory) == wd:
+                    del self._descriptors[directory]
+            elif name:
+                self.watcher._touched(directory, name)
+
+
+class _QtBackend:
+    """QFileSystemWatcher only tells which folder changed, so the whole folder is compared."""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+        self._qt_watcher = QFileSystemWatcher()
+        self._qt_watcher.directoryChanged.connect(self.watcher._touched_directory)
+
+    def add(self, directory):
+        self._qt_watcher.addPath(directory)
+
+    def remove(self, directory):
+        self._qt_watcher.removePath(directory)
+
+    def close(self):
+        paths = self._qt_watcher.directories()
+        if paths:
+            self._qt_watcher.removePaths(paths)
+
+
+class FolderWatcher(QObject):
+    """
+    Watches a folder (with recursive=True, everything below it too) and emits changed(list)
+    with (kind, path, entry) tuples: kind is ADDED, REMOVED or MODIFIED, path the full local
+    path and entry a listing entry (see make_entry; for REMOVED the last one seen). A folder
+    added below a recursive watch is reported once and watched from then on; its contents
+    are not reported separately. Bursts of changes are collected and reported together.
+    """
+    changed = pyqtSignal(list)
+
+    def __init__(self, recursive=False, parent=None):
+        super().__init__(parent)
+        self.recursive = recursive
+        self.root = None
+        self._snapshot = {} # folder -> {name: entry}
+        self._backend = None
+        self._dirty = {} # folder -> names to compare, or None to compare the whole folder
+        self._first_dirty = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+
+    def watch(self, root, snapshot=None):
+        """
+        Starts watching root (instead of anything watched before). snapshot is its current
+        state (see snapshot_tree / snapshot_from_entries); without it root is read now.
+        """
+        self.stop()
+        if snapshot is None:
+            snapshot = snapshot_tree(root, self.recursive)
+        self.root = root
+        self._snapshot = {}
+        self._backend = self._make_backend()
+        for directory, entries in snapshot.items():
+            self._snapshot[directory] = dict(entries)
+            self._backend.add(directory)
+
+    def _make_backend(self):
+        if inotify_available:
+            try:
+                return _InotifyBackend(self)
+            except OSError as e:
+                print(f"inotify failed ({e}); using QFileSystemWatcher.")
+        return _QtBackend(self)
+
+    def stop(self):
+        self._timer.stop()
+        if self._backend is not None:
+            self._backend.close()
+            self._backend = None
+        self.root = None
+        self._snapshot = {}
+        self._dirty = {}
+
+    def is_watching(self):
+        return self._backend is not None
+
+    # --- Notifications from the backends ---------------------------------
+
+    def _touched(self, directory, name):
+        names = self._dirty.setdefault(directory, set())
+        if names is not None:
+            names.add(name)
+        self._schedule()
+
+    def _touched_directory(self, directory):
+        self._dirty[directory] = None
+        self._schedule()
+
+    def _touched_everything(self):
+        for directory in self._snapshot:
+            self._dirty[directory] = None
+        self._schedule()
+
+    def _schedule(self):
+        now = time.monotonic()
+        if not self._timer.isActive():
+            self._first_dirty = now
+        if now - self._first_dirty < MAX_DELAY: # Keep waiting for quiet, but not forever
+            self._timer.start(SETTLE_DELAY_MS)
+
+    # --- Comparing -------------------------------------------------------
+
+    def flush(self):
+        """Compares what was touched with the snapshot and emits the differences."""
+        self._timer.stop()
+        dirty, self._dirty = self._dirty, {}
+        changes = []
+        for directory, names in dirty.items():
+            known = self._snapshot.get(directory)
+            if known is None:
+                continue # Removed from the watch meanwhile
+            if names is None:
+                try:
+                    current = {entry['name']: entry for entry in ftp_client_core.iter_local_directory(directory)}
+                except OSError:
+                    current = {}
+                names = set(known) | set(current)
+            else:
+                current = {name: entry_at(os.path.join(directory, name)) for name in names}
+            for name in names:
+                old, new = known.get(name), current.get(name)
+                path = os.path.join(directory, name)
+                if old is not None and (new is None or (old['type'] == 'dir') != (new['type'] == 'dir')):
+                    changes.append((REMOVED, path, old))
+                    old = None
+                if new is None:
+                    known.pop(name, None)
+                    continue
+                if old is None:
+                    changes.append((ADDED, path, new))
+                elif new['type'] != 'dir' and _state(old) != _state(new):
+                    changes.append((MODIFIED, path, new))
+                known[name] = new
+        # Folders that went away stop being watched before new ones start (a moved folder keeps its inode)
+        for kind, path, entry in changes:
+            if kind == REMOVED and entry['type'] == 'dir':
+                self._unwatch_tree(path)
+        if self.recursive:
+            for kind, path, entry in changes:
+                if kind == ADDED and entry['type'] == 'dir':
+                    for directory, entries in snapshot_tree(path).items():
+                        self._snapshot[directory] = entries
+                        self._backend.add(directory)
+        if changes:
+            self.changed.emit(changes)
+        return changes
+
+    def _unwatch_tree(self, path):
+        prefix = path + os.sep
+        for directory in [d for d in self._snapshot if d == path or d.startswith(prefix)]:
+            del self._snapshot[directory]
+            self._backend.remove(directory)
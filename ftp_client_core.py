@@ -1,8 +1,22 @@
 import ftplib
 from ftplib import FTP_TLS # For FTPS
-import hashlib # For MD5 checksums
+import binascii # SFTP check-file returns raw digests
+import hashing # Local hashing and algorithm names
 import os # For os.path.basename and os.walk
 import io # For in-memory file for SFTP list_directory parsing
+import threading # For segmented (multi-connection) downloads
+import json # For the resume journal
+import time # For connection pool idle tracking
+import posixpath # Remote paths always use forward slashes
+from collections import OrderedDict # LRU order for the listing cache
+import re # For LIST line formats
+import calendar # UTC timestamps from listing dates
+import stat # SFTP mode bits
+from contextlib import closing # Streamed listings clean up their data connection
+import queue # Directory queue of the parallel remote walker
+import socket # Data channel buffer sizes and TCP_NODELAY
+import ssl # Encrypted data connections can't use sendfile()
+import tempfile # Local probe file for auto-tuning
 
 # Attempt to import paramiko and set a flag
 paramiko_available = False
@@ -16,9 +30,211 @@ class IntegrityCheckFailedError(Exception):
     """Custom exception for MD5 checksum mismatch."""
     pass
 
+RESUME_JOURNAL_FILE = 'resume_journal.json'
+SEGMENT_BLOCK_SIZE = 64 * 1024
+LISTING_BATCH_SIZE = 500 # Entries per batch when a listing is streamed
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024 # Files smaller than segments * this are fetched in one stream
+SEGMENT_CHECKPOINT_SIZE = 8 * 1024 * 1024 # A segment's progress is written to the resume journal this often
+PIPELINE_DEPTH = 32 # FTP commands sent before their replies are read in tree operations
+DEFAULT_TRANSFER_BLOCK_SIZE = 256 * 1024 # ftplib's own default of 8 KB costs a Python call per 8 KB
+SENDFILE_CHUNK_SIZE = 8 * 1024 * 1024 # Bytes per sendfile() call when an upload reports its progress
+
+# (block size, socket buffer size) pairs the auto-tuner tries, smallest first
+AUTO_TUNE_CANDIDATES = ((64 * 1024, None), (256 * 1024, 1024 * 1024),
+                        (1024 * 1024, 4 * 1024 * 1024), (4 * 1024 * 1024, 16 * 1024 * 1024))
+AUTO_TUNE_PROBE_SIZE = 16 * 1024 * 1024
+
+# SFTP: throughput is bounded by the data in flight, so long-RTT links need a big window
+# and many outstanding read requests (512 x 32 KB = 16 MB, ~100 MB/s at 150 ms)
+SFTP_WINDOW_SIZE = 64 * 1024 * 1024 # paramiko's default is 2 MB
+SFTP_REQUEST_SIZE = 32 * 1024 # Bytes per read/write request; every server accepts 32 KB
+SFTP_PREFETCH_REQUESTS = 512 # Outstanding read requests per download
+
+class ResumeJournal:
+    """
+    On-disk record of transfers that were started but not finished.
+    An entry remembers the source size/mtime at the time the transfer began, so a
+    partial destination file is only continued if the source hasn't changed since.
+    """
+
+    def __init__(self, path=RESUME_JOURNAL_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    @staticmethod
+    def _key(direction, local_path, remote_path):
+        return f"{direction}|{local_path}|{remote_path}"
+
+    def _load(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"Error loading resume journal {self.path}: {e}")
+        return {}
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(temp_path, self.path) # Atomic, so a crash never leaves a half-written journal
+        except Exception as e:
+            print(f"Error saving resume journal {self.path}: {e}")
+
+    def get(self, direction, local_path, remote_path):
+        with self._lock:
+            return self._entries.get(self._key(direction, local_path, remote_path))
+
+    def start(self, direction, local_path, remote_path, size, mtime=None):
+        with self._lock:
+            self._entries[self._key(direction, local_path, remote_path)] = {'size': size, 'mtime': mtime}
+            self._save()
+
+    def update(self, direction, local_path, remote_path, **fields):
+        """Adds fields (e.g. segment progress) to the entry of an unfinished transfer."""
+        with self._lock:
+            entry = self._entries.get(self._key(direction, local_path, remote_path))
+            if entry is not None:
+                entry.update(fields)
+                self._save()
+
+    def finish(self, direction, local_path, remote_path):
+        with self._lock:
+            if self._entries.pop(self._key(direction, local_path, remote_path), None) is not None:
+                self._save()
+
+    def pending(self):
+        """Returns (direction, local_path, remote_path) for every unfinished transfer."""
+        with self._lock:
+            return [tuple(key.split('|', 2)) for key in self._entries]
+
+def make_transfer_tuning(block_size=DEFAULT_TRANSFER_BLOCK_SIZE, send_buffer=None, recv_buffer=None, tcp_nodelay=False,
+                         sftp_window_size=SFTP_WINDOW_SIZE, sftp_max_packet_size=None,
+                         sftp_request_size=SFTP_REQUEST_SIZE, sftp_prefetch_requests=SFTP_PREFETCH_REQUESTS):
+    """
+    Per-site transfer settings, passed to connect_server() as tuning=. Buffer sizes of None
+    leave the OS default (and its autotuning) alone. Every connection made with the same
+    dict shares it, so auto_tune_transfer() results apply to all of them.
+    The sftp_* settings size the SSH channel (window and packet size, fixed at connect time;
+    None keeps paramiko's default) and the read/write requests of SFTP transfers.
+    """
+    return {'block_size': block_size, 'send_buffer': send_buffer, 'recv_buffer': recv_buffer,
+            'tcp_nodelay': tcp_nodelay, 'sftp_window_size': sftp_window_size,
+            'sftp_max_packet_size': sftp_max_packet_size, 'sftp_request_size': sftp_request_size,
+            'sftp_prefetch_requests': sftp_prefetch_requests}
+
+
+def apply_socket_tuning(sock, tuning):
+    """Sets SO_SNDBUF/SO_RCVBUF/TCP_NODELAY on sock as given in tuning; options the OS refuses are skipped."""
+    if not tuning:
+        return
+    options = (('SO_SNDBUF', socket.SOL_SOCKET, socket.SO_SNDBUF, tuning.get('send_buffer')),
+               ('SO_RCVBUF', socket.SOL_SOCKET, socket.SO_RCVBUF, tuning.get('recv_buffer')),
+               ('TCP_NODELAY', socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 if tuning.get('tcp_nodelay') else None))
+    for name, level, option, value in options:
+        if value:
+            try:
+                sock.setsockopt(level, option, value)
+            except OSError as e:
+                print(f"Could not set {name}={value} on data connection: {e}")
+
+
+def transfer_block_size(client):
+    """Bytes per read/write in transfers on client."""
+    tuning = getattr(client, 'transfer_tuning', None)
+    return (tuning or {}).get('block_size') or DEFAULT_TRANSFER_BLOCK_SIZE
+
+
+_transfer_buffers = threading.local() # One receive buffer per thread, reused for every download
+
+
+def _transfer_buffer(size):
+    buffer = getattr(_transfer_buffers, 'buffer', None)
+    if buffer is None or len(buffer) != size:
+        buffer = _transfer_buffers.buffer = bytearray(size)
+    return buffer
+
+
+class _TunedDataChannel:
+    """
+    ftplib mixin: applies the client's transfer_tuning to every data connection it opens,
+    uploads plain-FTP files with sendfile() and adds retrbinary_into() for downloads.
+    """
+    transfer_tuning = None
+
+    def ntransfercmd(self, cmd, rest=None):
+        conn, size = super().ntransfercmd(cmd, rest)
+        apply_socket_tuning(conn, self.transfer_tuning)
+        return conn, size
+
+    def storbinary(self, cmd, fp, blocksize=8192, callback=None, rest=None, sent_callback=None):
+        """
+        ftplib's storbinary, except that a real file going over an unencrypted data connection
+        is sent with socket.sendfile(): os.sendfile() where the OS has it, so the data is
+        copied from the page cache to the socket without passing through Python.
+        sent_callback(bytes_sent) follows the upload without giving that up: the file is
+        sent SENDFILE_CHUNK_SIZE at a time, and through ftplib's block loop it is called per block.
+        """
+        if callback or getattr(self, '_prot_p', False) or not isinstance(fp, (io.BufferedReader, io.FileIO)):
+            if sent_callback and not callback:
+                sent = [0]
+                def _report_block(block):
+                    sent[0] += len(block)
+                    sent_callback(sent[0])
+                callback = _report_block
+            return super().storbinary(cmd, fp, blocksize, callback, rest)
+        self.voidcmd('TYPE I')
+        with self.transfercmd(cmd, rest) as conn:
+            if sent_callback is None:
+                conn.sendfile(fp, fp.tell())
+            else:
+                start, sent = fp.tell(), 0
+                while True:
+                    count = conn.sendfile(fp, start + sent, SENDFILE_CHUNK_SIZE)
+                    if not count:
+                        break
+                    sent += count
+                    sent_callback(sent)
+        return self.voidresp()
+
+    def retrbinary_into(self, cmd, write, blocksize=DEFAULT_TRANSFER_BLOCK_SIZE, rest=None):
+        """
+        retrbinary() receiving with recv_into() into one reusable buffer, so no bytes object is
+        allocated per block. write(data) gets a memoryview that is only valid during the call.
+        """
+        buffer = _transfer_buffer(blocksize)
+        view = memoryview(buffer)
+        self.voidcmd('TYPE I')
+        try:
+            with self.transfercmd(cmd, rest) as conn:
+                while True:
+                    count = conn.recv_into(buffer)
+                    if not count:
+                        break
+                    write(view[:count])
+                if isinstance(conn, ssl.SSLSocket): # Shut down the TLS layer, as retrbinary does
+                    conn.unwrap()
+        finally:
+            view.release()
+        return self.voidresp()
+
+
+class TunedFTP(_TunedDataChannel, ftplib.FTP):
+    pass
+
+
+class TunedFTP_TLS(_TunedDataChannel, FTP_TLS):
+    pass
+
+
 def connect_plain_ftp(host, port=21, username=None, password=None, passive_mode=True):
     try:
-        ftp = ftplib.FTP()
+        ftp = TunedFTP()
         ftp.connect(host, port)
         if username and password: # Allow anonymous FTP if no user/pass
             ftp.login(username, password)
@@ -33,7 +249,7 @@ def connect_plain_ftp(host, port=21, username=None, password=None, passive_mode=
 
 def connect_ftps(host, port=21, username=None, password=None, passive_mode=True):
     try:
-        ftps = FTP_TLS()
+        ftps = TunedFTP_TLS()
         ftps.connect(host, port)
         if username and password:
             ftps.login(username, password)
@@ -47,12 +263,17 @@ def connect_ftps(host, port=21, username=None, password=None, passive_mode=True)
         print(f"FTPS Error: {e}")
         return None
 
-def connect_sftp(host, port=22, username=None, password=None):
+def connect_sftp(host, port=22, username=None, password=None, tuning=None):
     transport = None
+    tuning = tuning or {}
+    channel_sizes = {'default_window_size': tuning.get('sftp_window_size') or SFTP_WINDOW_SIZE}
+    if tuning.get('sftp_max_packet_size'):
+        channel_sizes['default_max_packet_size'] = tuning['sftp_max_packet_size']
     try:
-        transport = paramiko.Transport((host, port))
+        transport = paramiko.Transport((host, port), **channel_sizes)
         transport.connect(username=username, password=password)
-        sftp = paramiko.SFTPClient.from_transport(transport)
+        sftp = paramiko.SFTPClient.from_transport(transport, window_size=channel_sizes.get('default_window_size'),
+                                                  max_packet_size=channel_sizes.get('default_max_packet_size'))
         print(f"Successfully connected via SFTP to {host} as {username}")
         return sftp
     except paramiko.AuthenticationException as e:
@@ -68,10 +289,11 @@ def connect_sftp(host, port=22, username=None, password=None):
     # or when the sftp session is done. This is typically handled by the caller
     # by closing the sftp client, which in turn should close the transport.
 
-def connect_server(host, port, username, password, security_type="FTP", passive_mode=True):
+def connect_server(host, port, username, password, security_type="FTP", passive_mode=True, tuning=None):
     """
     Primary connection function to dispatch to specific protocol connectors.
     Port defaults are handled by individual connectors if not provided by caller.
+    tuning is a make_transfer_tuning() dict; it's kept on the client as transfer_tuning.
     """
     print(f"connect_server called with: host={host}, port={port}, user={username}, sec={security_type}, passive={passive_mode}")
 
@@ -82,25 +304,35 @@ def connect_server(host, port, username, password, security_type="FTP", passive_
         print(f"Invalid port value: {port}. Using default for protocol.")
         port = None
 
+    client = None
     if security_type == "None" or security_type == "FTP": # "None" comes from QuickConnectDialog
         # Use default port 21 if not specified
         actual_port = port if port is not None else 21
-        return connect_plain_ftp(host, actual_port, username, password, passive_mode)
+        client = connect_plain_ftp(host, actual_port, username, password, passive_mode)
     elif security_type == "FTPS (SSL/TLS)":
         # Use default port 21 for explicit FTPS (can also be 990 for implicit, but FTP_TLS usually starts plain then secures)
         actual_port = port if port is not None else 21
-        return connect_ftps(host, actual_port, username, password, passive_mode)
+        client = connect_ftps(host, actual_port, username, password, passive_mode)
     elif security_type == "SFTP (SSH)":
         # Use default port 22 if not specified
         actual_port = port if port is not None else 22
         if not paramiko_available:
             print("SFTP (SSH) selected, but paramiko module is not available.")
             return None
-        return connect_sftp(host, actual_port, username, password)
+        client = connect_sftp(host, actual_port, username, password, tuning)
     else:
         print(f"Unsupported security type: {security_type}")
         return None
 
+    if client:
+        # Every connection to the same site shares listing cache entries
+        client.site_key = (host, actual_port, username, "FTP" if security_type == "None" else security_type)
+        client.transfer_tuning = tuning if tuning is not None else make_transfer_tuning()
+        if paramiko_available and isinstance(client, paramiko.SFTPClient):
+            # SFTP has no separate data connections, everything goes over the SSH socket
+            apply_socket_tuning(client.get_channel().get_transport().sock, client.transfer_tuning)
+    return client
+
 def disconnect_ftp(client):
     if client:
         try:
@@ -119,58 +351,537 @@ def disconnect_ftp(client):
             print(f"Error during disconnect: {e}")
 
 
-def list_directory(client, path="."):
+def is_connection_alive(client):
+    """Cheap health check: NOOP for FTP/FTPS, an active transport plus a round trip for SFTP."""
+    try:
+        if isinstance(client, ftplib.FTP):
+            client.voidcmd('NOOP')
+            return True
+        elif paramiko_available and isinstance(client, paramiko.SFTPClient):
+            transport = client.get_transport()
+            if transport is None or not transport.is_active():
+                return False
+            client.normalize('.')
+            return True
+    except Exception as e:
+        print(f"Connection health check failed: {e}")
+    return False
+
+
+def _close_quietly(client):
+    """Closes a connection that may already be dead, without waiting for a QUIT reply."""
+    try:
+        if isinstance(client, ftplib.FTP):
+            client.close()
+        else:
+            disconnect_ftp(client)
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    Keeps logged-in connections per site so they can be reused instead of paying
+    TCP, TLS and login latency again. Sites are keyed by (host, port, username,
+    security type); each site has at most max_per_site connections, idle or borrowed.
+    Connections idle longer than stale_after seconds are health-checked before
+    being handed out, and start_keepalive() sends NOOPs to idle connections.
+    """
+
+    def __init__(self, max_per_site=4, stale_after=15, max_idle_time=300):
+        self.max_per_site = max_per_site
+        self.stale_after = stale_after
+        self.max_idle_time = max_idle_time # Idle connections older than this are closed by keepalive()
+        self._condition = threading.Condition()
+        self._idle = {} # site key -> list of (client, last_used)
+        self._open_counts = {} # site key -> idle + borrowed connections
+        self._owners = {} # id(client) -> (site key, connect_kwargs)
+        self._keepalive_thread = None
+        self._stop_keepalive = threading.Event()
+
+    @staticmethod
+    def site_key(connect_kwargs):
+        security_type = connect_kwargs.get('security_type', 'FTP')
+        if security_type == "None":
+            security_type = "FTP"
+        return (connect_kwargs.get('host'), str(connect_kwargs.get('port') or ''),
+                connect_kwargs.get('username'), security_type)
+
+    def borrow(self, connect_kwargs, timeout=None):
+        """
+        Returns a connection to the site, reusing an idle one when possible.
+        Blocks while the site is at max_per_site until one is returned (or timeout
+        seconds pass). Returns None if no connection could be obtained.
+        """
+        key = self.site_key(connect_kwargs)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            while True:
+                idle = self._idle.get(key)
+                if idle:
+                    client, last_used = idle.pop() # Most recently used first, it's the likeliest to be alive
+                    break
+                if self._open_counts.get(key, 0) < self.max_per_site:
+                    self._open_counts[key] = self._open_counts.get(key, 0) + 1
+                    client = None
+                    break
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    print(f"Connection pool: no connection to {key[0]} became free in time.")
+                    return None
+                self._condition.wait(remaining)
+
+        if client is not None:
+            if time.monotonic() - last_used < self.stale_after or is_connection_alive(client):
+                return client
+            print(f"Connection pool: dropping stale connection to {key[0]}.")
+            _close_quietly(client)
+            self._forget(client, key)
+            return self.borrow(connect_kwargs, timeout)
+
+        client = connect_server(**connect_kwargs)
+        with self._condition:
+            if client:
+                self._owners[id(client)] = (key, dict(connect_kwargs))
+            else:
+                self._open_counts[key] -= 1
+                self._condition.notify()
+        return client
+
+    def give_back(self, client, discard=False):
+        """Returns a borrowed connection. discard=True closes it (e.g. after an error)."""
+        owner = self._owners.get(id(client))
+        if owner is None:
+            disconnect_ftp(client) # Not ours, just close it
+            return
+        key = owner[0]
+        if discard:
+            _close_quietly(client)
+            self._forget(client, key)
+            return
+        with self._condition:
+            self._idle.setdefault(key, []).append((client, time.monotonic()))
+            self._condition.notify()
+
+    def _forget(self, client, key):
+        with self._condition:
+            self._owners.pop(id(client), None)
+            self._open_counts[key] = max(0, self._open_counts.get(key, 1) - 1)
+            self._condition.notify()
+
+    def keepalive(self):
+        """NOOPs idle connections, closing dead ones and ones idle longer than max_idle_time."""
+        now = time.monotonic()
+        with self._condition:
+            to_check = []
+            for key, idle in self._idle.items():
+                to_check.extend((key, client, last_used) for client, last_used in idle)
+                idle.clear()
+        for key, client, last_used in to_check:
+            if now - last_used > self.max_idle_time or not is_connection_alive(client):
+                _close_quietly(client)
+                self._forget(client, key)
+            else:
+                with self._condition:
+                    self._idle.setdefault(key, []).append((client, last_used))
+                    self._condition.notify()
+
+    def start_keepalive(self, interval=30):
+        """Runs keepalive() every interval seconds on a daemon thread."""
+        if self._keepalive_thread and self._keepalive_thread.is_alive():
+            return
+        self._stop_keepalive.clear()
+        def loop():
+            while not self._stop_keepalive.wait(interval):
+                self.keepalive()
+        self._keepalive_thread = threading.Thread(target=loop, name="ConnectionPoolKeepalive", daemon=True)
+        self._keepalive_thread.start()
+
+    def close_site(self, connect_kwargs):
+        """Closes the idle connections of one site. Borrowed ones close when given back with discard=True."""
+        key = self.site_key(connect_kwargs)
+        with self._condition:
+            idle = self._idle.pop(key, [])
+        for client, _ in idle:
+            disconnect_ftp(client)
+            self._forget(client, key)
+
+    def close_all(self):
+        self._stop_keepalive.set()
+        with self._condition:
+            keys = list(self._idle)
+        for key in keys:
+            with self._condition:
+                idle = self._idle.pop(key, [])
+            for client, _ in idle:
+                disconnect_ftp(client)
+                self._forget(client, key)
+
+
+def make_entry(name, file_type, size=0, mtime=None, permissions=None):
+    """
+    Builds a listing entry. Every listing function returns dicts with these keys:
+    'name', 'type' ('file', 'dir' or 'link'), 'size' (bytes, 0 for dirs),
+    'mtime' (UTC epoch seconds or None) and 'permissions' (string or None).
+    """
+    return {'name': name, 'type': file_type, 'size': size, 'mtime': mtime, 'permissions': permissions}
+
+
+def _parse_mlsx_time(value):
+    """MLSD/MLST 'modify' fact (YYYYMMDDHHMMSS[.sss], always UTC) to epoch seconds."""
+    try:
+        whole, _, fraction = value.partition('.')
+        seconds = calendar.timegm(time.strptime(whole, '%Y%m%d%H%M%S'))
+        return seconds + (float('0.' + fraction) if fraction else 0)
+    except ValueError:
+        return None
+
+
+def parse_mlsd_line(line):
+    """
+    Parses one MLSD line ("type=file;size=12;modify=20240101120000; name").
+    Returns None for the '.' and '..' entries (cdir/pdir).
+    """
+    facts_part, sep, name = line.partition(' ')
+    if not sep or not name:
+        return None
+    facts = {}
+    for fact in facts_part.split(';'):
+        key, eq, value = fact.partition('=')
+        if eq:
+            facts[key.lower()] = value
+
+    fact_type = facts.get('type', '').lower()
+    if fact_type in ('cdir', 'pdir'):
+        return None
+    if fact_type == 'dir':
+        file_type = 'dir'
+    elif 'symlink' in fact_type or fact_type.startswith('os.unix=slink'):
+        file_type = 'link'
+    else:
+        file_type = 'file'
+
+    size = facts.get('size') or facts.get('sizd') or '0'
+    permissions = facts.get('unix.mode') or facts.get('perm')
+    mtime = _parse_mlsx_time(facts['modify']) if 'modify' in facts else None
+    return make_entry(name, file_type, int(size) if size.isdigit() and file_type != 'dir' else 0, mtime, permissions)
+
+
+_MONTHS = {name: index for index, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)}
+
+# "drwxr-xr-x  2 owner group  4096 Jan  1 12:00 name" - owner/group vary between servers, so
+# anchor on "<size> <month> <day> <time|year> " and take everything after the next space as the name
+_UNIX_LIST_RE = re.compile(
+    r'^(?P<perm>[-dlbcps][-rwxsStTL]{9})[+@.]?\s+.*?(?P<size>\d+)\s+(?P<month>[A-Za-z]{3})\s+'
+    r'(?P<day>\d{1,2})\s+(?:(?P<hour>\d{1,2}):(?P<minute>\d{2})|(?P<year>\d{4}))\s(?P<name>.+)$')
+
+# "01-15-24  03:45PM       <DIR>          name" (IIS / Windows)
+_DOS_LIST_RE = re.compile(
+    r'^(?P<month>\d{2})-(?P<day>\d{2})-(?P<year>\d{2,4})\s+(?P<hour>\d{1,2}):(?P<minute>\d{2})\s*'
+    r'(?P<ampm>[AaPp][Mm])?\s+(?P<size><DIR>|\d+)\s+(?P<name>.+)$')
+
+
+def _parse_unix_list_line(match):
+    permissions = match.group('perm')
+    name = match.group('name')
+    file_type = {'d': 'dir', 'l': 'link'}.get(permissions[0], 'file')
+    if file_type == 'link' and ' -> ' in name:
+        name = name.split(' -> ', 1)[0]
+
+    mtime = None
+    month = _MONTHS.get(match.group('month').lower())
+    if month:
+        day = int(match.group('day'))
+        if match.group('year'):
+            mtime = calendar.timegm((int(match.group('year')), month, day, 0, 0, 0))
+        else:
+            # No year means "within the last six months": this year, unless that's in the future
+            now = time.gmtime()
+            hour, minute = int(match.group('hour')), int(match.group('minute'))
+            mtime = calendar.timegm((now.tm_year, month, day, hour, minute, 0))
+            if mtime > time.time() + 86400:
+                mtime = calendar.timegm((now.tm_year - 1, month, day, hour, minute, 0))
+
+    size = int(match.group('size')) if file_type != 'dir' else 0
+    return make_entry(name, file_type, size, mtime, permissions)
+
+
+def _parse_dos_list_line(match):
+    year = int(match.group('year'))
+    if year < 100:
+        year += 2000 if year < 70 else 1900
+    hour = int(match.group('hour')) % 12 if match.group('ampm') else int(match.group('hour'))
+    if (match.group('ampm') or '').upper() == 'PM':
+        hour += 12
+    try:
+        mtime = calendar.timegm((year, int(match.group('month')), int(match.group('day')), hour, int(match.group('minute')), 0))
+    except (ValueError, OverflowError):
+        mtime = None
+    if match.group('size') == '<DIR>':
+        return make_entry(match.group('name'), 'dir', 0, mtime)
+    return make_entry(match.group('name'), 'file', int(match.group('size')), mtime)
+
+
+def _parse_eplf_line(line):
+    """EPLF: "+i8388621.29609,m824255902,/,\tdev" - facts before the tab, then the name."""
+    facts, sep, name = line[1:].partition('\t')
+    if not sep or not name:
+        return None
+    file_type = 'file'
+    size = 0
+    mtime = None
+    for fact in facts.split(','):
+        if fact == '/':
+            file_type = 'dir'
+        elif fact.startswith('s') and fact[1:].isdigit():
+            size = int(fact[1:])
+        elif fact.startswith('m') and fact[1:].isdigit():
+            mtime = int(fact[1:])
+    return make_entry(name, file_type, size if file_type == 'file' else 0, mtime)
+
+
+def parse_list_line(line):
+    """
+    Parses one line of a LIST reply in Unix, DOS/IIS or EPLF format into an entry
+    (see make_entry). Returns None for lines that aren't entries (e.g. 'total 42').
+    """
+    if not line:
+        return None
+    if line[0] == '+':
+        return _parse_eplf_line(line)
+    match = _UNIX_LIST_RE.match(line)
+    if match:
+        entry = _parse_unix_list_line(match)
+        return entry if entry['name'] not in ('.', '..') else None
+    match = _DOS_LIST_RE.match(line)
+    if match:
+        return _parse_dos_list_line(match)
+    return None
+
+
+def get_server_features(client):
+    """Returns the set of FEAT keywords (upper case) for an FTP client, cached on the client."""
+    features = getattr(client, 'server_features', None)
+    if features is None:
+        features = set()
+        params = {}
+        try:
+            for line in client.sendcmd('FEAT').splitlines()[1:-1]:
+                parts = line.strip().split(None, 1)
+                if parts:
+                    features.add(parts[0].upper())
+                    params[parts[0].upper()] = parts[1] if len(parts) > 1 else ''
+        except ftplib.all_errors as e:
+            print(f"FEAT not supported: {e}")
+        client.server_features = features
+        client.server_feature_params = params
+    return features
+
+
+def get_feature_params(client, keyword):
+    """The text after a FEAT keyword (e.g. 'SHA-256;SHA-1*;MD5' for HASH), or None if not advertised."""
+    if keyword not in get_server_features(client):
+        return None
+    return getattr(client, 'server_feature_params', {}).get(keyword, '')
+
+
+class ListingCache:
+    """
+    Remote directory listings per (site, path), kept for ttl seconds and evicted
+    least-recently-used beyond max_entries. Operations that change a directory
+    (upload, delete, rename, mkdir) invalidate it.
+    """
+
+    def __init__(self, ttl=60, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # (site key, path) -> (time stored, entries)
+        self._lock = threading.Lock()
+        self._listeners = [] # listener(site key, path, recursive), told about every invalidation
+
+    @staticmethod
+    def _key(client, path):
+        # Clients made by connect_server carry a site_key; anything else is cached per object
+        site = getattr(client, 'site_key', None) or id(client)
+        return site, _normalize_remote_path(path)
+
+    def get(self, client, path):
+        key = self._key(client, path)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                return None
+            stored_at, entries = cached
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return list(entries)
+
+    def put(self, client, path, entries):
+        key = self._key(client, path)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(entries))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, client, path, recursive=False):
+        """Drops the listing of path (and with recursive=True, of everything below it)."""
+        site, path = self._key(client, path)
+        prefix = path.rstrip('/') + '/'
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == site and (key[1] == path or (recursive and key[1].startswith(prefix))):
+                    del self._entries[key]
+        for listener in self._listeners:
+            listener(site, path, recursive)
+
+    def add_listener(self, listener):
+        """Lets other stores of remote state (e.g. a RemoteIndex) follow invalidations."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def invalidate_parent(self, client, path):
+        """Drops the listing of the directory containing path."""
+        self.invalidate(client, posixpath.dirname(_normalize_remote_path(path)) or '.')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _normalize_remote_path(path):
+    path = (path or '.').replace('\\', '/')
+    normalized = posixpath.normpath(path)
+    return normalized if normalized != '//' else '/'
+
+
+listing_cache = ListingCache() # Shared by every connection of this process
+
+
+def _sftp_attr_to_entry(entry_attr):
+    name = entry_attr.filename
+    # Skip . and .. entries
+    if name in ('.', '..'):
+        return None
+    mode = entry_attr.st_mode
+    if mode is not None:
+        file_type = 'dir' if stat.S_ISDIR(mode) else 'link' if stat.S_ISLNK(mode) else 'file'
+        permissions = stat.filemode(mode)
+    else: # Server sent no mode, fall back on the ls-style long name
+        file_type = 'dir' if (entry_attr.longname or '').startswith('d') else 'file'
+        permissions = None
+    size = (entry_attr.st_size or 0) if file_type != 'dir' else 0
+    return make_entry(name, file_type, size, entry_attr.st_mtime, permissions)
+
+
+def _iter_ftp_lines(client, cmd):
+    """
+    Yields the lines of an ASCII-mode data transfer as they arrive (retrlines without the callback).
+    If the consumer stops early the data connection is closed and the server's reply drained,
+    so the control connection stays usable.
+    """
+    client.sendcmd('TYPE A')
+    conn = client.transfercmd(cmd)
+    completed = False
+    try:
+        with conn.makefile('r', encoding=client.encoding) as fp:
+            while True:
+                line = fp.readline(client.maxline + 1)
+                if len(line) > client.maxline:
+                    raise ftplib.Error(f"got more than {client.maxline} bytes")
+                if not line:
+                    break
+                yield line.rstrip('\r\n')
+        if hasattr(conn, 'unwrap'): # FTP_TLS: shut down TLS cleanly like retrlines does
+            conn.unwrap()
+        completed = True
+    finally:
+        conn.close()
+        if completed:
+            client.voidresp()
+        else:
+            try:
+                client.voidresp() # 226, or 426 when the transfer was cut short
+            except ftplib.all_errors:
+                pass
+
+
+def iter_directory(client, path="."):
+    """
+    Generator variant of list_directory: yields entry dicts while the listing is still arriving,
+    so huge directories never sit in memory as raw lines and can be shown incrementally.
+    Unlike list_directory, errors are raised. The client can't be used for other commands
+    until the generator is exhausted or closed.
+    """
+    if isinstance(client, ftplib.FTP): # Handles FTP and FTP_TLS
+        if 'MLST' in get_server_features(client):
+            lines, parse_line = _iter_ftp_lines(client, f'MLSD {path}'), parse_mlsd_line
+        else:
+            lines, parse_line = _iter_ftp_lines(client, f'LIST {path}'), parse_list_line
+        with closing(lines):
+            for line in lines:
+                entry = parse_line(line)
+                if entry:
+                    yield entry
+
+    elif paramiko_available and isinstance(client, paramiko.SFTPClient):
+        # listdir_iter keeps several READDIR requests in flight and yields as replies come in
+        for entry_attr in client.listdir_iter(path):
+            entry = _sftp_attr_to_entry(entry_attr)
+            if entry:
+                yield entry
+    else:
+        raise TypeError("Unsupported client type.")
+
+
+def iter_directory_batches(client, path=".", batch_size=LISTING_BATCH_SIZE, max_delay=0.25):
+    """
+    Groups iter_directory() into lists of up to batch_size entries. A smaller batch is
+    yielded once max_delay seconds have passed, so slow listings still show progress.
+    """
+    return _batched(iter_directory(client, path), batch_size, max_delay)
+
+
+def _batched(entries, batch_size, max_delay):
+    batch = []
+    started = time.monotonic()
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= batch_size or time.monotonic() - started >= max_delay:
+            yield batch
+            batch = []
+            started = time.monotonic()
+    if batch:
+        yield batch
+
+
+def list_directory(client, path=".", use_cache=False):
     """
     Lists directory contents for connected client.
     Returns a list of dictionaries, each with 'name', 'type' ('file'/'dir'), 'size' (for files).
+    With use_cache=True a listing still in listing_cache is returned without a round trip.
+    Use iter_directory() to process very large directories without building the whole list.
     """
     if not client:
         print("Cannot list directory: No connection available.")
         return []
 
+    if use_cache:
+        cached = listing_cache.get(client, path)
+        if cached is not None:
+            return cached
+
     entries = []
     try:
-        if isinstance(client, ftplib.FTP): # Handles FTP and FTP_TLS
-            # Use a list to capture output of dir()
-            lines = []
-            client.dir(path, lines.append)
-            
-            for line in lines:
-                parts = line.split()
-                if len(parts) < 9: # Basic check for valid line format
-                    continue
-                
-                permissions = parts[0]
-                name = " ".join(parts[8:]) # Name can contain spaces
-
-                file_type = 'file'
-                if permissions.startswith('d'):
-                    file_type = 'dir'
-                
-                size = 0
-                if file_type == 'file' and parts[4].isdigit():
-                    size = int(parts[4])
-
-                entries.append({'name': name, 'type': file_type, 'size': size})
-
-        elif paramiko_available and isinstance(client, paramiko.SFTPClient):
-            for entry_attr in client.listdir_attr(path):
-                name = entry_attr.filename
-                # Skip . and .. entries
-                if name in ('.', '..'):
-                    continue
-
-                file_type = 'file'
-                size = entry_attr.st_size if hasattr(entry_attr, 'st_size') else 0
-
-                # Paramiko's SFTPAtrrs has methods to check file types
-                if entry_attr.longname.startswith('d'): # More robust check for directory
-                    file_type = 'dir'
-                # Alternatively, paramiko.stat.S_ISDIR(entry_attr.st_mode)
-                
-                entries.append({'name': name, 'type': file_type, 'size': size})
-        else:
-            print("Cannot list directory: Unsupported client type.")
+        for entry in iter_directory(client, path):
+            entries.append(entry)
+        listing_cache.put(client, path, entries)
     except Exception as e:
         print(f"Error listing directory '{path}': {e}")
     
@@ -179,18 +890,175 @@ def list_directory(client, path="."):
 
 def calculate_local_md5(filepath):
     """Calculates the MD5 checksum of a local file."""
-    md5_hash = hashlib.md5()
-    try:
-        with open(filepath, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                md5_hash.update(chunk)
-        return md5_hash.hexdigest()
-    except FileNotFoundError:
-        print(f"Error: Local file not found at {filepath} for MD5 calculation.")
-        return None
-    except Exception as e:
-        print(f"Error calculating local MD5 for {filepath}: {e}")
-        return None
+    return hashing.hash_local_file(filepath, 'MD5')
+
+def parse_md5_response(response):
+    """Extracts the MD5 from an XMD5/MD5 reply ("213 <hash>", "250 <hash>" or a raw hash), else None."""
+    return parse_hash_response(response, 'MD5')
+
+
+_HEX_DIGEST_LENGTHS = {'SHA-512': 128, 'SHA-256': 64, 'SHA-1': 40, 'MD5': 32, 'CRC32': 8}
+
+# Non-standard but widespread FTP commands that return a file hash
+_FTP_HASH_COMMANDS = (('SHA-512', 'XSHA512'), ('SHA-256', 'XSHA256'), ('SHA-1', 'XSHA1'),
+                      ('MD5', 'XMD5'), ('MD5', 'MD5'), ('CRC32', 'XCRC'))
+
+# SFTP check-file (draft-ietf-secsh-filexfer extensions) algorithm names
+_SFTP_CHECK_FILE_NAMES = {'SHA-512': 'sha512', 'SHA-256': 'sha256', 'SHA-1': 'sha1', 'MD5': 'md5', 'CRC32': 'crc32'}
+
+
+def parse_hash_response(response, algorithm):
+    """Extracts a hex digest of the right length for algorithm from a hash command reply, else None."""
+    length = _HEX_DIGEST_LENGTHS.get(algorithm)
+    for part in reversed(response.split()):
+        if len(part) == length and all(c in '0123456789abcdefABCDEF' for c in part):
+            return part.lower()
+    return None
+
+
+def negotiate_hash_algorithm(client, preferred=hashing.PREFERRED_ALGORITHMS):
+    """
+    Picks how client's server hashes files, cached on the client as client.hash_method =
+    (algorithm, command). FTP: HASH (selected with OPTS HASH) when FEAT lists it, else an
+    advertised XSHA*/XMD5/XCRC command, else ('MD5', None) to try XMD5 and MD5 unadvertised.
+    SFTP: (None, 'check-file') until the first get_remote_hash() finds what the server accepts.
+    """
+    method = getattr(client, 'hash_method', None)
+    if method is not None:
+        return method
+
+    if isinstance(client, ftplib.FTP):
+        method = ('MD5', None)
+        hash_params = get_feature_params(client, 'HASH')
+        if hash_params is not None:
+            offered = {}
+            for name in hash_params.split(';'):
+                algorithm = hashing.normalize_algorithm(name.strip().rstrip('*'))
+                if algorithm:
+                    offered[algorithm] = name.strip().endswith('*') # '*' marks the selected one
+            for algorithm in preferred:
+                if algorithm in offered:
+                    try:
+                        if not offered[algorithm]:
+                            client.sendcmd(f'OPTS HASH {algorithm}')
+                        method = (algorithm, 'HASH')
+                        break
+                    except ftplib.error_perm as e:
+                        print(f"OPTS HASH {algorithm} refused: {e}")
+        if method[1] is None:
+            features = get_server_features(client)
+            advertised = [(algorithm, command) for algorithm, command in _FTP_HASH_COMMANDS if command in features]
+            for algorithm in preferred:
+                command = next((command for name, command in advertised if name == algorithm), None)
+                if command:
+                    method = (algorithm, command)
+                    break
+    elif paramiko_available and isinstance(client, paramiko.SFTPClient):
+        method = (None, 'check-file')
+    else:
+        method = (None, None)
+    client.hash_method = method
+    return method
+
+
+def _sftp_check_file(client, remote_path, preferred):
+    """Tries check-file with each algorithm until the server accepts one; remembers it on the client."""
+    algorithm, command = client.hash_method
+    candidates = [algorithm] if algorithm else list(preferred)
+    for candidate in candidates:
+        try:
+            with client.open(remote_path, 'rb') as remote_file:
+                digest = remote_file.check(_SFTP_CHECK_FILE_NAMES[candidate])
+        except IOError as e:
+            if algorithm: # A known-good algorithm failing means the file is the problem
+                print(f"check-file {candidate} failed for {remote_path}: {e}")
+                return None, None
+            continue
+        client.hash_method = (candidate, 'check-file')
+        return candidate, binascii.hexlify(digest).decode('ascii')
+    print("Server does not support SFTP check-file; remote hashes are unavailable.")
+    client.hash_method = (None, None)
+    return None, None
+
+
+def _parse_hash_reply(command, response, algorithm, remote_path):
+    if command == 'HASH': # "213 SHA-256 0-49 <hash> <path>"
+        parts = response[4:].split(' ', 3)
+        if len(parts) >= 3 and hashing.normalize_algorithm(parts[0]) == algorithm:
+            return parts[2].lower()
+    digest = parse_hash_response(response, algorithm)
+    if not digest:
+        print(f"Warning: Received non-standard {command} response for {remote_path}: {response}")
+    return digest
+
+
+def get_remote_hash(client, remote_path, preferred=hashing.PREFERRED_ALGORITHMS):
+    """
+    Asks the server for the hash of remote_path using the negotiated method.
+    Returns (algorithm, hex digest), or (None, None) if the server can't provide one.
+    """
+    algorithm, command = negotiate_hash_algorithm(client, preferred)
+    if command is None and algorithm is None:
+        return None, None
+
+    if isinstance(client, ftplib.FTP):
+        commands = [command] if command else ['XMD5', 'MD5'] # Unadvertised: try both, like servers of old
+        unknown = 0
+        for cmd in commands:
+            try:
+                response = client.sendcmd(f'{cmd} {remote_path}')
+            except ftplib.error_perm as e:
+                print(f"{cmd} command failed for {remote_path}: {e}")
+                if str(e)[:3] in ('500', '502'): # Not understood / not implemented, as opposed to a missing file
+                    unknown += 1
+                    if command is None and unknown == len(commands):
+                        client.hash_method = (None, None) # Don't probe again on this connection
+                continue
+            except ftplib.all_errors as e:
+                print(f"Error executing {cmd} command for {remote_path}: {e}")
+                return None, None
+            digest = _parse_hash_reply(cmd, response, algorithm, remote_path)
+            if digest:
+                if command is None:
+                    client.hash_method = (algorithm, cmd) # Learned; later files go straight to it
+                return algorithm, digest
+        return None, None
+
+    if paramiko_available and isinstance(client, paramiko.SFTPClient):
+        return _sftp_check_file(client, remote_path, preferred)
+    return None, None
+
+
+def get_remote_hashes(client, remote_paths, preferred=hashing.PREFERRED_ALGORITHMS):
+    """
+    get_remote_hash() for many files. Once the FTP hash command is known the requests are
+    pipelined, PIPELINE_DEPTH at a time, saving a round trip per file.
+    Returns a list of (algorithm, hex digest) in order, (None, None) where there is none.
+    """
+    pending = list(remote_paths)
+    results = []
+    # An unadvertised command is learned from the first file that answers
+    while pending and isinstance(client, ftplib.FTP) and negotiate_hash_algorithm(client, preferred)[1] is None:
+        results.append(get_remote_hash(client, pending.pop(0), preferred))
+    if not pending:
+        return results
+    algorithm, command = negotiate_hash_algorithm(client, preferred)
+    if not isinstance(client, ftplib.FTP):
+        return results + [get_remote_hash(client, path, preferred) for path in pending]
+
+    for start in range(0, len(pending), PIPELINE_DEPTH):
+        chunk = pending[start:start + PIPELINE_DEPTH]
+        for path in chunk:
+            client.putcmd(f'{command} {path}')
+        for path in chunk: # Replies come back in order; a refusal doesn't desync the rest
+            try:
+                digest = _parse_hash_reply(command, client.getresp(), algorithm, path)
+            except (ftplib.error_reply, ftplib.error_temp, ftplib.error_perm) as e:
+                print(f"{command} command failed for {path}: {e}")
+                digest = None
+            results.append((algorithm, digest) if digest else (None, None))
+    return results
+
 
 def get_remote_md5_ftp(client, remote_path):
     """Attempts to get MD5 hash of a remote file using XMD5 or MD5 commands for FTP/FTPS."""
@@ -198,132 +1066,677 @@ def get_remote_md5_ftp(client, remote_path):
         print("Remote MD5 check (XMD5/MD5 command) is only supported for FTP/FTPS clients.")
         return None
 
-    md5_hash = None
-    try:
-        # Try XMD5 first
-        response = client.sendcmd('XMD5 ' + remote_path)
-        # Response typically "213 <hash>" or "<hash>" for some servers on 2xx success
-        # For ProFTPD, it's "250 <hash>"
-        if response.startswith(('213 ', '250 ')): # Check for common success codes
-            md5_hash = response.split()[-1]
-        elif len(response.split()) == 1 and len(response) == 32 and all(c in '0123456789abcdefABCDEF' for c in response): # Raw hash
-             md5_hash = response
-        else: # Fallback for unexpected positive responses, try to extract if it looks like a hash
-            parts = response.split()
-            if parts and len(parts[-1]) == 32 and all(c in '0123456789abcdefABCDEF' for c in parts[-1]):
-                 md5_hash = parts[-1]
-
-    except ftplib.error_perm as e_perm: # Command not supported or file not found (5xx)
-        print(f"XMD5 command failed for {remote_path}: {e_perm}. Trying MD5 command.")
+    for command in ('XMD5', 'MD5'):
         try:
-            response = client.sendcmd('MD5 ' + remote_path)
-            if response.startswith(('213 ', '250 ')):
-                md5_hash = response.split()[-1]
-            elif len(response.split()) == 1 and len(response) == 32 and all(c in '0123456789abcdefABCDEF' for c in response):
-                 md5_hash = response
-            else:
-                parts = response.split()
-                if parts and len(parts[-1]) == 32 and all(c in '0123456789abcdefABCDEF' for c in parts[-1]):
-                     md5_hash = parts[-1]
-        except ftplib.error_perm as e_perm_md5:
-            print(f"MD5 command also failed for {remote_path}: {e_perm_md5}")
-        except Exception as e_md5: # Other errors for MD5 command
-            print(f"Error executing MD5 command for {remote_path}: {e_md5}")
-    except Exception as e: # Other errors for XMD5 command
-        print(f"Error executing XMD5 command for {remote_path}: {e}")
-
-    if md5_hash and len(md5_hash) == 32 and all(c in '0123456789abcdefABCDEF' for c in md5_hash.lower()):
-        return md5_hash.lower()
+            md5_hash = parse_md5_response(client.sendcmd(f'{command} {remote_path}'))
+            if md5_hash:
+                return md5_hash
+        except ftplib.error_perm as e: # Command not supported or file not found (5xx)
+            print(f"{command} command failed for {remote_path}: {e}")
+        except Exception as e:
+            print(f"Error executing {command} command for {remote_path}: {e}")
+            return None
+    return None
+
+
+def verify_remote_file(client, local_path, remote_path, local_digest=None):
+    """
+    Compares local_path with remote_path using the best hash the server offers.
+    local_digest=(algorithm, hex digest) skips re-reading the local file when it matches the
+    server's algorithm. Returns the algorithm used, or None if the server can't hash.
+    Raises IntegrityCheckFailedError on a mismatch.
+    """
+    algorithm, remote_digest = get_remote_hash(client, remote_path)
+    if not remote_digest:
+        print(f"Warning: Could not verify integrity for {remote_path}. Server offers no usable hash command.")
+        return None
+    if local_digest and local_digest[0] == algorithm:
+        local_hex = local_digest[1]
     else:
-        if md5_hash: # Got something but it doesn't look like an MD5
-            print(f"Warning: Received non-standard MD5 response for {remote_path}: {response}")
+        local_hex = hashing.hash_local_file(local_path, algorithm)
+    print(f"Local {algorithm}: {local_hex}, Remote {algorithm}: {remote_digest}")
+    if local_hex != remote_digest:
+        raise IntegrityCheckFailedError(f"Integrity check FAILED for {remote_path}. Local {algorithm}: {local_hex}, Remote {algorithm}: {remote_digest}")
+    print(f"Integrity check PASSED for {remote_path} ({algorithm}).")
+    return algorithm
+
+
+def _resume_offset(journal, direction, local_path, remote_path, source_size, dest_size, source_mtime=None):
+    """
+    Returns how many bytes already at the destination can be kept, or 0 to start over.
+    The destination is only continued if the journal recorded this transfer, with the
+    source at the size/mtime it has now; any other file in the way is overwritten.
+    An entry recorded without a size (a server without SIZE) can't be checked and is restarted.
+    """
+    if not dest_size or source_size is None or dest_size > source_size or not journal:
+        return 0
+    entry = journal.get(direction, local_path, remote_path)
+    if not entry or 'segments' in entry: # A segmented download's file is preallocated, its length means nothing
+        return 0
+    if entry.get('size') is None:
+        return 0
+    if entry.get('size') != source_size or entry.get('mtime') != source_mtime:
+        print(f"Source changed since the partial transfer of {local_path}, restarting from zero.")
+        return 0
+    return dest_size
+
+
+def _copy_stream(source, dest, remaining=None, blocksize=SEGMENT_BLOCK_SIZE):
+    """Copies from one file object to another, optionally at most `remaining` bytes."""
+    while remaining is None or remaining > 0:
+        data = source.read(blocksize if remaining is None else min(blocksize, remaining))
+        if not data:
+            break
+        dest.write(data)
+        if remaining is not None:
+            remaining -= len(data)
+
+
+def _inline_hasher(client, wanted):
+    """
+    (algorithm, hasher) for hashing a file while it is transferred, in the algorithm the
+    server will verify with, or None when not wanted or the algorithm isn't known yet
+    (SFTP before the first check-file; verify_remote_file then reads the file instead).
+    """
+    if not wanted:
         return None
+    algorithm = negotiate_hash_algorithm(client)[0]
+    return (algorithm, hashing.new_hasher(algorithm)) if algorithm else None
 
 
-def upload_file(client, local_path, remote_path, verify_integrity=False):
+def _inline_digest(inline):
+    return (inline[0], inline[1].hexdigest()) if inline else None
+
+
+def _sftp_send(client, source, remote_path, offset, total_size, progress_callback=None, throttle=None):
+    """
+    Writes source (from its current position) to remote_path from offset on, as pipelined
+    write requests of the tuned size: paramiko only waits for acknowledgements once many
+    are outstanding. Checks the remote size afterwards, as put() does.
+    """
+    tuning = getattr(client, 'transfer_tuning', None) or {}
+    block_size = transfer_block_size(client)
+    done = offset
+    with client.open(remote_path, 'r+b' if offset else 'wb') as remote_file:
+        remote_file.MAX_REQUEST_SIZE = tuning.get('sftp_request_size') or SFTP_REQUEST_SIZE
+        remote_file.set_pipelined(True)
+        remote_file.seek(offset)
+        while True:
+            data = source.read(block_size)
+            if not data:
+                break
+            if throttle:
+                throttle.consume(len(data))
+            remote_file.write(data)
+            done += len(data)
+            if progress_callback:
+                progress_callback(done, total_size)
+    remote_size = client.stat(remote_path).st_size # After close, which waits for every write
+    if remote_size != total_size:
+        raise IOError(f"Size mismatch after SFTP upload: {remote_size} != {total_size}")
+
+
+def _sftp_receive(client, remote_path, sink, offset=0, progress_callback=None, throttle=None):
+    """
+    Reads remote_path from offset on into sink with up to sftp_prefetch_requests read
+    requests in flight, so throughput isn't limited to one request per round trip.
+    With a throttle, blocks are requested one at a time once the throttle lets them go:
+    prefetched data is already on the wire, so limiting only the loop wouldn't hold the rate.
+    """
+    tuning = getattr(client, 'transfer_tuning', None) or {}
+    block_size = transfer_block_size(client)
+    with client.open(remote_path, 'rb') as remote_file:
+        remote_file.MAX_REQUEST_SIZE = tuning.get('sftp_request_size') or SFTP_REQUEST_SIZE
+        total_size = remote_file.stat().st_size
+        blocks = [(start, min(block_size, total_size - start)) for start in range(offset, total_size, block_size)]
+        done = offset
+        for batch in ([block] for block in blocks) if throttle else [blocks]:
+            if throttle:
+                throttle.consume(batch[0][1])
+            for data in remote_file.readv(batch, tuning.get('sftp_prefetch_requests') or SFTP_PREFETCH_REQUESTS):
+                sink.write(data)
+                done += len(data)
+                if progress_callback:
+                    progress_callback(done, total_size)
+    if done != total_size:
+        raise IOError(f"SFTP download of {remote_path} ended at {done} of {total_size} bytes.")
+
+
+def upload_file(client, local_path, remote_path, verify_integrity=False, resume=False, journal=None, hash_inline=False,
+                progress_callback=None, throttle=None):
+    """
+    Uploads local_path to remote_path.
+    With resume=True a shorter remote file is continued with APPE (FTP/FTPS) or an
+    offset write (SFTP) instead of being sent again from zero. If a ResumeJournal is
+    given, the transfer is recorded in it until it completes.
+    With verify_integrity the file is hashed as it is sent, so checking it against the
+    server's hash doesn't read it a second time. hash_inline=True hashes it the same way
+    without checking, for verification elsewhere (see verification.VerificationPool).
+    progress_callback(bytes_done, total_size) is called once with the starting offset and
+    then as blocks are sent; plain FTP reports per sendfile() chunk. Every block passes
+    the rate_limiter.Throttle, if given; plain FTP uploads only check it once per file, so
+    a file started while no limit applies is sent with sendfile() at full speed.
+    Returns (algorithm, hex digest) when the file was hashed, else None.
+    """
     if not client:
         print("Upload Error: No connection available.")
         raise ConnectionError("No FTP/SFTP connection available.")
 
     try:
+        local_size = os.path.getsize(local_path)
+        local_mtime = os.path.getmtime(local_path)
+        offset = 0
+        if resume and journal and journal.get('upload', local_path, remote_path): # Only journaled transfers are continued
+            offset = _resume_offset(journal, 'upload', local_path, remote_path, local_size,
+                                    get_remote_size(client, remote_path), local_mtime)
+        if journal:
+            journal.start('upload', local_path, remote_path, local_size, local_mtime)
+        if progress_callback:
+            progress_callback(offset, local_size)
+        inline = _inline_hasher(client, verify_integrity or hash_inline)
+
         if isinstance(client, ftplib.FTP): # Handles FTP and FTP_TLS
             with open(local_path, 'rb') as f:
-                client.storbinary(f'STOR {remote_path}', f)
-            print(f"Successfully uploaded (FTP/FTPS) {local_path} to {remote_path}")
+                if offset and inline: # The part already on the server still counts towards the hash
+                    hashing.update_from_file(inline[1], f, offset)
+                elif offset:
+                    f.seek(offset)
+                source = hashing.HashingReader(f, inline[1]) if inline else f
+                if not (throttle and throttle.limited()): # Unlimited right now, keep sendfile() for this file
+                    throttle = None
+                sent = [offset]
+                def _count_block(block):
+                    sent[0] += len(block)
+                    if throttle:
+                        throttle.consume(len(block))
+                    if progress_callback:
+                        progress_callback(sent[0], local_size)
+                store_kwargs = {'blocksize': transfer_block_size(client)}
+                if throttle or (progress_callback and not isinstance(client, _TunedDataChannel)):
+                    store_kwargs['callback'] = _count_block
+                elif progress_callback: # Reported per sendfile() chunk, so the upload stays zero-copy
+                    store_kwargs['sent_callback'] = lambda count: progress_callback(offset + count, local_size)
+                if offset and offset == local_size:
+                    print(f"Remote file {remote_path} is already complete, nothing to resume.")
+                elif offset:
+                    client.storbinary(f'APPE {remote_path}', source, **store_kwargs)
+                    print(f"Successfully resumed upload (FTP/FTPS) of {local_path} to {remote_path} from byte {offset}")
+                else:
+                    client.storbinary(f'STOR {remote_path}', source, **store_kwargs)
+                    print(f"Successfully uploaded (FTP/FTPS) {local_path} to {remote_path}")
 
             if verify_integrity:
                 print(f"Verifying integrity of {remote_path}...")
-                local_md5 = calculate_local_md5(local_path)
-                remote_md5 = get_remote_md5_ftp(client, remote_path)
-                print(f"Local MD5: {local_md5}, Remote MD5: {remote_md5}")
-                if local_md5 and remote_md5:
-                    if local_md5 == remote_md5:
-                        print(f"Integrity check PASSED for {remote_path}.")
-                    else:
-                        raise IntegrityCheckFailedError(f"Integrity check FAILED for {remote_path}. Local MD5: {local_md5}, Remote MD5: {remote_md5}")
-                else:
-                    print(f"Warning: Could not verify integrity for {remote_path} due to missing MD5 hash(es). Server might not support XMD5/MD5 command.")
+                verify_remote_file(client, local_path, remote_path, _inline_digest(inline))
 
         elif paramiko_available and isinstance(client, paramiko.SFTPClient):
-            client.put(local_path, remote_path) # SFTP does its own integrity checks by default in most implementations
-            print(f"Successfully uploaded (SFTP) {local_path} to {remote_path}")
+            with open(local_path, 'rb') as f:
+                if offset and inline:
+                    hashing.update_from_file(inline[1], f, offset)
+                elif offset:
+                    f.seek(offset)
+                source = hashing.HashingReader(f, inline[1]) if inline else f
+                if offset and offset == local_size:
+                    print(f"Remote file {remote_path} is already complete, nothing to resume.")
+                elif offset:
+                    _sftp_send(client, source, remote_path, offset, local_size, progress_callback, throttle)
+                    print(f"Successfully resumed upload (SFTP) of {local_path} to {remote_path} from byte {offset}")
+                else:
+                    _sftp_send(client, source, remote_path, 0, local_size, progress_callback, throttle)
+                    print(f"Successfully uploaded (SFTP) {local_path} to {remote_path}")
             if verify_integrity:
-                 print("Note: SFTP upload includes inherent integrity checks. Manual MD5 check not typically performed for SFTP via this client.")
+                # Servers without check-file only get SFTP's own transport integrity
+                verify_remote_file(client, local_path, remote_path, _inline_digest(inline))
         else:
             print(f"Upload Error: Unsupported client type for {local_path}")
             raise TypeError("Unsupported client type for upload.")
+
+        if journal:
+            journal.finish('upload', local_path, remote_path)
+        return _inline_digest(inline)
     except IntegrityCheckFailedError as icfe:
         # Re-raise so GUI can catch it
         raise icfe
     except Exception as e: # Catches ftplib.all_errors and paramiko exceptions
         print(f"Upload Error for {local_path} to {remote_path}: {e}")
         raise IOError(f"Upload failed: {e}")
+    finally:
+        # Even a failed upload may have left a partial file behind
+        listing_cache.invalidate_parent(client, remote_path)
+
+
+def _progress_writer(write, done, total_size, progress_callback, throttle=None):
+    """write, wrapped to pass every block through throttle and report progress_callback(bytes_done, total_size)."""
+    if not progress_callback and not throttle:
+        return write
+    received = [done]
+    def write_and_report(data):
+        write(data)
+        received[0] += len(data)
+        if throttle: # TCP flow control passes the wait on to the sender
+            throttle.consume(len(data))
+        if progress_callback:
+            progress_callback(received[0], total_size)
+    return write_and_report
 
 
-def download_file(client, remote_path, local_path, verify_integrity=False):
+def _retrieve(client, cmd, write, rest=None):
+    """RETR through retrbinary_into() on our own FTP classes, plain retrbinary() on any other ftplib client."""
+    retrieve = getattr(client, 'retrbinary_into', None) or client.retrbinary
+    return retrieve(cmd, write, blocksize=transfer_block_size(client), rest=rest)
+
+
+def download_file(client, remote_path, local_path, verify_integrity=False, resume=False, journal=None, hash_inline=False,
+                  progress_callback=None, throttle=None):
+    """
+    Downloads remote_path to local_path.
+    With resume=True a shorter local file is continued with REST (FTP/FTPS) or an
+    offset read (SFTP). If a ResumeJournal is given, the transfer is recorded in it
+    until it completes. With verify_integrity (or hash_inline, see upload_file) the data
+    is hashed as it arrives; returns (algorithm, hex digest) then, else None.
+    progress_callback(bytes_done, total_size) is called as blocks arrive; total_size is
+    None for FTP servers without SIZE. Every block passes the rate_limiter.Throttle, if given.
+    Raises IOError if the download fails, IntegrityCheckFailedError if verification does.
+    """
     if not client:
         print("Download Error: No connection available.")
-        return
-
-    remote_md5_for_check = None
-    if verify_integrity and isinstance(client, ftplib.FTP): # FTP/FTPS
-        print(f"Attempting to get remote MD5 for {remote_path} before download...")
-        remote_md5_for_check = get_remote_md5_ftp(client, remote_path)
-        if not remote_md5_for_check:
-            print(f"Warning: Could not retrieve remote MD5 for {remote_path}. Will skip integrity check.")
-        else:
-            print(f"Remote MD5 for {remote_path} is {remote_md5_for_check}.")
+        raise ConnectionError("No FTP/SFTP connection available.")
 
     try:
+        offset = 0
+        remote_size = remote_mtime = None
+        if journal:
+            # The journal keeps the source's size and mtime, so a later resume can tell whether it changed
+            remote_size, remote_mtime = get_remote_stat(client, remote_path)
+            if resume and os.path.exists(local_path):
+                offset = _resume_offset(journal, 'download', local_path, remote_path, remote_size,
+                                        os.path.getsize(local_path), remote_mtime)
+            journal.start('download', local_path, remote_path, remote_size, remote_mtime)
+        elif progress_callback and isinstance(client, ftplib.FTP):
+            remote_size = get_remote_size(client, remote_path)
+        inline = _inline_hasher(client, verify_integrity or hash_inline)
+        if inline and offset:
+            with open(local_path, 'rb') as f: # The part kept from last time still counts towards the hash
+                hashing.update_from_file(inline[1], f, offset)
+
         if isinstance(client, ftplib.FTP): # Handles FTP and FTP_TLS
-            with open(local_path, 'wb') as f:
-                client.retrbinary(f'RETR {remote_path}', f.write)
-            print(f"Successfully downloaded (FTP/FTPS) {remote_path} to {local_path}")
+            if offset and offset == remote_size:
+                print(f"Local file {local_path} is already complete, nothing to resume.")
+            elif offset:
+                with open(local_path, 'ab') as f:
+                    sink = hashing.HashingWriter(f, inline[1]) if inline else f
+                    _retrieve(client, f'RETR {remote_path}', _progress_writer(sink.write, offset, remote_size, progress_callback, throttle),
+                              rest=offset)
+                print(f"Successfully resumed download (FTP/FTPS) of {remote_path} to {local_path} from byte {offset}")
+            else:
+                with open(local_path, 'wb') as f:
+                    sink = hashing.HashingWriter(f, inline[1]) if inline else f
+                    _retrieve(client, f'RETR {remote_path}', _progress_writer(sink.write, 0, remote_size, progress_callback, throttle))
+                print(f"Successfully downloaded (FTP/FTPS) {remote_path} to {local_path}")
 
-            if verify_integrity and remote_md5_for_check: # Only if we got remote MD5 earlier
+            if verify_integrity:
                 print(f"Verifying integrity of downloaded file {local_path}...")
-                local_md5 = calculate_local_md5(local_path)
-                print(f"Local MD5: {local_md5}, Expected Remote MD5: {remote_md5_for_check}")
-                if local_md5 and remote_md5_for_check: # Should always have remote_md5_for_check here
-                    if local_md5 == remote_md5_for_check:
-                        print(f"Integrity check PASSED for {local_path}.")
-                    else:
-                        raise IntegrityCheckFailedError(f"Integrity check FAILED for {local_path}. Local MD5: {local_md5}, Expected Remote MD5: {remote_md5_for_check}")
-                else: # local_md5 failed
-                    print(f"Warning: Could not calculate local MD5 for {local_path}. Integrity check skipped.")
+                verify_remote_file(client, local_path, remote_path, _inline_digest(inline))
 
         elif paramiko_available and isinstance(client, paramiko.SFTPClient):
-            client.get(remote_path, local_path) # SFTP does its own integrity checks
-            print(f"Successfully downloaded (SFTP) {remote_path} to {local_path}")
+            if offset and offset == remote_size:
+                print(f"Local file {local_path} is already complete, nothing to resume.")
+            elif offset:
+                with open(local_path, 'ab') as f:
+                    _sftp_receive(client, remote_path, hashing.HashingWriter(f, inline[1]) if inline else f,
+                                  offset, progress_callback, throttle)
+                print(f"Successfully resumed download (SFTP) of {remote_path} to {local_path} from byte {offset}")
+            else:
+                with open(local_path, 'wb') as f:
+                    _sftp_receive(client, remote_path, hashing.HashingWriter(f, inline[1]) if inline else f,
+                                  0, progress_callback, throttle)
+                print(f"Successfully downloaded (SFTP) {remote_path} to {local_path}")
             if verify_integrity:
-                print("Note: SFTP download includes inherent integrity checks. Manual MD5 check not typically performed for SFTP via this client.")
+                verify_remote_file(client, local_path, remote_path, _inline_digest(inline))
         else:
             print(f"Download Error: Unsupported client type for {remote_path}")
+            raise TypeError("Unsupported client type for download.")
+
+        if journal:
+            journal.finish('download', local_path, remote_path)
+        return _inline_digest(inline)
     except IntegrityCheckFailedError as icfe:
-        print(f"Error: {icfe}") # Propagate or handle as needed
-        # Potentially delete local file if integrity check fails? os.remove(local_path)
-    except Exception as e:
+        print(f"Error: {icfe}")
+        raise icfe
+    except Exception as e: # Catches ftplib.all_errors and paramiko exceptions
         print(f"Download Error for {remote_path} to {local_path}: {e}")
+        raise IOError(f"Download failed: {e}")
+
+
+def get_remote_size(client, remote_path):
+    """Returns the size of a remote file in bytes, or None if it can't be determined."""
+    try:
+        if isinstance(client, ftplib.FTP):
+            client.voidcmd('TYPE I') # SIZE is only reliable in binary mode
+            return client.size(remote_path)
+        elif paramiko_available and isinstance(client, paramiko.SFTPClient):
+            return client.stat(remote_path).st_size
+    except Exception as e:
+        print(f"Could not get size of {remote_path}: {e}")
+    return None
+
+
+def get_remote_stat(client, remote_path):
+    """
+    Returns (size, mtime) of a remote file, either None if it can't be determined.
+    FTP asks SIZE and MDTM (UTC, like MLSD's modify fact); SFTP needs a single stat.
+    """
+    if paramiko_available and isinstance(client, paramiko.SFTPClient):
+        try:
+            attributes = client.stat(remote_path)
+            return attributes.st_size, attributes.st_mtime
+        except Exception as e:
+            print(f"Could not stat {remote_path}: {e}")
+            return None, None
+    size = get_remote_size(client, remote_path)
+    mtime = None
+    if isinstance(client, ftplib.FTP):
+        try:
+            resp = client.sendcmd(f'MDTM {remote_path}')
+            if resp[:3] == '213':
+                mtime = _parse_mlsx_time(resp[3:].strip())
+        except ftplib.error_perm as e: # 500/502 without MDTM, 550 for no such file
+            print(f"Could not get modification time of {remote_path}: {e}")
+    return size, mtime
+
+
+def remote_directory_exists(client, remote_path):
+    """
+    Returns whether remote_path is an existing directory. For FTP this is a CWD there and
+    back; a 550 means it doesn't exist (or can't be entered). Connection errors are raised.
+    """
+    if isinstance(client, ftplib.FTP):
+        current = client.pwd()
+        try:
+            client.cwd(remote_path)
+        except ftplib.error_perm:
+            return False
+        client.cwd(current)
+        return True
+    elif paramiko_available and isinstance(client, paramiko.SFTPClient):
+        try:
+            return stat.S_ISDIR(client.stat(remote_path).st_mode)
+        except FileNotFoundError:
+            return False
+    else:
+        raise TypeError("Unsupported client type.")
+
+
+def _split_segments(total_size, segments):
+    """Splits total_size bytes into (offset, length) ranges, one per segment."""
+    segments = max(1, min(segments, total_size)) if total_size else 1
+    base, extra = divmod(total_size, segments)
+    ranges = []
+    offset = 0
+    for i in range(segments):
+        length = base + (1 if i < extra else 0)
+        ranges.append((offset, length))
+        offset += length
+    return ranges
+
+
+def _download_segment(client, remote_path, local_path, offset, length, on_bytes, checkpoint=None):
+    """
+    Fetches bytes [offset, offset + length) of remote_path into the same range of local_path.
+    checkpoint(bytes_written), if given, is called whenever what was received so far is
+    flushed to disk: every SEGMENT_CHECKPOINT_SIZE bytes and when the segment stops,
+    finished or not.
+    """
+    block_size = transfer_block_size(client)
+    remaining = length
+    with open(local_path, 'r+b') as f:
+        f.seek(offset)
+        unsaved = [0]
+        def write(data):
+            f.write(data)
+            on_bytes(len(data))
+            unsaved[0] += len(data)
+            if checkpoint and unsaved[0] >= SEGMENT_CHECKPOINT_SIZE:
+                f.flush()
+                checkpoint(length - remaining)
+                unsaved[0] = 0
+        try:
+            if isinstance(client, ftplib.FTP):
+                client.voidcmd('TYPE I')
+                conn = client.transfercmd(f'RETR {remote_path}', rest=offset)
+                view = memoryview(_transfer_buffer(block_size))
+                try:
+                    while remaining > 0:
+                        count = conn.recv_into(view, min(block_size, remaining))
+                        if not count:
+                            break
+                        remaining -= count
+                        write(view[:count])
+                finally:
+                    view.release()
+                    conn.close()
+                try:
+                    # 226 if we read to EOF, 426/451 if we closed the data channel early
+                    client.voidresp()
+                except ftplib.all_errors:
+                    pass
+            elif paramiko_available and isinstance(client, paramiko.SFTPClient):
+                with client.open(remote_path, 'rb') as remote_file:
+                    remote_file.seek(offset)
+                    while remaining > 0:
+                        data = remote_file.read(min(block_size, remaining))
+                        if not data:
+                            break
+                        remaining -= len(data)
+                        write(data)
+            else:
+                raise TypeError("Unsupported client type for segmented download.")
+        finally:
+            if checkpoint and unsaved[0]:
+                f.flush()
+                checkpoint(length - remaining)
+    if remaining > 0:
+        raise IOError(f"Segment at offset {offset} ended {remaining} bytes early.")
+
+
+def _journaled_segments(journal, local_path, remote_path, total_size, mtime=None):
+    """
+    [offset, length, bytes done] per segment of an interrupted segmented download of
+    remote_path that can be continued, or None to start over (also when remote_path
+    changed size or mtime since).
+    """
+    entry = journal.get('download', local_path, remote_path) if journal else None
+    if not entry or entry.get('size') != total_size or entry.get('mtime') != mtime or not entry.get('segments'):
+        return None
+    try:
+        if os.path.getsize(local_path) != total_size:
+            return None
+    except OSError:
+        return None
+    return [list(segment) for segment in entry['segments']]
+
+
+def _open_worker_connection(connect_kwargs, pool=None):
+    """An extra connection to the site: borrowed from pool, or opened with connect_server(**connect_kwargs)."""
+    return pool.borrow(connect_kwargs) if pool else connect_server(**connect_kwargs)
+
+
+def _close_worker_connection(client, pool=None, discard=False):
+    if pool:
+        pool.give_back(client, discard=discard)
+    else:
+        disconnect_ftp(client)
+
+
+def download_file_segmented(connect_kwargs, remote_path, local_path, segments=4, progress_callback=None, pool=None,
+                            throttle=None, verify_integrity=False, resume=False, journal=None):
+    """
+    Downloads one large remote file over several connections at once.
+    The file is split into byte ranges; each range is fetched on its own connection
+    (borrowed from pool, or opened with connect_server(**connect_kwargs)) using
+    REST+RETR for FTP/FTPS or a seek on the remote file for SFTP, and written into
+    a preallocated local file.
+    If a ResumeJournal is given, how far each range got is recorded in it as the data is
+    written, and with resume=True an interrupted download continues every range where it
+    stopped. verify_integrity checks the finished file against the server's hash.
+    progress_callback(bytes_done, total_size) is called from the segment threads. All
+    segments draw from the same rate_limiter.Throttle, if given.
+    Raises IOError (or IntegrityCheckFailedError) if the download fails.
+    """
+    client = _open_worker_connection(connect_kwargs, pool)
+    if not client:
+        raise ConnectionError("Could not open a connection for segmented download.")
+    try:
+        total_size, mtime = get_remote_stat(client, remote_path)
+        if total_size is None or segments <= 1 or total_size < segments * MIN_SEGMENT_SIZE:
+            # Not worth splitting (or SIZE unsupported), use a single stream
+            print(f"Segmented download of {remote_path}: using a single stream.")
+            return download_file(client, remote_path, local_path, verify_integrity=verify_integrity, resume=resume,
+                                 journal=journal, progress_callback=progress_callback, throttle=throttle)
+    finally:
+        _close_worker_connection(client, pool)
+
+    ranges = _journaled_segments(journal, local_path, remote_path, total_size, mtime) if resume else None
+    if ranges:
+        print(f"Resuming segmented download of {remote_path} ({total_size} bytes).")
+    else:
+        ranges = [[offset, length, 0] for offset, length in _split_segments(total_size, segments)]
+        print(f"Segmented download of {remote_path} ({total_size} bytes) in {len(ranges)} segments.")
+        # Preallocate so every segment can write into its own range
+        with open(local_path, 'wb') as f:
+            f.truncate(total_size)
+    if journal:
+        journal.start('download', local_path, remote_path, total_size, mtime)
+        journal.update('download', local_path, remote_path, segments=ranges)
+
+    progress_lock = threading.Lock()
+    progress = {'done': sum(done for offset, length, done in ranges)}
+    errors = []
+
+    def run_segment(segment):
+        offset, length, done = segment
+        segment_client = _open_worker_connection(connect_kwargs, pool)
+        if not segment_client:
+            errors.append(ConnectionError(f"Could not connect for segment at offset {offset}."))
+            return
+        def on_bytes(count):
+            if throttle:
+                throttle.consume(count)
+            with progress_lock:
+                progress['done'] += count
+                total_done = progress['done']
+            if progress_callback:
+                progress_callback(total_done, total_size)
+        # An FTP segment that stops before EOF aborts its data channel; some servers then
+        # send an extra reply, so that connection isn't safe to hand back for reuse
+        discard = isinstance(segment_client, ftplib.FTP) and offset + length < total_size
+        def checkpoint(written): # Only bytes this segment has flushed, so the journal never runs ahead of the file
+            with progress_lock:
+                segment[2] = done + written
+                snapshot = [list(other) for other in ranges]
+            journal.update('download', local_path, remote_path, segments=snapshot)
+        try:
+            _download_segment(segment_client, remote_path, local_path, offset + done, length - done, on_bytes,
+                              checkpoint if journal else None)
+        except Exception as e:
+            errors.append(e)
+            discard = True
+        finally:
+            _close_worker_connection(segment_client, pool, discard=discard)
+
+    threads = [threading.Thread(target=run_segment, args=(segment,), daemon=True)
+               for segment in ranges if segment[2] < segment[1]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        print(f"Segmented download of {remote_path} failed: {errors[0]}")
+        raise IOError(f"Segmented download failed: {errors[0]}")
+    if verify_integrity:
+        client = _open_worker_connection(connect_kwargs, pool)
+        if not client:
+            raise IOError("Segmented download failed: no connection to verify the file with.")
+        try:
+            print(f"Verifying integrity of downloaded file {local_path}...")
+            verify_remote_file(client, local_path, remote_path)
+        except IntegrityCheckFailedError:
+            if journal: # The ranges are all there, so resuming would only fail the same way
+                journal.finish('download', local_path, remote_path)
+            raise
+        finally:
+            _close_worker_connection(client, pool)
+    if journal:
+        journal.finish('download', local_path, remote_path)
+    print(f"Successfully downloaded (segmented) {remote_path} to {local_path}")
+
+
+def _probe_round_trip(client, local_probe, remote_path):
+    """Uploads local_probe to remote_path and reads it back, through the same paths real transfers take."""
+    upload_file(client, local_probe, remote_path) # sendfile() on plain FTP, pipelined writes on SFTP
+    download_file(client, remote_path, os.devnull) # recv_into() on our FTP classes, prefetched reads on SFTP
+
+
+def _remote_working_dir(client):
+    if isinstance(client, ftplib.FTP):
+        return client.pwd()
+    elif paramiko_available and isinstance(client, paramiko.SFTPClient):
+        return client.normalize('.')
+    raise TypeError("Unsupported client type for auto-tuning.")
+
+
+def auto_tune_transfer(client, remote_dir=None, probe_size=AUTO_TUNE_PROBE_SIZE, candidates=AUTO_TUNE_CANDIDATES):
+    """
+    Uploads a probe file to a temporary name in remote_dir (the current directory by default)
+    and downloads it again once per (block size, socket buffer) candidate, through the same
+    paths as real transfers, then keeps the fastest pair in the client's transfer_tuning,
+    which connections sharing that dict pick up too. The remote and local probe files are
+    always deleted afterwards. If the server refuses the probe the tuning is left unchanged.
+    Returns the tuning dict.
+    """
+    tuning = getattr(client, 'transfer_tuning', None)
+    if tuning is None:
+        tuning = client.transfer_tuning = make_transfer_tuning()
+    if not candidates:
+        print("Auto-tune had no candidates to try, keeping the current transfer settings.")
+        return tuning
+    original = dict(tuning)
+    local_probe = remote_path = None
+    timings = []
+    try:
+        with tempfile.NamedTemporaryFile(prefix='qftpclient-tune-', suffix='.tmp', delete=False) as f:
+            local_probe = f.name
+            f.write(os.urandom(probe_size)) # Incompressible, so MODE Z or SSH compression can't flatter a candidate
+        # Resolved now and given a name of its own, so the probe can't overwrite a user's file
+        remote_path = posixpath.join(remote_dir or _remote_working_dir(client),
+                                     f".qftpclient-tune-{os.getpid()}-{os.urandom(4).hex()}.tmp")
+        for block_size, buffer_size in candidates:
+            tuning.update(block_size=block_size, send_buffer=buffer_size, recv_buffer=buffer_size)
+            if paramiko_available and isinstance(client, paramiko.SFTPClient):
+                apply_socket_tuning(client.get_channel().get_transport().sock, tuning)
+            started = time.perf_counter()
+            _probe_round_trip(client, local_probe, remote_path)
+            elapsed = time.perf_counter() - started
+            buffer_text = f"{buffer_size // 1024} KB" if buffer_size else "OS default"
+            print(f"Auto-tune: block {block_size // 1024} KB, buffer {buffer_text}: "
+                  f"{2 * probe_size / elapsed / (1024 * 1024):.1f} MB/s")
+            timings.append((elapsed, block_size, buffer_size))
+    except Exception as e:
+        print(f"Auto-tune failed, keeping the current transfer settings: {e}")
+        tuning.update(original)
+        return tuning
+    finally:
+        if remote_path:
+            delete_file(client, remote_path) # Only prints if the probe was never created
+        if local_probe:
+            os.unlink(local_probe)
+
+    elapsed, block_size, buffer_size = min(timings)
+    tuning.update(block_size=block_size, send_buffer=buffer_size, recv_buffer=buffer_size)
+    buffer_text = f"{buffer_size // 1024} KB" if buffer_size else "OS default"
+    print(f"Auto-tune picked block size {block_size // 1024} KB, socket buffer {buffer_text}.")
+    return tuning
 
 
 def delete_file(client, remote_path):
@@ -341,6 +1754,7 @@ def delete_file(client, remote_path):
             print(f"Delete Error: Unsupported client type for {remote_path}")
     except Exception as e:
         print(f"Delete Error for {remote_path}: {e}")
+    listing_cache.invalidate_parent(client, remote_path)
 
 
 def rename_file(client, from_path, to_path):
@@ -358,6 +1772,9 @@ def rename_file(client, from_path, to_path):
             print(f"Rename Error: Unsupported client type for {from_path}")
     except Exception as e:
         print(f"Rename Error for {from_path} to {to_path}: {e}")
+    listing_cache.invalidate_parent(client, from_path)
+    listing_cache.invalidate_parent(client, to_path)
+    listing_cache.invalidate(client, from_path, recursive=True) # In case a directory was renamed
 
 
 def make_directory(client, dir_name):
@@ -374,4 +1791,231 @@ def make_directory(client, dir_name):
         else:
             print(f"Make Directory Error: Unsupported client type for {dir_name}")
     except Exception as e:
-        print(f"Make Directory Error for {dir_name}: {e}")
\ No newline at end of file
+        print(f"Make Directory Error for {dir_name}: {e}")
+    listing_cache.invalidate_parent(client, dir_name)
+
+
+# --- Recursive tree operations ---
+
+def scan_local_tree(local_root):
+    """
+    Walks local_root with os.scandir, which gets the entry types without a stat per entry.
+    Returns (dirs, files): relative directory paths with parents before children, and
+    (relative path, size, mtime) tuples. Relative paths use forward slashes. Symlinked
+    directories are not followed.
+    """
+    dirs, files = [], []
+    pending = ['']
+    while pending:
+        rel_dir = pending.pop()
+        with os.scandir(os.path.join(local_root, rel_dir)) as it:
+            for entry in it:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(rel_path)
+                        pending.append(rel_path)
+                    elif entry.is_file():
+                        entry_stat = entry.stat()
+                        files.append((rel_path, entry_stat.st_size, int(entry_stat.st_mtime)))
+                except OSError as e:
+                    print(f"Skipping {entry.path}: {e}")
+    return dirs, files
+
+
+def iter_local_directory(path, dirs_only=False):
+    """
+    Lists one local directory with os.scandir as listing entries (see make_entry) for its
+    folders and regular files. Entry types come with the directory read; only files are
+    stat()ed, for size and mtime, so dirs_only needs no stat at all (except for symlinks,
+    which are followed). Entries that vanish or can't be read meanwhile are skipped.
+    """
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir():
+                    yield make_entry(entry.name, 'dir')
+                elif not dirs_only and entry.is_file():
+                    entry_stat = entry.stat()
+                    yield make_entry(entry.name, 'file', entry_stat.st_size, entry_stat.st_mtime)
+            except OSError as e:
+                print(f"Skipping {entry.path}: {e}")
+
+
+def iter_local_directory_batches(path, dirs_only=False, batch_size=LISTING_BATCH_SIZE, max_delay=0.25):
+    """iter_local_directory() in batches, like iter_directory_batches()."""
+    return _batched(iter_local_directory(path, dirs_only), batch_size, max_delay)
+
+
+def walk_remote_tree(remote_root, client=None, connect_kwargs=None, max_connections=4, pool=None):
+    """
+    Lists remote_root recursively. Returns (dirs, files) like scan_local_tree, with size and
+    mtime from the listings (mtime may be None). Links are reported as files and not followed.
+    With connect_kwargs, subdirectories are listed in parallel over up to max_connections
+    connections (client, if given, is one of them); otherwise client lists them one by one.
+    Raises the first listing error.
+    """
+    remote_root = _normalize_remote_path(remote_root)
+    dirs, files, errors = [], [], []
+    pending = queue.Queue() # Relative paths of directories still to list
+    lock = threading.Lock()
+
+    def list_one(list_client, rel_dir):
+        path = posixpath.join(remote_root, rel_dir) if rel_dir else remote_root
+        for entry in iter_directory(list_client, path):
+            rel_path = f"{rel_dir}/{entry['name']}" if rel_dir else entry['name']
+            with lock:
+                if entry['type'] == 'dir':
+                    dirs.append(rel_path)
+                    pending.put(rel_path)
+                else:
+                    files.append((rel_path, entry['size'], entry['mtime']))
+
+    first_client = client or _open_worker_connection(connect_kwargs, pool)
+    if not first_client:
+        raise ConnectionError(f"Could not open a connection to list {remote_root}.")
+    try:
+        list_one(first_client, '')
+        # Chains of single subdirectories are followed in place; the walk fans out where it branches
+        while pending.qsize() == 1 or (connect_kwargs is None and not pending.empty()):
+            list_one(first_client, pending.get())
+            pending.task_done()
+        if not pending.empty():
+            def worker(worker_client):
+                if worker_client is None:
+                    worker_client = _open_worker_connection(connect_kwargs, pool)
+                    if not worker_client:
+                        return # The other workers carry on
+                    owned = True
+                else:
+                    owned = False
+                broken = False
+                try:
+                    while True:
+                        rel_dir = pending.get()
+                        try:
+                            if rel_dir is None:
+                                break
+                            if not errors: # After a failure the rest of the queue is just drained
+                                list_one(worker_client, rel_dir)
+                        except Exception as e:
+                            errors.append(e)
+                            broken = broken or not is_connection_alive(worker_client)
+                        finally:
+                            pending.task_done()
+                finally:
+                    if owned:
+                        _close_worker_connection(worker_client, pool, discard=broken)
+
+            worker_count = min(max_connections, pending.qsize())
+            threads = [threading.Thread(target=worker, args=(first_client if i == 0 else None,), daemon=True)
+                       for i in range(worker_count)]
+            for thread in threads:
+                thread.start()
+            pending.join() # The first worker's connection is known good, so the queue drains even if others can't connect
+            for _ in threads:
+                pending.put(None)
+            for thread in threads:
+                thread.join()
+    finally:
+        if client is None:
+            _close_worker_connection(first_client, pool, discard=bool(errors))
+
+    if errors:
+        raise errors[0]
+    return dirs, files
+
+
+def _run_remote_commands(client, commands):
+    """
+    Runs (verb, path) commands with verb 'MKD', 'DELE' or 'RMD'. For FTP they are pipelined,
+    PIPELINE_DEPTH at a time, saving a round trip per command.
+    Returns a list of ((verb, path), error) with error None on success.
+    """
+    results = []
+    if isinstance(client, ftplib.FTP):
+        for start in range(0, len(commands), PIPELINE_DEPTH):
+            chunk = commands[start:start + PIPELINE_DEPTH]
+            for verb, path in chunk:
+                client.putcmd(f'{verb} {path}')
+            for command in chunk: # Replies come back in order; a refusal doesn't desync the rest
+                try:
+                    client.voidresp()
+                    results.append((command, None))
+                except (ftplib.error_reply, ftplib.error_temp, ftplib.error_perm) as e:
+                    results.append((command, e))
+    elif paramiko_available and isinstance(client, paramiko.SFTPClient):
+        sftp_methods = {'MKD': client.mkdir, 'DELE': client.remove, 'RMD': client.rmdir}
+        for command in commands:
+            verb, path = command
+            try:
+                sftp_methods[verb](path)
+                results.append((command, None))
+            except IOError as e:
+                results.append((command, e))
+    else:
+        raise TypeError("Unsupported client type.")
+    return results
+
+
+def make_remote_directories(client, remote_dirs):
+    """
+    Creates remote_dirs (parents listed before children) in one batch.
+    Directories that already exist are fine; returns the paths that could not be created
+    for any other reason as far as the server tells (FTP uses 550 for both).
+    """
+    results = _run_remote_commands(client, [('MKD', path) for path in remote_dirs])
+    failed = [command[1] for command, error in results if error is not None]
+    if failed:
+        print(f"MKD: {len(failed)} of {len(remote_dirs)} directories already existed or could not be created.")
+    for path in remote_dirs:
+        listing_cache.invalidate_parent(client, path)
+    return failed
+
+
+def plan_tree_upload(client, local_root, remote_root):
+    """
+    Scans local_root, creates the matching directory tree under remote_root in one batch
+    ahead of any file transfer, and returns the (local_path, remote_path) pairs to upload.
+    """
+    dirs, files = scan_local_tree(local_root)
+    remote_root = _normalize_remote_path(remote_root)
+    make_remote_directories(client, [remote_root] + [posixpath.join(remote_root, rel) for rel in dirs])
+    print(f"Tree upload of {local_root}: {len(dirs)} directories, {len(files)} files.")
+    return [(os.path.join(local_root, *rel.split('/')), posixpath.join(remote_root, rel)) for rel, size, mtime in files]
+
+
+def plan_tree_download(remote_root, local_root, client=None, connect_kwargs=None, max_connections=4, pool=None):
+    """
+    Walks remote_root (in parallel with connect_kwargs, see walk_remote_tree), creates the
+    local directory tree under local_root and returns the (local_path, remote_path) pairs to download.
+    """
+    remote_root = _normalize_remote_path(remote_root)
+    dirs, files = walk_remote_tree(remote_root, client, connect_kwargs, max_connections, pool)
+    os.makedirs(local_root, exist_ok=True)
+    for rel in dirs:
+        os.makedirs(os.path.join(local_root, *rel.split('/')), exist_ok=True)
+    print(f"Tree download of {remote_root}: {len(dirs)} directories, {len(files)} files.")
+    return [(os.path.join(local_root, *rel.split('/')), posixpath.join(remote_root, rel)) for rel, size, mtime in files]
+
+
+def delete_remote_tree(client, remote_root, connect_kwargs=None, max_connections=4, pool=None):
+    """
+    Deletes remote_root with everything below it: all files first, then the directories
+    deepest first. The walk can run in parallel (see walk_remote_tree); the deletes are
+    pipelined on client. Raises IOError if anything could not be deleted.
+    """
+    remote_root = _normalize_remote_path(remote_root)
+    dirs, files = walk_remote_tree(remote_root, client, connect_kwargs, max_connections, pool)
+    commands = [('DELE', posixpath.join(remote_root, rel)) for rel, size, mtime in files]
+    commands += [('RMD', posixpath.join(remote_root, rel)) for rel in sorted(dirs, key=lambda rel: rel.count('/'), reverse=True)]
+    commands.append(('RMD', remote_root))
+    try:
+        failures = [(command, error) for command, error in _run_remote_commands(client, commands) if error is not None]
+    finally:
+        listing_cache.invalidate_parent(client, remote_root)
+        listing_cache.invalidate(client, remote_root, recursive=True)
+    if failures:
+        (verb, path), error = failures[0]
+        raise IOError(f"Could not delete {len(failures)} item(s) under {remote_root}, first: {verb} {path}: {error}")
+    print(f"Successfully deleted tree {remote_root} ({len(files)} files, {len(dirs) + 1} directories)")
@@ -1,52 +1,202 @@
 # FXP (Server-to-Server) Transfer Implementation
-# This is an advanced feature that allows direct transfers between two FTP servers
+# This is an advanced feature that allows direct transfers between two FTP servers.
+# The destination is put in passive mode, the source is told (PORT/EPRT) to connect to it,
+# and the data flows between the servers while we only drive the two control channels.
 
 import ftplib
-import threading
 from PyQt5.QtCore import QThread, pyqtSignal
 
+
+class FXPError(Exception):
+    """Raised when one of the servers refuses a step of an FXP transfer."""
+    pass
+
+
+def parse_pasv_response(resp, dest_ftp=None):
+    """
+    Returns (host, port) from a 227 (PASV/CPSV) or 229 (EPSV) reply.
+    A 229 reply carries only the port, so the host is taken from dest_ftp's control connection.
+    """
+    if resp[:3] == '227':
+        return ftplib.parse227(resp)
+    if resp[:3] == '229':
+        if dest_ftp is None or dest_ftp.sock is None:
+            raise FXPError("A 229 reply needs the destination connection to know its host.")
+        return ftplib.parse229(resp, dest_ftp.sock.getpeername())
+    raise FXPError(f"Unexpected passive mode reply: {resp}")
+
+
+def format_port_command(host, port):
+    """Builds the PORT (IPv4) or EPRT (IPv6) command that points the source at host:port."""
+    if ':' in host:
+        return f'EPRT |2|{host}|{port}|'
+    return 'PORT ' + ','.join(host.split('.') + [str(port >> 8), str(port & 0xFF)])
+
+
+def _read_preliminary(ftp, cmd):
+    """Reads the reply to a transfer command sent with putcmd(). Returns None when the
+    server accepted it (125/150), otherwise the error to raise."""
+    try:
+        resp = ftp.getresp()
+    except ftplib.all_errors as e:
+        return e
+    if resp[:1] != '1':
+        return FXPError(f"'{cmd}' was not accepted: {resp}")
+    return None
+
+
+def _abort_quietly(ftp):
+    """Aborts whatever transfer ftp has pending, ignoring a server that has nothing to abort."""
+    try:
+        ftp.abort()
+    except ftplib.all_errors:
+        pass
+
+
+def prepare_fxp_session(source_ftp, dest_ftp, secure=False):
+    """
+    One-time setup for a pair of control connections: binary mode on both and, for FXP
+    over TLS, PROT P on both plus SSCN on the destination (or CPSV when SSCN isn't
+    supported) so one side acts as the TLS client of the data connection.
+    Returns the passive command to use for each file ('PASV' or 'CPSV').
+    """
+    source_ftp.voidcmd('TYPE I')
+    dest_ftp.voidcmd('TYPE I')
+    if not secure:
+        return 'PASV'
+
+    for ftp in (source_ftp, dest_ftp):
+        ftp.voidcmd('PBSZ 0')
+        ftp.voidcmd('PROT P')
+    try:
+        dest_ftp.voidcmd('SSCN ON')
+        return 'PASV'
+    except ftplib.error_perm:
+        # No SSCN: CPSV makes the passive side the TLS client instead
+        return 'CPSV'
+
+
+def _open_data_path(source_ftp, dest_ftp, pasv_command, pasv_sent=False):
+    """
+    Puts the destination in passive mode and points the source at it. With pasv_sent the
+    passive command was already pipelined behind the previous transfer and only its reply
+    is read here.
+    """
+    resp = dest_ftp.getresp() if pasv_sent else dest_ftp.sendcmd(pasv_command)
+    host, port = parse_pasv_response(resp, dest_ftp)
+    source_ftp.voidcmd(format_port_command(host, port))
+
+
+def _start_transfer(source_ftp, dest_ftp, source_file, dest_file):
+    """
+    Sends STOR and RETR before reading either reply: in passive mode many servers
+    (vsftpd, ProFTPD) only answer STOR once the source has connected, which it won't do
+    until it has seen RETR. Aborts both sides if either refuses.
+    """
+    stor, retr = f'STOR {dest_file}', f'RETR {source_file}'
+    dest_ftp.putcmd(stor)
+    try:
+        source_ftp.putcmd(retr)
+    except ftplib.all_errors:
+        # The destination is waiting for a data connection that will never come
+        _abort_quietly(dest_ftp)
+        raise
+
+    dest_error = _read_preliminary(dest_ftp, stor)
+    source_error = _read_preliminary(source_ftp, retr)
+    if dest_error or source_error:
+        _abort_quietly(dest_ftp)
+        _abort_quietly(source_ftp)
+        raise dest_error or source_error
+
+
+def _finish_transfer(source_ftp, dest_ftp):
+    """Waits for both servers to confirm completion (226). Both replies are always read so
+    the control channels stay in step even when one side reports a failure."""
+    errors = []
+    for ftp in (source_ftp, dest_ftp):
+        try:
+            ftp.voidresp()
+        except ftplib.all_errors as e:
+            errors.append(e)
+    if errors:
+        raise errors[0]
+
+
+def fxp_transfer_file(source_ftp, dest_ftp, source_file, dest_file, pasv_command='PASV'):
+    """
+    Transfers one file from source_ftp to dest_ftp directly between the servers.
+    Both connections must already be prepared with prepare_fxp_session().
+    Returns when both servers have confirmed completion (226).
+    """
+    _open_data_path(source_ftp, dest_ftp, pasv_command)
+    _start_transfer(source_ftp, dest_ftp, source_file, dest_file)
+    _finish_transfer(source_ftp, dest_ftp)
+
+
+def fxp_transfer_batch(source_ftp, dest_ftp, files, secure=False, progress_callback=None):
+    """
+    Transfers a batch of (source_file, dest_file) pairs over the same two control
+    connections, doing the session setup once. While a file is moving, the passive
+    command for the next one is already queued on the destination, so its reply is
+    waiting as soon as the transfer completes instead of costing another round trip.
+    Returns a list of (source_file, dest_file, error) with error None on success.
+    progress_callback(done, total) is called after each file.
+    """
+    pasv_command = prepare_fxp_session(source_ftp, dest_ftp, secure)
+    results = []
+    pasv_sent = False
+    for index, (source_file, dest_file) in enumerate(files):
+        try:
+            pipelined, pasv_sent = pasv_sent, False
+            _open_data_path(source_ftp, dest_ftp, pasv_command, pipelined)
+            _start_transfer(source_ftp, dest_ftp, source_file, dest_file)
+            if index + 1 < len(files):
+                dest_ftp.putcmd(pasv_command)
+                pasv_sent = True
+            _finish_transfer(source_ftp, dest_ftp)
+            results.append((source_file, dest_file, None))
+        except (ftplib.all_errors + (FXPError,)) as e:
+            print(f"FXP transfer of {source_file} failed: {e}")
+            results.append((source_file, dest_file, e))
+        if progress_callback:
+            progress_callback(index + 1, len(files))
+    return results
+
+
 class FXPTransferWorker(QThread):
     """Worker for FXP (File eXchange Protocol) transfers between two FTP servers"""
     progress_updated = pyqtSignal(int)
     status_updated = pyqtSignal(str)
     operation_completed = pyqtSignal(bool, str)
-    
-    def __init__(self, source_ftp, dest_ftp, source_file, dest_file):
+
+    def __init__(self, source_ftp, dest_ftp, source_file=None, dest_file=None, files=None, secure=False):
         super().__init__()
         self.source_ftp = source_ftp
         self.dest_ftp = dest_ftp
-        self.source_file = source_file
-        self.dest_file = dest_file
-    
+        # Either a single source_file/dest_file or a batch of (source, dest) pairs
+        self.files = list(files) if files else [(source_file, dest_file)]
+        self.secure = secure
+
     def run(self):
         try:
-            self.status_updated.emit("Initiating FXP transfer...")
-            
-            # Set passive mode on destination
-            self.dest_ftp.set_pasv(True)
-            
-            # Get passive connection info from destination
-            resp = self.dest_ftp.sendcmd('PASV')
-            # Parse PASV response to get IP and port
-            # Format: 227 Entering Passive Mode (h1,h2,h3,h4,p1,p2)
-            
-            # This is a simplified implementation
-            # In a real implementation, you would parse the PASV response
-            # and use PORT command on source server
-            
-            self.status_updated.emit("FXP transfer in progress...")
-            
-            # Simulate transfer progress
-            for i in range(0, 101, 10):
-                self.progress_updated.emit(i)
-                self.msleep(100)  # Simulate transfer time
-            
-            self.operation_completed.emit(True, "FXP transfer completed successfully")
-            
+            self.status_updated.emit(f"Initiating FXP transfer of {len(self.files)} file(s)...")
+
+            def on_progress(done, total):
+                self.progress_updated.emit(int(done / total * 100))
+                self.status_updated.emit(f"FXP transferred {done} of {total}")
+
+            results = fxp_transfer_batch(self.source_ftp, self.dest_ftp, self.files,
+                                         secure=self.secure, progress_callback=on_progress)
+            failures = [result for result in results if result[2] is not None]
+            if failures:
+                source_file, _, error = failures[0]
+                self.operation_completed.emit(False, f"FXP transfer failed for {len(failures)} file(s), first: {source_file}: {error}")
+            else:
+                self.operation_completed.emit(True, "FXP transfer completed successfully")
+
         except Exception as e:
             self.operation_completed.emit(False, f"FXP transfer failed: {e}")
 
-# Note: FXP transfers require both servers to support the feature
-# and proper network configuration. This is a simplified implementation
-# for demonstration purposes.
-
+# Note: FXP transfers require both servers to support the feature (the source must accept
+# a PORT to a foreign address) and proper network configuration between them.
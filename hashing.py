@@ -0,0 +1,128 @@
+# Hashing
+# Local file hashing for integrity checks: large reads into a reusable buffer instead of
+# small chunks, and one place that knows the algorithms servers can compute remotely
+# (FTP HASH/XSHA*/XMD5/XCRC, SFTP check-file).
+
+import hashlib
+import threading
+import zlib
+
+HASH_BLOCK_SIZE = 1024 * 1024 # Per read; large enough that the Python loop cost is negligible
+
+# Strongest first; the first one both sides support is used
+PREFERRED_ALGORITHMS = ('SHA-256', 'SHA-1', 'MD5', 'CRC32')
+
+
+class Crc32:
+    """hashlib-style wrapper around zlib.crc32, for servers that only offer XCRC/CRC32."""
+    name = 'crc32'
+
+    def __init__(self):
+        self._value = 0
+
+    def update(self, data):
+        self._value = zlib.crc32(data, self._value)
+
+    def hexdigest(self):
+        return f"{self._value & 0xFFFFFFFF:08x}"
+
+
+_FACTORIES = {
+    'SHA-512': hashlib.sha512,
+    'SHA-256': hashlib.sha256,
+    'SHA-1': hashlib.sha1,
+    'MD5': hashlib.md5,
+    'CRC32': Crc32,
+}
+
+
+def normalize_algorithm(name):
+    """Maps spellings like 'sha256', 'SHA256' or 'sha-256' to the names used here (e.g. 'SHA-256')."""
+    key = name.upper().replace('_', '-')
+    if key not in _FACTORIES and key.startswith('SHA') and '-' not in key:
+        key = 'SHA-' + key[3:]
+    return key if key in _FACTORIES else None
+
+
+def new_hasher(algorithm='MD5'):
+    """A fresh hash object with update()/hexdigest() for the given algorithm name."""
+    key = normalize_algorithm(algorithm)
+    if key is None:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+    return _FACTORIES[key]()
+
+
+_buffers = threading.local() # One read buffer per thread, reused for every file
+
+
+def _read_buffer():
+    buffer = getattr(_buffers, 'buffer', None)
+    if buffer is None:
+        buffer = _buffers.buffer = bytearray(HASH_BLOCK_SIZE)
+    return buffer
+
+
+def update_from_file(hasher, f, length=None):
+    """Feeds f (binary, from its current position) into hasher, at most length bytes. Returns the count."""
+    buffer = _read_buffer()
+    view = memoryview(buffer)
+    total = 0
+    try:
+        while length is None or total < length:
+            count = f.readinto(view if length is None else view[:min(len(buffer), length - total)])
+            if not count:
+                break
+            hasher.update(view[:count])
+            total += count
+    finally:
+        view.release()
+    return total
+
+
+def hash_local_file(filepath, algorithm='MD5'):
+    """
+    Returns the hex digest of a local file, reading with readinto() into a reusable
+    buffer (no per-chunk allocations). Returns None if the file can't be read.
+    """
+    hasher = new_hasher(algorithm)
+    try:
+        with open(filepath, 'rb', buffering=0) as f:
+            update_from_file(hasher, f)
+        return hasher.hexdigest()
+    except FileNotFoundError:
+        print(f"Error: Local file not found at {filepath} for {algorithm} calculation.")
+        return None
+    except OSError as e:
+        print(f"Error calculating local {algorithm} for {filepath}: {e}")
+        return None
+
+
+class HashingReader:
+    """Wraps a file for storbinary()/putfo(): every block read from it is also hashed."""
+
+    def __init__(self, f, hasher):
+        self._file = f
+        self.hasher = hasher
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        self.hasher.update(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class HashingWriter:
+    """Wraps a file for retrbinary()/getfo(): every block written to it is also hashed."""
+
+    def __init__(self, f, hasher):
+        self._file = f
+        self.hasher = hasher
+
+    def write(self, data):
+        self.hasher.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
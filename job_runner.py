@@ -0,0 +1,98 @@
+# Background Job Runner
+# Runs blocking network operations off the Qt GUI thread and reports back over signals,
+# so the window keeps responding (and can queue more work) while transfers run.
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class JobSignals(QObject):
+    """Signals of a Job. Created on the GUI thread, so connected slots run there."""
+    progress_updated = pyqtSignal(int)
+    status_updated = pyqtSignal(str)
+    result_ready = pyqtSignal(object)
+    partial_result = pyqtSignal(object) # A chunk of the result delivered before the job ends
+    error_occurred = pyqtSignal(object)
+    operation_completed = pyqtSignal(bool, str)
+
+
+class Job(QRunnable):
+    """Runs fn(*args, **kwargs) on a pool thread and emits its result or exception."""
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+        self.setAutoDelete(False) # JobRunner keeps the Python object alive until it finishes
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            print(f"Background job {getattr(self.fn, '__name__', self.fn)} failed: {e}")
+            self.signals.error_occurred.emit(e)
+            self.signals.operation_completed.emit(False, str(e))
+        else:
+            self.signals.result_ready.emit(result)
+            self.signals.operation_completed.emit(True, "")
+
+
+class JobRunner(QObject):
+    """
+    Runs core operations in the background.
+    ftplib and paramiko clients aren't thread-safe, so jobs that use the shared control
+    connection go to a single-thread pool and run one at a time, in submission order.
+    Jobs that open their own connections (transfer engine, segmented downloads) go to
+    a wider pool and run alongside them.
+    """
+
+    def __init__(self, parent=None, max_parallel_jobs=4):
+        super().__init__(parent)
+        self.connection_pool = QThreadPool(self)
+        self.connection_pool.setMaxThreadCount(1)
+        self.parallel_pool = QThreadPool(self)
+        self.parallel_pool.setMaxThreadCount(max_parallel_jobs)
+        self._active_jobs = set()
+
+    def submit(self, fn, *args, on_result=None, on_error=None, on_progress=None, on_status=None,
+               on_partial=None, on_finished=None, uses_shared_connection=True, with_callbacks=False, **kwargs):
+        """
+        Queues fn(*args, **kwargs) and returns the Job.
+        on_result(result) / on_error(exception) / on_finished(success, message) run on the GUI thread.
+        With with_callbacks=True, fn also gets progress_callback(int) and status_callback(str)
+        keyword arguments that are forwarded to on_progress / on_status.
+        With on_partial, fn gets a partial_callback(obj) keyword argument whose calls are
+        forwarded to on_partial(obj) (e.g. batches of a streamed listing).
+        """
+        job = Job(fn, *args, **kwargs)
+        if with_callbacks:
+            job.kwargs['progress_callback'] = job.signals.progress_updated.emit
+            job.kwargs['status_callback'] = job.signals.status_updated.emit
+        if on_partial:
+            job.kwargs['partial_callback'] = job.signals.partial_result.emit
+            job.signals.partial_result.connect(on_partial)
+        if on_result:
+            job.signals.result_ready.connect(on_result)
+        if on_error:
+            job.signals.error_occurred.connect(on_error)
+        if on_progress:
+            job.signals.progress_updated.connect(on_progress)
+        if on_status:
+            job.signals.status_updated.connect(on_status)
+        if on_finished:
+            job.signals.operation_completed.connect(on_finished)
+        job.signals.operation_completed.connect(lambda success, message: self._active_jobs.discard(job))
+
+        self._active_jobs.add(job)
+        pool = self.connection_pool if uses_shared_connection else self.parallel_pool
+        pool.start(job)
+        return job
+
+    def active_job_count(self):
+        return len(self._active_jobs)
+
+    def wait_for_done(self, msecs=-1):
+        """Blocks until all queued jobs have run (used on shutdown)."""
+        self.connection_pool.waitForDone(msecs)
+        self.parallel_pool.waitForDone(msecs)
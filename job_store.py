@@ -0,0 +1,186 @@
+# Transfer Job Store
+# On-disk (SQLite) record of the transfer queue: every queued item and, once a queued
+# folder has been scanned, every file in it, with its state, bytes done and retry count.
+# The queue survives a crash or restart, and a resumed run skips what already finished.
+
+import sqlite3
+import threading
+import time
+
+JOB_STORE_FILE = 'transfer_queue.sqlite3'
+
+# Job states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    parent INTEGER,
+    direction TEXT NOT NULL,
+    local_path TEXT NOT NULL,
+    remote_path TEXT NOT NULL,
+    is_dir INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    size INTEGER,
+    bytes_done INTEGER NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_parent ON jobs (parent, status);
+"""
+
+_COLUMNS = 'id, parent, direction, local_path, remote_path, is_dir, status, size, bytes_done, retries, error'
+
+
+def _row_to_job(row):
+    return dict(zip(('id', 'parent', 'direction', 'local_path', 'remote_path', 'is_dir', 'status', 'size',
+                     'bytes_done', 'retries', 'error'), row))
+
+
+class JobStore:
+    """
+    Queue of transfer jobs kept in SQLite. Top-level jobs are what the user queued (a file
+    or a folder); a folder's files are added as its children when it is first scanned, so
+    a restart continues with the files still to do instead of scanning it again.
+    Jobs are plain dicts (see _COLUMNS). Safe to share between threads.
+    """
+
+    def __init__(self, path=JOB_STORE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL') # A state change costs an append, not a rewrite
+        self._db.execute('PRAGMA synchronous=NORMAL') # Survives an application crash; power loss may lose the last changes
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # --- Adding ----------------------------------------------------------
+
+    def add(self, direction, local_path, remote_path, is_dir=False, parent=None, size=None):
+        """Queues one job and returns its id."""
+        with self._lock, self._db:
+            return self._db.execute(
+                'INSERT INTO jobs (parent, direction, local_path, remote_path, is_dir, size, updated) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (parent, direction, local_path, remote_path, int(is_dir), size, time.time())).lastrowid
+
+    def add_many(self, direction, items):
+        """Queues (local_path, remote_path, is_dir) items in one transaction. Returns their ids, in order."""
+        return self._insert([(None, direction, local_path, remote_path, int(is_dir), None)
+                             for local_path, remote_path, is_dir in items])
+
+    def add_children(self, parent, direction, pairs):
+        """
+        Queues the files of a scanned folder in one transaction, pairs being (local_path, remote_path)
+        or (local_path, remote_path, size). Returns their ids, in order.
+        """
+        return self._insert([(parent, direction, pair[0], pair[1], 0, pair[2] if len(pair) > 2 else None)
+                             for pair in pairs])
+
+    def _insert(self, rows):
+        now = time.time()
+        with self._lock, self._db:
+            first = self._db.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM jobs').fetchone()[0]
+            self._db.executemany('INSERT INTO jobs (id, parent, direction, local_path, remote_path, is_dir, size, updated) '
+                                 'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                 [(first + i, *row, now) for i, row in enumerate(rows)])
+        return list(range(first, first + len(rows)))
+
+    # --- State changes ---------------------------------------------------
+
+    def mark_running(self, job_id):
+        self._set(job_id, 'status = ?, error = NULL', (RUNNING,))
+
+    def mark_many_running(self, job_ids):
+        with self._lock, self._db:
+            now = time.time()
+            self._db.executemany('UPDATE jobs SET status = ?, error = NULL, updated = ? WHERE id = ?',
+                                 [(RUNNING, now, job_id) for job_id in job_ids])
+
+    def mark_done(self, job_id):
+        self._set(job_id, 'status = ?, error = NULL, bytes_done = COALESCE(size, bytes_done)', (DONE,))
+
+    def mark_failed(self, job_id, error=None):
+        self._set(job_id, 'status = ?, error = ?, retries = retries + 1', (FAILED, str(error) if error else None))
+
+    def mark_pending(self, job_id):
+        self._set(job_id, 'status = ?', (PENDING,))
+
+    def update_progress(self, job_id, bytes_done, size=None):
+        self._set(job_id, 'bytes_done = ?, size = COALESCE(?, size)', (bytes_done, size))
+
+    def _set(self, job_id, assignments, values):
+        with self._lock, self._db:
+            self._db.execute(f'UPDATE jobs SET {assignments}, updated = ? WHERE id = ?', (*values, time.time(), job_id))
+
+    def recover(self):
+        """
+        Puts jobs that were running when the application stopped back to pending (their
+        partial files are continued by resume). Folders whose files were already queued keep
+        their state. Returns the number of jobs recovered.
+        """
+        with self._lock, self._db:
+            return self._db.execute(
+                'UPDATE jobs SET status = ?, updated = ? WHERE status = ? '
+                'AND NOT (is_dir AND EXISTS (SELECT 1 FROM jobs AS child WHERE child.parent = jobs.id))',
+                (PENDING, time.time(), RUNNING)).rowcount
+
+    def retry_failed(self, parent=None):
+        """Puts failed jobs (all, or a folder's files) back to pending. Returns how many."""
+        where, values = ('status = ?', (FAILED,)) if parent is None else ('status = ? AND parent = ?', (FAILED, parent))
+        with self._lock, self._db:
+            return self._db.execute(f'UPDATE jobs SET status = ?, updated = ? WHERE {where}',
+                                    (PENDING, time.time(), *values)).rowcount
+
+    # --- Removing --------------------------------------------------------
+
+    def remove(self, job_id):
+        """Drops a job together with the files queued under it."""
+        self.remove_many([job_id])
+
+    def remove_many(self, job_ids):
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM jobs WHERE id = ? OR parent = ?', [(job_id, job_id) for job_id in job_ids])
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM jobs')
+
+    # --- Lookups ---------------------------------------------------------
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute(f'SELECT {_COLUMNS} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def top_level(self):
+        """The queued items (not folder contents) in queue order."""
+        with self._lock:
+            rows = self._db.execute(f'SELECT {_COLUMNS} FROM jobs WHERE parent IS NULL ORDER BY id').fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def has_children(self, job_id):
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM jobs WHERE parent = ? LIMIT 1', (job_id,)).fetchone() is not None
+
+    def children(self, parent, statuses=(PENDING, RUNNING, FAILED)):
+        """A folder's queued files in the given states, in queue order."""
+        marks = ', '.join('?' * len(statuses))
+        with self._lock:
+            rows = self._db.execute(f'SELECT {_COLUMNS} FROM jobs WHERE parent = ? AND status IN ({marks}) ORDER BY id',
+                                    (parent, *statuses)).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def counts(self, parent=None):
+        """{status: number of jobs} over everything, or over one folder's files."""
+        where, values = ('', ()) if parent is None else ('WHERE parent = ?', (parent,))
+        with self._lock:
+            rows = self._db.execute(f'SELECT status, COUNT(*) FROM jobs {where} GROUP BY status', values).fetchall()
+        return dict(rows)
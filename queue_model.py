@@ -0,0 +1,146 @@
+# Transfer Queue Model
+# The upload queue as compact records behind a Qt table model: the view only asks for the
+# rows on screen, and entries are added, updated and removed in batches, so a drop of
+# hundreds of thousands of files doesn't create (or repaint) a widget item per file.
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QColor
+
+# Entry states
+QUEUED = 'queued'
+RUNNING = 'running'
+FAILED = 'failed'
+CHECKSUM_MISMATCH = 'checksum_mismatch'
+
+_STATUS_TEXT = {QUEUED: '', RUNNING: 'Uploading', FAILED: 'Upload Error', CHECKSUM_MISMATCH: 'Checksum Mismatch'}
+_STATUS_COLORS = {FAILED: QColor('lightcoral'), CHECKSUM_MISMATCH: QColor('red')}
+
+MAX_REMOVE_RANGES = 64 # Beyond this many separate row ranges a removal resets the model instead
+
+
+class QueueEntry:
+    """One queued upload (a file or a folder) and the id of its row in the job store."""
+    __slots__ = ('job_id', 'local_path', 'remote_path', 'is_dir', 'status', 'error')
+
+    def __init__(self, job_id, local_path, remote_path, is_dir=False, status=QUEUED, error=None):
+        self.job_id = job_id
+        self.local_path = local_path
+        self.remote_path = remote_path
+        self.is_dir = is_dir
+        self.status = status
+        self.error = error
+
+    def __repr__(self):
+        return f"QueueEntry({self.job_id}: {self.local_path!r} -> {self.remote_path!r}, {self.status})"
+
+
+class TransferQueueModel(QAbstractTableModel):
+    """
+    Queue entries in queue order. Job store ids grow in the order entries are queued, so
+    the rows stay sorted by job_id and an entry is found by binary search.
+    """
+    COLUMNS = ('Local', 'Remote', 'Status')
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._entries = []
+
+    # --- Qt model interface ----------------------------------------------
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._entries)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self._entries[index.row()]
+        if role == Qt.DisplayRole:
+            column = index.column()
+            if column == 0:
+                return entry.local_path
+            if column == 1:
+                return entry.remote_path
+            return _STATUS_TEXT.get(entry.status, entry.status)
+        if role == Qt.BackgroundRole:
+            return _STATUS_COLORS.get(entry.status)
+        if role == Qt.ToolTipRole and entry.error:
+            return entry.error
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    # --- Entries ---------------------------------------------------------
+
+    def entry(self, row):
+        return self._entries[row]
+
+    def entries(self, status=None):
+        """All entries, or those in one state."""
+        if status is None:
+            return list(self._entries)
+        return [entry for entry in self._entries if entry.status == status]
+
+    def row_of(self, entry):
+        """The row of entry, or -1 if it is no longer queued."""
+        low, high = 0, len(self._entries)
+        while low < high:
+            middle = (low + high) // 2
+            if self._entries[middle].job_id < entry.job_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < len(self._entries) and self._entries[low] is entry else -1
+
+    def add_entries(self, entries):
+        """Appends entries (newer job ids than any queued) with a single insert notification."""
+        if not entries:
+            return
+        first = len(self._entries)
+        self.beginInsertRows(QModelIndex(), first, first + len(entries) - 1)
+        self._entries.extend(entries)
+        self.endInsertRows()
+
+    def set_status(self, entries, status, error=None):
+        """Moves entries to status; the view repaints the affected rows once."""
+        rows = []
+        for entry in entries:
+            entry.status = status
+            entry.error = str(error) if error else None
+            row = self.row_of(entry)
+            if row != -1:
+                rows.append(row)
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), 0), self.index(max(rows), len(self.COLUMNS) - 1))
+
+    def remove_entries(self, entries):
+        """Removes entries (ones already gone are ignored), one notification per contiguous run of rows."""
+        rows = sorted(row for row in map(self.row_of, entries) if row != -1)
+        if not rows:
+            return
+        ranges = [] # (first, last), ascending
+        for row in rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1] = (ranges[-1][0], row)
+            else:
+                ranges.append((row, row))
+        if len(ranges) > MAX_REMOVE_RANGES: # Scattered rows: one reset is cheaper than many removals
+            doomed = set(map(id, entries))
+            self.beginResetModel()
+            self._entries = [entry for entry in self._entries if id(entry) not in doomed]
+            self.endResetModel()
+            return
+        for first, last in reversed(ranges):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._entries[first:last + 1]
+            self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._entries = []
+        self.endResetModel()
@@ -0,0 +1,175 @@
+# Bandwidth Limiting
+# Token buckets that transfers draw from block by block: one for the whole process, one per
+# site and optionally one per job, so a queue run can't saturate the uplink however many
+# connections it opens. Each limit can follow a time-of-day schedule (e.g. full speed at
+# night), and when transfers compete for a limit the higher priority class goes first.
+
+import datetime
+import threading
+import time
+
+# Priority classes; lower values are served first when transfers wait on the same limit
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2 # Batch work: only gets bandwidth that nothing more urgent is waiting for
+PRIORITY_NAMES = {'High': PRIORITY_HIGH, 'Normal': PRIORITY_NORMAL, 'Low': PRIORITY_LOW}
+
+MAX_WAIT = 0.5 # Seconds a waiting transfer sleeps at most before re-reading the (scheduled) rate
+
+
+def _minutes(value):
+    """'HH:MM' (or a datetime.time) as minutes after midnight."""
+    if isinstance(value, datetime.time):
+        return value.hour * 60 + value.minute
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class RateSchedule:
+    """
+    A rate in bytes per second that depends on the time of day. windows is a list of
+    (start, end, rate) or (start, end, rate, weekdays) with 'HH:MM' bounds (a window may
+    wrap past midnight) and weekdays as datetime.weekday() numbers; the first window
+    containing the current time wins, default_rate applies outside all of them.
+    A rate of None or 0 means unlimited.
+    """
+
+    def __init__(self, windows=(), default_rate=None):
+        self.windows = []
+        for window in windows:
+            start, end, rate = window[:3]
+            weekdays = frozenset(window[3]) if len(window) > 3 and window[3] is not None else None
+            self.windows.append((_minutes(start), _minutes(end), rate, weekdays))
+        self.default_rate = default_rate
+
+    def rate_at(self, when=None):
+        when = when or datetime.datetime.now()
+        minute = when.hour * 60 + when.minute
+        for start, end, rate, weekdays in self.windows:
+            # A window that wraps midnight belongs to the day it started on
+            weekday = when.weekday() if start <= end or minute >= start else (when.weekday() - 1) % 7
+            if weekdays is not None and weekday not in weekdays:
+                continue
+            if (start <= minute < end) if start <= end else (minute >= start or minute < end):
+                return rate
+        return self.default_rate
+
+
+def business_hours(rate, start='08:00', end='18:00', off_hours_rate=None, weekdays=range(5)):
+    """A RateSchedule limiting to rate during working hours (Mon-Fri by default) and off_hours_rate otherwise."""
+    return RateSchedule([(start, end, rate, weekdays)], default_rate=off_hours_rate)
+
+
+class TokenBucket:
+    """
+    Allows rate bytes per second on average, with bursts of up to burst bytes (one second's
+    worth by default). consume() blocks until the bytes may go; a block larger than the
+    burst still goes through and is paid for by the transfers after it. A schedule, when
+    given, overrides rate. Safe to share between threads.
+    """
+
+    def __init__(self, rate=None, burst=None, schedule=None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.schedule = schedule
+        self._clock = clock
+        self._tokens = None # Filled to the burst size on first use
+        self._last = None
+        self._waiting = [0, 0, 0] # Waiting transfers per priority class
+        self._condition = threading.Condition()
+
+    def set_rate(self, rate=None, schedule=None, burst=None):
+        with self._condition:
+            self.rate = rate
+            self.schedule = schedule
+            self.burst = burst
+            self._condition.notify_all()
+
+    def current_rate(self):
+        """Bytes per second allowed right now, or None when unlimited."""
+        rate = self.schedule.rate_at() if self.schedule else self.rate
+        return rate or None
+
+    def _refill(self):
+        now = self._clock()
+        rate = self.current_rate()
+        if rate is None:
+            self._tokens = None # Full again whenever a limit comes back into force
+        else:
+            burst = self.burst or rate
+            if self._tokens is None:
+                self._tokens = burst
+            else:
+                self._tokens = min(burst, self._tokens + (now - self._last) * rate)
+        self._last = now
+        return rate
+
+    def consume(self, amount, priority=PRIORITY_NORMAL):
+        """Blocks until amount bytes may be transferred at the given priority."""
+        with self._condition:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    rate = self._refill()
+                    if rate is None:
+                        return
+                    outranked = any(self._waiting[:priority])
+                    if self._tokens > 0 and not outranked:
+                        self._tokens -= amount
+                        return
+                    wait = MAX_WAIT if outranked else -self._tokens / rate
+                    self._condition.wait(min(max(wait, 0.001), MAX_WAIT))
+            finally:
+                self._waiting[priority] -= 1
+                self._condition.notify_all() # Lower classes may be waiting for us to go
+
+
+class Throttle:
+    """The buckets one transfer draws from (its own, its site's, the global one) and its priority."""
+
+    def __init__(self, buckets, priority=PRIORITY_NORMAL):
+        self.buckets = [bucket for bucket in buckets if bucket is not None]
+        self.priority = priority
+
+    def consume(self, amount):
+        for bucket in self.buckets:
+            bucket.consume(amount, self.priority)
+
+    def limited(self):
+        """True if any of the buckets currently enforces a rate."""
+        return any(bucket.current_rate() for bucket in self.buckets)
+
+
+class BandwidthScheduler:
+    """
+    Holds the global limit and one limit per site (keyed like ConnectionPool.site_key) and
+    hands out a Throttle per transfer. Limits can be changed while transfers run.
+    """
+
+    def __init__(self, global_rate=None, global_schedule=None):
+        self.global_bucket = TokenBucket(global_rate, schedule=global_schedule)
+        self._site_buckets = {}
+        self._lock = threading.Lock()
+
+    def set_global_limit(self, rate=None, schedule=None):
+        self.global_bucket.set_rate(rate, schedule)
+
+    def set_site_limit(self, site, rate=None, schedule=None):
+        with self._lock:
+            bucket = self._site_buckets.get(site)
+            if bucket is None:
+                self._site_buckets[site] = TokenBucket(rate, schedule=schedule)
+                return
+        bucket.set_rate(rate, schedule)
+
+    def site_bucket(self, site):
+        with self._lock:
+            return self._site_buckets.get(site)
+
+    def throttle(self, site=None, rate=None, schedule=None, priority=PRIORITY_NORMAL):
+        """A Throttle for one transfer to site, limited on its own to rate (or schedule) if given."""
+        own = TokenBucket(rate, schedule=schedule) if rate or schedule else None
+        return Throttle([own, self.site_bucket(site), self.global_bucket], priority)
+
+
+bandwidth_scheduler = BandwidthScheduler() # Shared by every transfer of this process
@@ -0,0 +1,218 @@
+# Remote Index
+# On-disk (SQLite) record of what is known about each site's remote files: path, size,
+# mtime and checksum of every entry seen in a listing or transferred. Sync diffs can then
+# be computed locally, re-listing only the directories that changed or went stale.
+
+import posixpath
+import sqlite3
+import threading
+import time
+
+import ftp_client_core
+
+REMOTE_INDEX_FILE = 'remote_index.sqlite3'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    site TEXT NOT NULL,
+    path TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER,
+    checksum TEXT,
+    PRIMARY KEY (site, path)
+);
+CREATE INDEX IF NOT EXISTS entries_by_parent ON entries (site, parent);
+CREATE TABLE IF NOT EXISTS listings (
+    site TEXT NOT NULL,
+    path TEXT NOT NULL,
+    listed_at REAL NOT NULL,
+    PRIMARY KEY (site, path)
+);
+"""
+
+# A changed size or mtime means the stored checksum no longer describes the file
+_UPSERT_ENTRY = """
+INSERT INTO entries (site, path, parent, type, size, mtime, checksum) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (site, path) DO UPDATE SET
+    type = excluded.type, size = excluded.size, mtime = excluded.mtime,
+    checksum = CASE
+        WHEN excluded.checksum IS NOT NULL THEN excluded.checksum
+        WHEN entries.size = excluded.size AND entries.mtime IS excluded.mtime THEN entries.checksum
+        ELSE NULL END
+"""
+
+
+def _normalize(path):
+    path = posixpath.normpath((path or '/').replace('\\', '/'))
+    return path if path != '//' else '/'
+
+
+def _subtree_bounds(path):
+    """(low, high) so that low <= p < high selects exactly the paths below path."""
+    prefix = path.rstrip('/') + '/'
+    return prefix, prefix[:-1] + '0' # '0' sorts right after '/'
+
+
+class RemoteIndex:
+    """
+    Per-site index of remote entries, keyed by the site_key connect_server() puts on clients.
+    A directory counts as known once it has been listed in full; operations that change it
+    (through ftp_client_core) mark it stale again. Safe to share between threads.
+    """
+
+    def __init__(self, path=REMOTE_INDEX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL') # Readers don't wait for a writing sync
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+        ftp_client_core.listing_cache.add_listener(self._on_invalidate)
+
+    def close(self):
+        ftp_client_core.listing_cache.remove_listener(self._on_invalidate)
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def site_of(client):
+        """The index key of the client's site, or None for clients not made by connect_server."""
+        site_key = getattr(client, 'site_key', None)
+        if not isinstance(site_key, tuple):
+            return None
+        return '|'.join(str(part) for part in site_key)
+
+    # --- Recording -------------------------------------------------------
+
+    def record_listing(self, site, dir_path, entries):
+        """Stores a complete listing of dir_path; entries gone from it are dropped (with their subtrees)."""
+        dir_path = _normalize(dir_path)
+        rows = [(site, posixpath.join(dir_path, entry['name']), dir_path, entry['type'],
+                 entry.get('size') or 0, entry.get('mtime'), None) for entry in entries]
+        listed = {row[1] for row in rows}
+        with self._lock, self._db:
+            gone = [(path, file_type) for path, file_type in self._db.execute(
+                'SELECT path, type FROM entries WHERE site = ? AND parent = ?', (site, dir_path)) if path not in listed]
+            for path, file_type in gone:
+                self._forget(site, path, recursive=file_type == 'dir')
+            self._db.executemany(_UPSERT_ENTRY, rows)
+            self._db.execute('INSERT OR REPLACE INTO listings (site, path, listed_at) VALUES (?, ?, ?)',
+                             (site, dir_path, time.time()))
+
+    def record_tree(self, site, root, dirs, files):
+        """Stores a full walk of root as returned by walk_remote_tree()."""
+        root = _normalize(root)
+        children = {root: []}
+        for rel in dirs:
+            children[posixpath.join(root, rel)] = []
+            children[posixpath.dirname(posixpath.join(root, rel))].append(ftp_client_core.make_entry(posixpath.basename(rel), 'dir'))
+        for rel, size, mtime in files:
+            path = posixpath.join(root, rel)
+            children[posixpath.dirname(path)].append(ftp_client_core.make_entry(posixpath.basename(rel), 'file', size, mtime))
+        for dir_path, entries in children.items():
+            self.record_listing(site, dir_path, entries)
+
+    def record_entry(self, site, path, file_type='file', size=0, mtime=None, checksum=None):
+        """Records one entry this client wrote (or hashed); the listing state of its directory is unchanged."""
+        path = _normalize(path)
+        with self._lock, self._db:
+            self._db.execute(_UPSERT_ENTRY, (site, path, posixpath.dirname(path), file_type, size, mtime, checksum))
+
+    def mark_listed(self, site, dir_path):
+        """Declares the stored children of dir_path complete, e.g. after this client made all the changes to it."""
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO listings (site, path, listed_at) VALUES (?, ?, ?)',
+                             (site, _normalize(dir_path), time.time()))
+
+    def forget(self, site, path, recursive=False):
+        with self._lock, self._db:
+            self._forget(site, _normalize(path), recursive)
+
+    def _forget(self, site, path, recursive):
+        self._db.execute('DELETE FROM entries WHERE site = ? AND path = ?', (site, path))
+        self._db.execute('DELETE FROM listings WHERE site = ? AND path = ?', (site, path))
+        if recursive:
+            low, high = _subtree_bounds(path)
+            self._db.execute('DELETE FROM entries WHERE site = ? AND path >= ? AND path < ?', (site, low, high))
+            self._db.execute('DELETE FROM listings WHERE site = ? AND path >= ? AND path < ?', (site, low, high))
+
+    def mark_stale(self, site, dir_path, recursive=False):
+        """Forces dir_path (and with recursive=True everything below it) to be listed again."""
+        dir_path = _normalize(dir_path)
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM listings WHERE site = ? AND path = ?', (site, dir_path))
+            if recursive:
+                low, high = _subtree_bounds(dir_path)
+                self._db.execute('DELETE FROM listings WHERE site = ? AND path >= ? AND path < ?', (site, low, high))
+
+    def _on_invalidate(self, site_key, path, recursive):
+        if isinstance(site_key, tuple) and path.startswith('/'):
+            self.mark_stale('|'.join(str(part) for part in site_key), path, recursive)
+
+    # --- Lookups ---------------------------------------------------------
+
+    def get(self, site, path):
+        with self._lock:
+            row = self._db.execute('SELECT type, size, mtime, checksum FROM entries WHERE site = ? AND path = ?',
+                                   (site, _normalize(path))).fetchone()
+        if row is None:
+            return None
+        entry = ftp_client_core.make_entry(posixpath.basename(_normalize(path)), row[0], row[1], row[2])
+        entry['checksum'] = row[3]
+        return entry
+
+    def listing(self, site, dir_path, max_age=None):
+        """The stored listing of dir_path, or None if it was never listed, is stale, or is older than max_age seconds."""
+        dir_path = _normalize(dir_path)
+        with self._lock:
+            listed = self._db.execute('SELECT listed_at FROM listings WHERE site = ? AND path = ?',
+                                      (site, dir_path)).fetchone()
+            if listed is None or (max_age is not None and time.time() - listed[0] > max_age):
+                return None
+            rows = self._db.execute('SELECT path, type, size, mtime FROM entries WHERE site = ? AND parent = ?',
+                                    (site, dir_path)).fetchall()
+        return [ftp_client_core.make_entry(posixpath.basename(path), file_type, size, mtime)
+                for path, file_type, size, mtime in rows]
+
+    def walk(self, client, remote_root, max_age=None, connect_kwargs=None, max_connections=4, pool=None):
+        """
+        walk_remote_tree() backed by the index: directories with a stored listing (no older
+        than max_age seconds) come from disk, the rest are listed on client and recorded.
+        A root that was never listed is walked in full, in parallel when connect_kwargs are given.
+        """
+        site = self.site_of(client)
+        remote_root = _normalize(remote_root)
+        if site is None or self._never_listed(site, remote_root):
+            dirs, files = ftp_client_core.walk_remote_tree(remote_root, client, connect_kwargs, max_connections, pool)
+            if site is not None:
+                self.record_tree(site, remote_root, dirs, files)
+            return dirs, files
+
+        dirs, files = [], []
+        pending = ['']
+        relisted = 0
+        while pending:
+            rel_dir = pending.pop()
+            dir_path = posixpath.join(remote_root, rel_dir) if rel_dir else remote_root
+            entries = self.listing(site, dir_path, max_age)
+            if entries is None:
+                entries = list(ftp_client_core.iter_directory(client, dir_path))
+                self.record_listing(site, dir_path, entries)
+                relisted += 1
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry['name']}" if rel_dir else entry['name']
+                if entry['type'] == 'dir':
+                    dirs.append(rel_path)
+                    pending.append(rel_path)
+                else:
+                    files.append((rel_path, entry['size'], entry['mtime']))
+        print(f"Remote index walk of {remote_root}: {len(dirs) + 1} directories, {relisted} listed on the server.")
+        return dirs, files
+
+    def _never_listed(self, site, dir_path):
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM listings WHERE site = ? AND path = ?', (site, dir_path)).fetchone() is None \
+                and self._db.execute('SELECT 1 FROM entries WHERE site = ? AND parent = ? LIMIT 1', (site, dir_path)).fetchone() is None
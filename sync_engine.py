@@ -0,0 +1,242 @@
+# Directory Synchronization
+# Mirrors a local tree onto a remote directory: both trees are compared by size and
+# modification time (optionally by checksum) and only the difference is transferred.
+
+import os
+import posixpath
+import time
+from contextlib import contextmanager
+
+import ftp_client_core
+import hashing
+from transfer_engine import TransferEngine, TransferJob, DEFAULT_MAX_CONNECTIONS
+
+MTIME_TOLERANCE = 2 # Seconds; FAT volumes and many servers keep 2-second (or coarser) timestamps
+
+# Plan actions
+UPLOAD_NEW = 'upload_new'
+UPLOAD_CHANGED = 'upload_changed'
+DELETE = 'delete'
+SKIP = 'skip'
+
+
+class SyncItem:
+    """One path (relative to both roots, forward slashes) and what the sync does with it."""
+
+    def __init__(self, rel_path, action, is_dir=False, reason=''):
+        self.rel_path = rel_path
+        self.action = action # UPLOAD_NEW, UPLOAD_CHANGED, DELETE or SKIP
+        self.is_dir = is_dir
+        self.reason = reason # Why the file counts as changed, for the log
+
+    def __repr__(self):
+        return f"SyncItem({self.action} {self.rel_path!r}{'/' if self.is_dir else ''})"
+
+
+class SyncPlan:
+    """Result of plan_sync(): the directories to create and an item per compared path."""
+
+    def __init__(self, local_root, remote_root):
+        self.local_root = local_root
+        self.remote_root = remote_root
+        self.remote_dirs_to_create = [] # Remote paths, parents before children
+        self.items = []
+
+    def local_path(self, rel_path):
+        return os.path.join(self.local_root, *rel_path.split('/'))
+
+    def remote_path(self, rel_path):
+        return posixpath.join(self.remote_root, rel_path)
+
+    def by_action(self, action):
+        return [item for item in self.items if item.action == action]
+
+    def uploads(self):
+        return [item for item in self.items if item.action in (UPLOAD_NEW, UPLOAD_CHANGED)]
+
+    def is_empty(self):
+        return not self.remote_dirs_to_create and not any(item.action != SKIP for item in self.items)
+
+    def __str__(self):
+        return (f"{len(self.by_action(UPLOAD_NEW))} new, {len(self.by_action(UPLOAD_CHANGED))} changed, "
+                f"{len(self.by_action(DELETE))} to delete, {len(self.by_action(SKIP))} identical")
+
+
+def _change_reason(client, plan, rel_path, local, remote, compare_checksums, time_tolerance, index=None):
+    """Returns why local differs from remote, or None if they count as identical."""
+    local_size, local_mtime = local
+    remote_size, remote_mtime = remote
+    if local_size != remote_size:
+        return f"size {remote_size} -> {local_size}"
+    if compare_checksums:
+        site = index.site_of(client) if index is not None else None
+        known = index.get(site, plan.remote_path(rel_path)) if site else None
+        checksum = known['checksum'] if known else None # "ALGORITHM:hex", kept only while size and mtime are unchanged
+        if not checksum:
+            algorithm, remote_digest = ftp_client_core.get_remote_hash(client, plan.remote_path(rel_path))
+            checksum = f"{algorithm}:{remote_digest}" if remote_digest else None
+            if checksum and site:
+                index.record_entry(site, plan.remote_path(rel_path), 'file', remote_size, remote_mtime, checksum)
+        if checksum: # Otherwise the server can't hash, fall back to timestamps
+            algorithm, remote_digest = checksum.split(':', 1)
+            local_digest = hashing.hash_local_file(plan.local_path(rel_path), algorithm)
+            return None if local_digest == remote_digest else "checksum differs"
+    # An upload stamps the remote copy with the upload time, so only a newer local file counts
+    if remote_mtime is not None and local_mtime > remote_mtime + time_tolerance:
+        return "local copy is newer"
+    return None
+
+
+def plan_sync(client, local_root, remote_root, compare_checksums=False, delete_extra=False,
+              time_tolerance=MTIME_TOLERANCE, connect_kwargs=None, max_connections=DEFAULT_MAX_CONNECTIONS, pool=None,
+              index=None, index_max_age=None):
+    """
+    Compares local_root with remote_root and returns a SyncPlan: new and changed files are
+    uploaded, identical ones skipped and, with delete_extra, remote files and directories
+    that don't exist locally are deleted.
+    A file counts as changed if its size differs, its checksum differs (compare_checksums,
+    servers with a hash command or SFTP check-file only) or the local copy is newer than
+    the remote one by more than time_tolerance seconds. LIST timestamps have minute
+    resolution and are often in the server's local time, so raise time_tolerance or compare
+    checksums for such servers.
+    The remote walk runs in parallel when connect_kwargs are given (see walk_remote_tree).
+    With a RemoteIndex, directories it knows (listed within index_max_age seconds, if given)
+    aren't listed again and remote checksums are remembered between runs.
+    A missing remote_root is treated as empty; any other listing error is raised.
+    """
+    plan = SyncPlan(local_root, posixpath.normpath(remote_root.replace('\\', '/')))
+    local_dirs, local_files = ftp_client_core.scan_local_tree(local_root)
+    # Only a missing root counts as empty; a failure further down must not plan a full re-upload
+    remote_root_exists = ftp_client_core.remote_directory_exists(client, plan.remote_root)
+    if remote_root_exists:
+        if index is not None:
+            remote_dirs, remote_files = index.walk(client, plan.remote_root, index_max_age, connect_kwargs,
+                                                   max_connections, pool)
+        else:
+            remote_dirs, remote_files = ftp_client_core.walk_remote_tree(plan.remote_root, client, connect_kwargs,
+                                                                         max_connections, pool)
+    else:
+        print(f"Sync: {plan.remote_root} doesn't exist yet, treating it as empty.")
+        remote_dirs, remote_files = [], []
+
+    remote_by_path = {rel: (size, mtime) for rel, size, mtime in remote_files}
+    remote_dir_set = set(remote_dirs)
+    if not remote_root_exists:
+        plan.remote_dirs_to_create.append(plan.remote_root)
+    plan.remote_dirs_to_create += [plan.remote_path(rel) for rel in local_dirs if rel not in remote_dir_set]
+
+    for rel, size, mtime in local_files:
+        remote = remote_by_path.get(rel)
+        if remote is None:
+            plan.items.append(SyncItem(rel, UPLOAD_NEW))
+            continue
+        reason = _change_reason(client, plan, rel, (size, mtime), remote, compare_checksums, time_tolerance, index)
+        plan.items.append(SyncItem(rel, UPLOAD_CHANGED if reason else SKIP, reason=reason or ''))
+
+    if delete_extra:
+        local_paths = set(local_dirs) | {rel for rel, size, mtime in local_files}
+        extra_dirs = [rel for rel in remote_dirs if rel not in local_paths]
+        extra_dir_set = set(extra_dirs)
+
+        def under_extra_dir(rel):
+            parent = posixpath.dirname(rel)
+            while parent:
+                if parent in extra_dir_set:
+                    return True
+                parent = posixpath.dirname(parent)
+            return False
+
+        # Only the topmost extra directory is listed; deleting it takes its contents along
+        plan.items += [SyncItem(rel, DELETE, is_dir=True) for rel in extra_dirs if not under_extra_dir(rel)]
+        plan.items += [SyncItem(rel, DELETE) for rel in remote_by_path
+                       if rel not in local_paths and not under_extra_dir(rel)]
+
+    print(f"Sync plan for {local_root} -> {plan.remote_root}: {plan}")
+    return plan
+
+
+@contextmanager
+def _phase_connection(client, connect_kwargs, pool):
+    """Yields client, or a connection borrowed from pool (or opened) for just the with block."""
+    if client is not None:
+        yield client
+        return
+    owned = pool.borrow(connect_kwargs) if pool else ftp_client_core.connect_server(**connect_kwargs)
+    if not owned:
+        raise ConnectionError("No connection could be established.")
+    broken = False
+    try:
+        yield owned
+    except Exception:
+        broken = not ftp_client_core.is_connection_alive(owned)
+        raise
+    finally:
+        if pool:
+            pool.give_back(owned, discard=broken)
+        else:
+            ftp_client_core.disconnect_ftp(owned)
+
+
+def run_sync(plan, client, connect_kwargs, max_connections=DEFAULT_MAX_CONNECTIONS, verify_integrity=False,
+             pool=None, on_job_finished=None, index=None):
+    """
+    Carries out a SyncPlan: creates the missing remote directories in one batch, uploads
+    new and changed files on a TransferEngine, then deletes the extra remote entries over client.
+    With client None, a connection is taken from pool (or opened) for the directory batch and
+    again for the deletes, and released while the uploads run so the engine can use all of them.
+    Changed files are always sent whole (no resume), since their remote copy is outdated.
+    With a RemoteIndex, what was written and deleted is recorded so the next plan needs no listing.
+    Returns (jobs, delete_failures) with delete_failures a list of (SyncItem, error).
+    """
+    site = None
+    if plan.remote_dirs_to_create or index is not None:
+        with _phase_connection(client, connect_kwargs, pool) as phase_client:
+            site = index.site_of(phase_client) if index is not None else None
+            if plan.remote_dirs_to_create:
+                ftp_client_core.make_remote_directories(phase_client, plan.remote_dirs_to_create)
+
+    engine = TransferEngine(connect_kwargs, max_connections=max_connections,
+                            verify_integrity=verify_integrity, resume=False, pool=pool)
+    for item in plan.uploads():
+        engine.add_job(TransferJob(plan.local_path(item.rel_path), plan.remote_path(item.rel_path), 'upload', tag=item))
+    if engine.jobs:
+        engine.run(on_job_finished=on_job_finished)
+
+    delete_failures = []
+    deletes = plan.by_action(DELETE)
+    if deletes:
+        with _phase_connection(client, connect_kwargs, pool) as phase_client:
+            for item in deletes:
+                try:
+                    if item.is_dir:
+                        ftp_client_core.delete_remote_tree(phase_client, plan.remote_path(item.rel_path))
+                    else:
+                        ftp_client_core.delete_file(phase_client, plan.remote_path(item.rel_path))
+                except Exception as e:
+                    print(f"Sync: could not delete {plan.remote_path(item.rel_path)}: {e}")
+                    delete_failures.append((item, e))
+
+    if site:
+        _record_sync(index, site, plan, engine.jobs, delete_failures)
+    return engine.jobs, delete_failures
+
+
+def _record_sync(index, site, plan, jobs, delete_failures):
+    """Brings the index up to date with a finished sync."""
+    now = int(time.time()) # Close to the remote mtime an upload gets
+    touched = set(plan.remote_dirs_to_create)
+    for path in plan.remote_dirs_to_create:
+        index.record_entry(site, path, 'dir')
+    for job in jobs:
+        if job.status == 'done':
+            index.record_entry(site, job.remote_path, 'file', os.path.getsize(job.local_path), now)
+        touched.add(posixpath.dirname(job.remote_path))
+    failed = {item.rel_path for item, error in delete_failures}
+    for item in plan.by_action(DELETE):
+        if item.rel_path not in failed:
+            index.forget(site, plan.remote_path(item.rel_path), recursive=item.is_dir)
+        touched.add(posixpath.dirname(plan.remote_path(item.rel_path)))
+    if all(job.status == 'done' for job in jobs) and not delete_failures:
+        # The plan saw these directories in full and every change to them was ours
+        for dir_path in touched:
+            index.mark_listed(site, dir_path)
@@ -2,13 +2,44 @@ import unittest
 import os
 import tempfile
 import ftplib
-from unittest.mock import Mock, patch
+import io
+import threading
+from unittest.mock import Mock, MagicMock, patch
 import sys
 
 # Add the current directory to the path so we can import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from ftp_client_core import connect_ftp, upload_file, download_file, delete_file, rename_file, make_directory
+from ftp_client_core import connect_plain_ftp, upload_file, download_file, delete_file, rename_file, make_directory, download_file_segmented
+from ftp_client_core import _split_segments, _resume_offset, ResumeJournal, parse_list_line, ConnectionPool, ListingCache, listing_cache, list_directory, iter_directory
+from ftp_client_core import scan_local_tree, delete_remote_tree, iter_local_directory_batches
+from transfer_engine import TransferEngine, TransferJob
+from fxp_transfer import parse_pasv_response, format_port_command, fxp_transfer_file, fxp_transfer_batch
+from sync_engine import plan_sync, run_sync, UPLOAD_NEW, UPLOAD_CHANGED, DELETE, SKIP
+from remote_index import RemoteIndex
+from ftp_client_core import make_entry, make_transfer_tuning, auto_tune_transfer, TunedFTP, negotiate_hash_algorithm, get_remote_hash, verify_remote_file, IntegrityCheckFailedError
+import hashing
+from verification import VerificationPool
+import rate_limiter
+from job_store import JobStore
+from PyQt5.QtCore import Qt, QCoreApplication
+from queue_model import TransferQueueModel, QueueEntry, FAILED
+import file_pane_model
+from file_pane_model import FileListModel, RemoteFolderModel
+from folder_watcher import FolderWatcher, ADDED, REMOVED, MODIFIED
+
+def _data_connection(lines):
+    """A mock data connection that delivers lines, like a LIST/MLSD transfer"""
+    data_conn = Mock()
+    data_conn.makefile.return_value = io.StringIO(''.join(line + '\r\n' for line in lines))
+    return data_conn
+
+def _stream_listing(mock_ftp, lines):
+    """Makes mock_ftp's next transfercmd() return a data connection delivering lines"""
+    mock_ftp.encoding = 'utf-8'
+    mock_ftp.maxline = 8192
+    mock_ftp.transfercmd.return_value = _data_connection(lines)
+    return mock_ftp.transfercmd.return_value
 
 class TestFTPClientCore(unittest.TestCase):
     """Unit tests for FTP client core functionality"""
@@ -19,23 +50,24 @@ class TestFTPClientCore(unittest.TestCase):
         
     def test_connect_ftp_success(self):
         """Test successful FTP connection"""
-        with patch('ftp_client_core.ftplib.FTP') as mock_ftp_class:
+        with patch('ftp_client_core.TunedFTP') as mock_ftp_class:
             mock_ftp_instance = Mock()
             mock_ftp_class.return_value = mock_ftp_instance
             
-            result = connect_ftp("test.example.com", "testuser", "testpass")
+            result = connect_plain_ftp("test.example.com", 21, "testuser", "testpass")
             
+            mock_ftp_instance.connect.assert_called_once_with("test.example.com", 21)
             mock_ftp_instance.login.assert_called_once_with("testuser", "testpass")
             self.assertEqual(result, mock_ftp_instance)
     
     def test_connect_ftp_failure(self):
         """Test FTP connection failure"""
-        with patch('ftp_client_core.ftplib.FTP') as mock_ftp_class:
+        with patch('ftp_client_core.TunedFTP') as mock_ftp_class:
             mock_ftp_instance = Mock()
             mock_ftp_class.return_value = mock_ftp_instance
             mock_ftp_instance.login.side_effect = ftplib.error_perm("Login failed")
             
-            result = connect_ftp("test.example.com", "baduser", "badpass")
+            result = connect_plain_ftp("test.example.com", 21, "baduser", "badpass")
             
             self.assertIsNone(result)
     
@@ -80,6 +112,15 @@ class TestFTPClientCore(unittest.TestCase):
             if os.path.exists(temp_file_path):
                 os.unlink(temp_file_path)
     
+    def test_download_file_failure_raises(self):
+        """Test that a failed download raises instead of passing for a success"""
+        self.mock_ftp.retrbinary = Mock(side_effect=ftplib.error_perm("550 No such file"))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with self.assertRaises(IOError):
+                download_file(self.mock_ftp, "missing.txt", os.path.join(temp_dir, "missing.txt"))
+            with self.assertRaises(IOError):
+                download_file(object(), "remote_test.txt", os.path.join(temp_dir, "remote_test.txt"))
+    
     def test_delete_file(self):
         """Test file deletion functionality"""
         self.mock_ftp.delete = Mock()
@@ -104,6 +145,1029 @@ class TestFTPClientCore(unittest.TestCase):
         
         self.mock_ftp.mkd.assert_called_once_with("new_folder")
 
+    def test_parse_list_line(self):
+        """Test Unix LIST line parsing, including names with spaces"""
+        entry = parse_list_line("-rw-r--r--   1 owner group   1234 Jan 01  2020 my file.txt")
+
+        self.assertEqual(entry, {'name': 'my file.txt', 'type': 'file', 'size': 1234,
+                                 'mtime': 1577836800, 'permissions': '-rw-r--r--'})
+        self.assertEqual(parse_list_line("drwxr-xr-x 2 owner group 4096 Mar  3  2020  leading")['name'], " leading")
+        self.assertIsNone(parse_list_line("total 42"))
+
+    def test_parse_dos_and_eplf_list_lines(self):
+        """Test Windows/IIS and EPLF LIST formats"""
+        directory = parse_list_line("01-15-24  03:45PM       <DIR>          Some Dir")
+        eplf = parse_list_line("+i8388621.44468,m839956783,r,s10376,\tRFCEPLF")
+
+        self.assertEqual((directory['name'], directory['type']), ("Some Dir", 'dir'))
+        self.assertEqual((eplf['name'], eplf['size'], eplf['mtime']), ("RFCEPLF", 10376, 839956783))
+
+    def test_list_directory_prefers_mlsd(self):
+        """Test that MLSD is used when FEAT advertises MLST"""
+        self.mock_ftp.sendcmd.return_value = "211-Features:\n MLST type*;size*;modify*;\n211 End"
+        _stream_listing(self.mock_ftp, ["type=cdir;modify=20240101120000; .",
+                                        "type=file;size=12;modify=20240101120000; notes.txt"])
+
+        entries = list_directory(self.mock_ftp, "/data")
+
+        self.mock_ftp.transfercmd.assert_called_once_with("MLSD /data")
+        self.assertEqual(entries, [{'name': 'notes.txt', 'type': 'file', 'size': 12,
+                                    'mtime': 1704110400, 'permissions': None}])
+
+    def test_iter_directory_stops_early(self):
+        """Test that abandoning a streamed listing closes the data connection and drains the reply"""
+        self.mock_ftp.server_features = set()
+        data_conn = _stream_listing(self.mock_ftp, [f"-rw-r--r-- 1 o g 10 Jan 01 12:00 f{i}.txt" for i in range(1000)])
+
+        entries = iter_directory(self.mock_ftp, "/big")
+        first = next(entries)
+        entries.close()
+
+        self.assertEqual(first['name'], 'f0.txt')
+        data_conn.close.assert_called_once()
+        self.mock_ftp.voidresp.assert_called_once()
+
+    def test_scan_local_tree(self):
+        """Test that the local walk lists parents before children and keeps file sizes"""
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "a", "b"))
+            with open(os.path.join(root, "a", "b", "f.txt"), "w") as f:
+                f.write("12345")
+
+            dirs, files = scan_local_tree(root)
+
+        self.assertEqual(dirs, ["a", "a/b"])
+        self.assertEqual([(rel, size) for rel, size, mtime in files], [("a/b/f.txt", 5)])
+
+    def test_iter_local_directory_batches(self):
+        """Test that one local folder is listed in batches of entries, with sizes only for files"""
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "sub", "deeper"))
+            for name in ("one.txt", "two.txt", "three.txt"):
+                with open(os.path.join(root, name), "w") as f:
+                    f.write(name)
+
+            batches = list(iter_local_directory_batches(root, batch_size=2))
+            folders_only = [entry['name'] for batch in iter_local_directory_batches(root, dirs_only=True) for entry in batch]
+
+        self.assertEqual([len(batch) for batch in batches], [2, 2])
+        entries = {entry['name']: (entry['type'], entry['size']) for batch in batches for entry in batch}
+        self.assertEqual(entries, {"sub": ("dir", 0), "one.txt": ("file", 7), "two.txt": ("file", 7), "three.txt": ("file", 9)})
+        self.assertEqual(folders_only, ["sub"])
+
+    def test_delete_remote_tree_order(self):
+        """Test that a tree delete removes files first and directories deepest first"""
+        self.mock_ftp.server_features = set()
+        self.mock_ftp.encoding = 'utf-8'
+        self.mock_ftp.maxline = 8192
+        listings = {
+            "LIST /t": ["drwxr-xr-x 2 o g 0 Jan 01 12:00 sub", "-rw-r--r-- 1 o g 3 Jan 01 12:00 top.txt"],
+            "LIST /t/sub": ["-rw-r--r-- 1 o g 4 Jan 01 12:00 inner.txt"],
+        }
+        self.mock_ftp.transfercmd.side_effect = lambda cmd: _data_connection(listings[cmd])
+
+        delete_remote_tree(self.mock_ftp, "/t")
+
+        sent = [call.args[0] for call in self.mock_ftp.putcmd.call_args_list]
+        self.assertEqual(sorted(sent[:2]), ["DELE /t/sub/inner.txt", "DELE /t/top.txt"])
+        self.assertEqual(sent[2:], ["RMD /t/sub", "RMD /t"])
+
+    def test_split_segments(self):
+        """Test that segment ranges cover the whole file without gaps"""
+        ranges = _split_segments(10, 3)
+
+        self.assertEqual(ranges, [(0, 4), (4, 3), (7, 3)])
+
+    def test_resume_offset(self):
+        """Test that partial transfers resume unless the source changed"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            journal = ResumeJournal(os.path.join(temp_dir, "journal.json"))
+            # A file the journal knows nothing about is overwritten, not appended to
+            self.assertEqual(_resume_offset(journal, 'upload', "a", "b", 100, 40, 1.0), 0)
+            self.assertEqual(_resume_offset(None, 'upload', "a", "b", 100, 40, 1.0), 0)
+
+            journal.start('upload', "a", "b", 100, 1.0)
+            self.assertEqual(_resume_offset(journal, 'upload', "a", "b", 100, 40, 1.0), 40)
+            self.assertEqual(_resume_offset(journal, 'upload', "a", "b", 100, 140, 1.0), 0)
+            self.assertEqual(_resume_offset(journal, 'upload', "a", "b", 100, 40, 2.0), 0)
+
+            # Journal survives a reload until the transfer is finished
+            self.assertEqual(ResumeJournal(journal.path).pending(), [('upload', "a", "b")])
+            journal.finish('upload', "a", "b")
+            self.assertEqual(ResumeJournal(journal.path).pending(), [])
+
+    def test_resume_without_journal_entry_skips_size(self):
+        """Test that a resumable upload with nothing journaled doesn't ask the server for the size"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            local_path = os.path.join(temp_dir, "a.txt")
+            with open(local_path, "w") as f:
+                f.write("abc")
+            journal = ResumeJournal(os.path.join(temp_dir, "journal.json"))
+
+            upload_file(self.mock_ftp, local_path, "/a.txt", resume=True, journal=journal)
+
+        self.mock_ftp.size.assert_not_called()
+        self.mock_ftp.storbinary.assert_called_once()
+        self.assertEqual(self.mock_ftp.storbinary.call_args.args[0], "STOR /a.txt")
+
+    def test_interrupted_downloads_resume(self):
+        """Test that FTP (without progress) and SFTP downloads continue from the partial file, unless the source changed"""
+        import paramiko
+        with tempfile.TemporaryDirectory() as temp_dir:
+            journal = ResumeJournal(os.path.join(temp_dir, "journal.json"))
+
+            ftp = Mock(spec=ftplib.FTP)
+            ftp.size.return_value = 10
+            ftp.sendcmd.return_value = "213 20240101120000"
+            def interrupted(cmd, callback, blocksize=8192, rest=None):
+                callback(b"01234")
+                raise ftplib.error_temp("426 Connection closed; transfer aborted.")
+            ftp.retrbinary.side_effect = interrupted
+            ftp_path = os.path.join(temp_dir, "ftp.bin")
+            with self.assertRaises(IOError):
+                download_file(ftp, "/ftp.bin", ftp_path, resume=True, journal=journal)
+            ftp.retrbinary.side_effect = lambda cmd, callback, blocksize=8192, rest=None: callback(b"56789")
+            download_file(ftp, "/ftp.bin", ftp_path, resume=True, journal=journal)
+            self.assertEqual(ftp.retrbinary.call_args.kwargs['rest'], 5)
+            with open(ftp_path, 'rb') as f:
+                self.assertEqual(f.read(), b"0123456789")
+
+            sftp = Mock(spec=paramiko.SFTPClient)
+            sftp.stat.return_value = Mock(st_size=10, st_mtime=1700000000)
+            sftp_path = os.path.join(temp_dir, "sftp.bin")
+            offsets = []
+            def receive(client, remote_path, sink, offset=0, progress_callback=None, throttle=None):
+                offsets.append(offset)
+                sink.write(b"abcde" if offset == 0 else b"fghij")
+                if len(offsets) == 1:
+                    raise IOError("connection lost")
+            with patch('ftp_client_core._sftp_receive', side_effect=receive):
+                with self.assertRaises(IOError):
+                    download_file(sftp, "/sftp.bin", sftp_path, resume=True, journal=journal)
+                download_file(sftp, "/sftp.bin", sftp_path, resume=True, journal=journal)
+
+                # Same size, new mtime: the partial file belongs to an older version
+                sftp.stat.return_value = Mock(st_size=10, st_mtime=1700000100)
+                journal.start('download', sftp_path, "/sftp.bin", 10, 1700000000)
+                download_file(sftp, "/sftp.bin", sftp_path, resume=True, journal=journal)
+            self.assertEqual(offsets, [0, 5, 0])
+            self.assertEqual(journal.pending(), [])
+
+    def test_segmented_download_resumes_journaled_ranges(self):
+        """Test that an interrupted segmented download only fetches what its segments were missing"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            local_path = os.path.join(temp_dir, "big.bin")
+            journal = ResumeJournal(os.path.join(temp_dir, "journal.json"))
+            with open(local_path, 'wb') as f:
+                f.truncate(300)
+            journal.start('download', local_path, "/big.bin", 300)
+            journal.update('download', local_path, "/big.bin", segments=[[0, 100, 100], [100, 100, 30], [200, 100, 0]])
+            fetched = []
+            def fake_segment(client, remote_path, path, offset, length, on_bytes, checkpoint=None):
+                fetched.append((offset, length))
+                checkpoint(length)
+
+            with patch('ftp_client_core._open_worker_connection', return_value=Mock(spec=ftplib.FTP)), \
+                 patch('ftp_client_core._close_worker_connection'), \
+                 patch('ftp_client_core.get_remote_stat', return_value=(300, None)), \
+                 patch('ftp_client_core.MIN_SEGMENT_SIZE', 1), \
+                 patch('ftp_client_core._download_segment', side_effect=fake_segment):
+                download_file_segmented({}, "/big.bin", local_path, segments=3, resume=True, journal=journal)
+
+            self.assertEqual(sorted(fetched), [(130, 70), (200, 100)])
+            self.assertEqual(journal.pending(), [])
+
+class TestAsyncFTPClient(unittest.TestCase):
+    """Unit tests for the asyncio FTP client"""
+
+    def test_command_waits_for_running_transfer(self):
+        """Test that a command sent during a listing gets its own reply, not the listing's 226"""
+        import asyncio
+        from async_ftp_client import AsyncFTPClient
+
+        async def scenario():
+            async def serve_data(reader, writer):
+                await asyncio.sleep(0.2) # A slow transfer; NOOP is sent meanwhile
+                writer.write(b"-rw-r--r-- 1 o g 3 Jan 01 2020 a.txt\r\n")
+                await writer.drain()
+                writer.close()
+            data_server = await asyncio.start_server(serve_data, '127.0.0.1', 0)
+            data_port = data_server.sockets[0].getsockname()[1]
+
+            async def serve_control(reader, writer):
+                writer.write(b"220 Ready\r\n")
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    cmd = line.decode().strip()
+                    if cmd == 'PASV':
+                        writer.write(f"227 Entering Passive Mode (127,0,0,1,{data_port >> 8},{data_port & 0xFF})\r\n".encode())
+                    elif cmd.startswith('LIST'):
+                        writer.write(b"150 Here comes the listing\r\n")
+                        await writer.drain()
+                        await asyncio.sleep(0.3)
+                        writer.write(b"226 Done\r\n")
+                    elif cmd == 'NOOP':
+                        writer.write(b"200 NOOP ok\r\n")
+                    else:
+                        writer.write(b"502 Not implemented\r\n")
+                    await writer.drain()
+            control_server = await asyncio.start_server(serve_control, '127.0.0.1', 0)
+
+            client = AsyncFTPClient(timeout=5)
+            client._reader, client._writer = await asyncio.open_connection(
+                '127.0.0.1', control_server.sockets[0].getsockname()[1])
+            await client._read_response()
+            client.server_features = set()
+            listing = asyncio.ensure_future(client.list_directory('/'))
+            await asyncio.sleep(0.05) # The listing holds the control channel now
+            noop = await client.sendcmd('NOOP')
+            entries = await listing
+            client._writer.close()
+            control_server.close()
+            data_server.close()
+            return noop, entries
+
+        noop, entries = asyncio.run(scenario())
+        self.assertEqual(noop, "200 NOOP ok")
+        self.assertEqual([entry['name'] for entry in entries], ['a.txt'])
+
+class TestConnectionPool(unittest.TestCase):
+    """Unit tests for the per-site connection pool"""
+
+    def setUp(self):
+        self.site = {'host': 'test.example.com', 'port': 21, 'username': 'testuser', 'security_type': 'FTP'}
+
+    def test_returned_connection_is_reused(self):
+        """Test that a given-back connection is handed out again without reconnecting"""
+        with patch('ftp_client_core.connect_server', side_effect=lambda **kwargs: Mock(spec=ftplib.FTP)) as mock_connect:
+            pool = ConnectionPool(max_per_site=2)
+            first = pool.borrow(self.site)
+            pool.give_back(first)
+            second = pool.borrow(self.site)
+
+        self.assertIs(first, second)
+        self.assertEqual(mock_connect.call_count, 1)
+
+    def test_stale_connection_is_replaced(self):
+        """Test that a connection failing its NOOP check is closed and replaced"""
+        with patch('ftp_client_core.connect_server', side_effect=lambda **kwargs: Mock(spec=ftplib.FTP)):
+            pool = ConnectionPool(max_per_site=1, stale_after=0)
+            stale = pool.borrow(self.site)
+            pool.give_back(stale)
+            stale.voidcmd.side_effect = ftplib.error_temp("421 Timeout")
+            fresh = pool.borrow(self.site)
+
+        self.assertIsNot(stale, fresh)
+        stale.close.assert_called_once()
+
+    def test_site_cap_times_out(self):
+        """Test that borrowing beyond max_per_site waits and then gives up"""
+        with patch('ftp_client_core.connect_server', side_effect=lambda **kwargs: Mock(spec=ftplib.FTP)):
+            pool = ConnectionPool(max_per_site=1)
+            pool.borrow(self.site)
+
+            self.assertIsNone(pool.borrow(self.site, timeout=0.05))
+
+class TestListingCache(unittest.TestCase):
+    """Unit tests for the remote directory listing cache"""
+
+    def setUp(self):
+        self.mock_ftp = Mock(spec=ftplib.FTP)
+        self.mock_ftp.site_key = ('test.example.com', 21, 'testuser', 'FTP')
+        self.mock_ftp.server_features = set() # No MLSD, plain LIST
+        self.mock_ftp.encoding = 'utf-8'
+        self.mock_ftp.maxline = 8192
+        self.mock_ftp.transfercmd.side_effect = lambda cmd: _data_connection(["-rw-r--r-- 1 o g 10 Jan 01 12:00 a.txt"])
+        listing_cache.clear()
+
+    def test_cached_listing_skips_round_trip(self):
+        """Test that a second cached listing doesn't hit the server"""
+        list_directory(self.mock_ftp, "/data", use_cache=True)
+        entries = list_directory(self.mock_ftp, "/data/", use_cache=True)
+
+        self.assertEqual(self.mock_ftp.transfercmd.call_count, 1)
+        self.assertEqual(entries[0]['name'], 'a.txt')
+
+    def test_mutations_invalidate_parent(self):
+        """Test that delete/mkdir drop only the affected directory's listing"""
+        list_directory(self.mock_ftp, "/data", use_cache=True)
+        list_directory(self.mock_ftp, "/other", use_cache=True)
+        delete_file(self.mock_ftp, "/data/a.txt")
+
+        self.assertIsNone(listing_cache.get(self.mock_ftp, "/data"))
+        self.assertIsNotNone(listing_cache.get(self.mock_ftp, "/other"))
+
+    def test_ttl_and_lru_eviction(self):
+        """Test expiry after the TTL and eviction of the least recently used path"""
+        cache = ListingCache(ttl=60, max_entries=2)
+        cache.put(self.mock_ftp, "/a", [])
+        cache.put(self.mock_ftp, "/b", [])
+        cache.get(self.mock_ftp, "/a")
+        cache.put(self.mock_ftp, "/c", [])
+
+        self.assertIsNotNone(cache.get(self.mock_ftp, "/a"))
+        self.assertIsNone(cache.get(self.mock_ftp, "/b"))
+        cache.ttl = -1
+        self.assertIsNone(cache.get(self.mock_ftp, "/a"))
+
+class TestTransferEngine(unittest.TestCase):
+    """Unit tests for the parallel transfer engine"""
+
+    def test_jobs_spread_over_worker_connections(self):
+        """Test that every job runs and each worker opens its own connection"""
+        clients = []
+        def fake_connect(**kwargs):
+            client = Mock(spec=ftplib.FTP)
+            clients.append(client)
+            return client
+
+        with patch('transfer_engine.ftp_client_core.connect_server', side_effect=fake_connect), \
+             patch('transfer_engine.ftp_client_core.upload_file') as mock_upload, \
+             patch('transfer_engine.ftp_client_core.disconnect_ftp'):
+            engine = TransferEngine({'host': 'test.example.com'}, max_connections=3)
+            engine.add_jobs(TransferJob(f"/tmp/file{i}", f"/remote/file{i}") for i in range(10))
+            jobs = engine.run()
+
+        self.assertEqual(mock_upload.call_count, 10)
+        self.assertTrue(all(job.status == 'done' for job in jobs))
+        self.assertEqual(len(clients), 3)
+
+    def test_jobs_fail_when_no_connection(self):
+        """Test that queued jobs are marked failed if no worker can connect"""
+        with patch('transfer_engine.ftp_client_core.connect_server', return_value=None):
+            engine = TransferEngine({'host': 'test.example.com'}, max_connections=2)
+            engine.add_job(TransferJob("/tmp/file", "/remote/file"))
+            jobs = engine.run()
+
+        self.assertEqual(jobs[0].status, 'failed')
+        self.assertIsInstance(jobs[0].error, ConnectionError)
+
+    def test_verifier_gets_a_connection_within_the_site_cap(self):
+        """Test that parallel verification runs alongside the workers when the pool is at its cap"""
+        import time
+        verified = threading.Event()
+        workers = set()
+        def fake_upload(client, local_path, remote_path, **kwargs):
+            workers.add(threading.current_thread().name)
+            if remote_path == "/remote/file0":
+                time.sleep(0.2) # Every worker has taken its connection by now
+            else: # The rest only finish once the first file is being verified
+                if not verified.wait(2):
+                    raise IOError("Verifier never got a connection")
+            return ('MD5', 'abc')
+        def fake_hashes(client, remote_paths):
+            verified.set()
+            return [('MD5', 'abc')] * len(remote_paths)
+
+        with patch('ftp_client_core.connect_server', side_effect=lambda **kwargs: Mock(spec=ftplib.FTP)), \
+             patch('transfer_engine.ftp_client_core.upload_file', side_effect=fake_upload), \
+             patch('verification.ftp_client_core.get_remote_hashes', side_effect=fake_hashes), \
+             patch('ftp_client_core.disconnect_ftp'):
+            pool = ConnectionPool(max_per_site=2)
+            engine = TransferEngine({'host': 'test.example.com'}, max_connections=2, verify_integrity=True, pool=pool)
+            engine.add_jobs(TransferJob(f"/tmp/file{i}", f"/remote/file{i}") for i in range(4))
+            jobs = engine.run()
+
+        self.assertEqual(len(workers), 1)
+        self.assertTrue(all(job.status == 'done' for job in jobs))
+
+    def test_lost_verifier_connection_fails_jobs(self):
+        """Test that jobs fail when the verifier can't ask the server, but pass when the server can't hash"""
+        def fake_hashes(client, remote_paths):
+            if "/remote/lost" in remote_paths:
+                raise EOFError("Connection closed")
+            return [(None, None)] * len(remote_paths)
+
+        for remote_path, status in (("/remote/lost", 'failed'), ("/remote/nohash", 'done')):
+            with patch('ftp_client_core.connect_server', side_effect=lambda **kwargs: Mock(spec=ftplib.FTP)), \
+                 patch('transfer_engine.ftp_client_core.upload_file', return_value=('MD5', 'abc')), \
+                 patch('verification.ftp_client_core.get_remote_hashes', side_effect=fake_hashes), \
+                 patch('ftp_client_core.disconnect_ftp'):
+                engine = TransferEngine({'host': 'test.example.com'}, max_connections=2, verify_integrity=True)
+                engine.add_job(TransferJob("/tmp/file", remote_path))
+                job, = engine.run()
+            self.assertEqual(job.status, status)
+            if status == 'failed':
+                self.assertIsInstance(job.error, ConnectionError)
+
+class TestFXPTransfer(unittest.TestCase):
+    """Unit tests for FXP server-to-server transfers"""
+
+    def test_pasv_reply_becomes_port_command(self):
+        """Test that the destination's PASV address is handed to the source unchanged"""
+        host, port = parse_pasv_response("227 Entering Passive Mode (192,168,1,5,19,137).")
+
+        self.assertEqual((host, port), ("192.168.1.5", 5001))
+        self.assertEqual(format_port_command(host, port), "PORT 192,168,1,5,19,137")
+
+    def test_transfer_waits_for_both_completions(self):
+        """Test the FXP command sequence on both control connections"""
+        source = Mock(spec=ftplib.FTP)
+        dest = Mock(spec=ftplib.FTP)
+        calls = []
+        dest.sendcmd.return_value = "227 Entering Passive Mode (10,0,0,2,4,1)."
+        dest.putcmd.side_effect = lambda cmd: calls.append(("dest", cmd))
+        source.putcmd.side_effect = lambda cmd: calls.append(("source", cmd))
+        dest.getresp.side_effect = lambda: calls.append(("dest", "reply")) or "150 Ok to send data."
+        source.getresp.return_value = "150 Opening BINARY mode data connection."
+
+        fxp_transfer_file(source, dest, "src.bin", "dst.bin")
+
+        source.voidcmd.assert_called_once_with("PORT 10,0,0,2,4,1")
+        # RETR must go out before the destination's STOR reply is awaited
+        self.assertEqual(calls, [("dest", "STOR dst.bin"), ("source", "RETR src.bin"), ("dest", "reply")])
+        source.voidresp.assert_called_once()
+        dest.voidresp.assert_called_once()
+
+    def test_refused_retr_aborts_both_sides(self):
+        """Test that a source refusing RETR aborts the destination's pending STOR"""
+        source = Mock(spec=ftplib.FTP)
+        dest = Mock(spec=ftplib.FTP)
+        dest.sendcmd.return_value = "227 Entering Passive Mode (10,0,0,2,4,1)."
+        dest.getresp.return_value = "150 Ok to send data."
+        source.getresp.side_effect = ftplib.error_perm("550 No such file.")
+
+        with self.assertRaises(ftplib.error_perm):
+            fxp_transfer_file(source, dest, "missing.bin", "dst.bin")
+
+        dest.abort.assert_called_once()
+        source.abort.assert_called_once()
+        dest.voidresp.assert_not_called()
+
+    def test_batch_pipelines_next_pasv(self):
+        """Test that the next PASV is queued while the current transfer runs"""
+        source = Mock(spec=ftplib.FTP)
+        dest = Mock(spec=ftplib.FTP)
+        pasv = "227 Entering Passive Mode (10,0,0,2,4,1)."
+        dest.sendcmd.return_value = pasv
+        # STOR 1, pipelined PASV, STOR 2
+        dest.getresp.side_effect = ["150 Ok to send data.", pasv, "150 Ok to send data."]
+        source.getresp.return_value = "150 Opening BINARY mode data connection."
+
+        results = fxp_transfer_batch(source, dest, [("a", "a"), ("b", "b")])
+
+        self.assertEqual([error for _, _, error in results], [None, None])
+        dest.sendcmd.assert_called_once_with("PASV")
+        self.assertEqual([c.args[0] for c in dest.putcmd.call_args_list], ["STOR a", "PASV", "STOR b"])
+        self.assertEqual(source.voidcmd.call_count, 3) # TYPE I + two PORTs
+
+class TestSyncEngine(unittest.TestCase):
+    """Unit tests for sync planning"""
+
+    def setUp(self):
+        self.mock_ftp = Mock(spec=ftplib.FTP)
+        self.mock_ftp.server_features = set()
+        self.mock_ftp.encoding = 'utf-8'
+        self.mock_ftp.maxline = 8192
+        # Remote side: same.txt and changed.txt from 2020, plus an extra file
+        listing = ["-rw-r--r-- 1 o g 3 Jan 01 2020 same.txt",
+                   "-rw-r--r-- 1 o g 5 Jan 01 2020 changed.txt",
+                   "-rw-r--r-- 1 o g 1 Jan 01 2020 extra.txt"]
+        self.mock_ftp.transfercmd.side_effect = lambda cmd: _data_connection(listing)
+
+    def test_plan_sync(self):
+        """Test that only new and changed files are uploaded and extra ones deleted"""
+        with tempfile.TemporaryDirectory() as root:
+            for name in ("same.txt", "changed.txt", "new.txt"):
+                with open(os.path.join(root, name), "w") as f:
+                    f.write("abc")
+                os.utime(os.path.join(root, name), (1577836800, 1577836800)) # 2020-01-01 UTC
+
+            plan = plan_sync(self.mock_ftp, root, "/site", delete_extra=True)
+
+        actions = {item.rel_path: item.action for item in plan.items}
+        self.assertEqual(actions, {"same.txt": SKIP, "changed.txt": UPLOAD_CHANGED,
+                                   "new.txt": UPLOAD_NEW, "extra.txt": DELETE})
+        self.assertEqual(plan.remote_path("new.txt"), "/site/new.txt")
+
+    def test_missing_root_is_planned_as_empty(self):
+        """Test that a remote root that doesn't exist yet is created and filled"""
+        self.mock_ftp.cwd.side_effect = ftplib.error_perm("550 No such directory.")
+        with tempfile.TemporaryDirectory() as root:
+            open(os.path.join(root, "new.txt"), "w").close()
+            plan = plan_sync(self.mock_ftp, root, "/site")
+
+        self.assertEqual(plan.remote_dirs_to_create, ["/site"])
+        self.assertEqual([item.action for item in plan.items], [UPLOAD_NEW])
+        self.mock_ftp.transfercmd.assert_not_called()
+
+    def test_run_sync_releases_connection_during_uploads(self):
+        """Test that run_sync gives its borrowed connection back before the uploads start"""
+        with tempfile.TemporaryDirectory() as root:
+            open(os.path.join(root, "new.txt"), "w").close()
+            self.mock_ftp.cwd.side_effect = ftplib.error_perm("550 No such directory.")
+            plan = plan_sync(self.mock_ftp, root, "/site")
+        pool = Mock()
+        pool.borrow.return_value = self.mock_ftp
+        held_during_run = []
+
+        with patch('sync_engine.TransferEngine') as engine_class, \
+             patch('ftp_client_core.make_remote_directories'):
+            engine = engine_class.return_value
+            engine.jobs = [Mock()]
+            engine.run.side_effect = lambda **kwargs: held_during_run.append(pool.borrow.call_count - pool.give_back.call_count)
+            run_sync(plan, None, {'host': 'test.example.com'}, pool=pool)
+
+        self.assertEqual(held_during_run, [0])
+        pool.borrow.assert_called_once()
+
+    def test_listing_error_is_not_an_empty_remote(self):
+        """Test that a failed listing of an existing root is raised instead of planning a full upload"""
+        self.mock_ftp.transfercmd.side_effect = ConnectionResetError("connection lost")
+        with tempfile.TemporaryDirectory() as root:
+            with self.assertRaises(ConnectionResetError):
+                plan_sync(self.mock_ftp, root, "/site")
+
+class TestRemoteIndex(unittest.TestCase):
+    """Unit tests for the on-disk remote index"""
+
+    def setUp(self):
+        self.index = RemoteIndex(":memory:")
+        self.mock_ftp = Mock(spec=ftplib.FTP)
+        self.mock_ftp.site_key = ('test.example.com', 21, 'testuser', 'FTP')
+        self.mock_ftp.server_features = set()
+        self.mock_ftp.encoding = 'utf-8'
+        self.mock_ftp.maxline = 8192
+        self.mock_ftp.transfercmd.side_effect = lambda cmd: _data_connection(["-rw-r--r-- 1 o g 7 Jan 01 2020 new.txt"])
+        self.site = RemoteIndex.site_of(self.mock_ftp)
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_relisting_keeps_checksum_of_unchanged_files(self):
+        """Test that a checksum survives a re-listing only while size and mtime match"""
+        self.index.record_listing(self.site, "/d", [make_entry("a", 'file', 1, 100), make_entry("b", 'file', 2, 100)])
+        self.index.record_entry(self.site, "/d/a", 'file', 1, 100, checksum="aa")
+        self.index.record_entry(self.site, "/d/b", 'file', 2, 100, checksum="bb")
+        self.index.record_listing(self.site, "/d", [make_entry("a", 'file', 1, 100), make_entry("b", 'file', 3, 200)])
+
+        self.assertEqual(self.index.get(self.site, "/d/a")['checksum'], "aa")
+        self.assertIsNone(self.index.get(self.site, "/d/b")['checksum'])
+
+    def test_walk_relists_only_invalidated_directories(self):
+        """Test that a walk comes from the index except for directories changed since"""
+        self.index.record_tree(self.site, "/site", ["a", "b"], [("a/x.txt", 1, 100), ("b/y.txt", 2, 100)])
+        dirs, files = self.index.walk(self.mock_ftp, "/site")
+        self.mock_ftp.transfercmd.assert_not_called()
+        self.assertEqual(sorted(files), [("a/x.txt", 1, 100), ("b/y.txt", 2, 100)])
+
+        listing_cache.invalidate(self.mock_ftp, "/site/b") # What an upload/delete into /site/b does
+        dirs, files = self.index.walk(self.mock_ftp, "/site")
+
+        self.mock_ftp.transfercmd.assert_called_once_with("LIST /site/b")
+        self.assertEqual(sorted(rel for rel, size, mtime in files), ["a/x.txt", "b/new.txt"])
+
+class TestHashing(unittest.TestCase):
+    """Test local hashing and remote hash negotiation"""
+
+    def test_hash_local_file(self):
+        """Test that large-buffer hashing matches hashlib and zlib"""
+        import hashlib, zlib
+        data = os.urandom(hashing.HASH_BLOCK_SIZE + 123) # Spans two reads
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(data)
+        try:
+            self.assertEqual(hashing.hash_local_file(f.name, 'sha256'), hashlib.sha256(data).hexdigest())
+            self.assertEqual(hashing.hash_local_file(f.name, 'CRC32'), f"{zlib.crc32(data):08x}")
+            self.assertIsNone(hashing.hash_local_file(f.name + '.missing'))
+        finally:
+            os.unlink(f.name)
+
+    def test_hash_feature_is_negotiated(self):
+        """Test that HASH is preferred and switched to the strongest offered algorithm"""
+        mock_ftp = Mock(spec=ftplib.FTP)
+        digest = 'ab' * 32
+        mock_ftp.sendcmd.side_effect = lambda cmd: {
+            'FEAT': "211-Features:\n HASH SHA-256;SHA-1*;MD5\n XMD5\n211 End",
+            'OPTS HASH SHA-256': "200 SHA-256",
+            'HASH /f.bin': f"213 SHA-256 0-10 {digest} /f.bin",
+        }[cmd]
+
+        self.assertEqual(negotiate_hash_algorithm(mock_ftp), ('SHA-256', 'HASH'))
+        self.assertEqual(get_remote_hash(mock_ftp, '/f.bin'), ('SHA-256', digest))
+
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'local')
+        try:
+            with self.assertRaises(IntegrityCheckFailedError):
+                verify_remote_file(mock_ftp, f.name, '/f.bin')
+        finally:
+            os.unlink(f.name)
+
+    def test_upload_verification_hashes_inline(self):
+        """Test that verified uploads hash the blocks storbinary reads instead of re-reading the file"""
+        import hashlib
+        mock_ftp = Mock(spec=ftplib.FTP)
+        mock_ftp.hash_method = ('MD5', 'XMD5')
+        mock_ftp.storbinary.side_effect = lambda cmd, fp, blocksize=8192, callback=None: [fp.read(8192) for _ in range(4)]
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'x' * 20000)
+        mock_ftp.sendcmd.return_value = '250 ' + hashlib.md5(b'x' * 20000).hexdigest()
+        try:
+            with patch('hashing.hash_local_file', side_effect=AssertionError("file read twice")):
+                upload_file(mock_ftp, f.name, '/x.bin', verify_integrity=True)
+        finally:
+            os.unlink(f.name)
+        mock_ftp.sendcmd.assert_called_once_with('XMD5 /x.bin')
+
+
+class TestTransferTuning(unittest.TestCase):
+    """Test per-site block size and data socket options"""
+
+    def test_tuning_applies_to_data_connections_and_blocks(self):
+        """Test that data connections get the socket options and transfers the block size"""
+        import socket
+        client = TunedFTP()
+        client.transfer_tuning = make_transfer_tuning(block_size=1024 * 1024, send_buffer=4 * 1024 * 1024, tcp_nodelay=True)
+        data_conn = Mock()
+        with patch('ftplib.FTP.ntransfercmd', return_value=(data_conn, None)):
+            self.assertEqual(client.transfercmd('RETR x'), data_conn)
+        data_conn.setsockopt.assert_any_call(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        data_conn.setsockopt.assert_any_call(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.assertEqual(data_conn.setsockopt.call_count, 2) # recv_buffer=None keeps the OS default
+
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'data')
+        try:
+            with patch.object(client, 'storbinary') as mock_stor:
+                upload_file(client, f.name, '/remote.bin')
+        finally:
+            os.unlink(f.name)
+        self.assertEqual(mock_stor.call_args.kwargs['blocksize'], 1024 * 1024)
+
+    def test_plain_ftp_uses_sendfile_and_recv_into(self):
+        """Test the zero-copy upload and the reusable-buffer download of plain FTP clients"""
+        client = TunedFTP()
+        client.voidcmd = Mock()
+        client.voidresp = Mock(return_value='226 Done')
+        data_conn = MagicMock()
+        data_conn.__enter__.return_value = data_conn
+        client.transfercmd = Mock(return_value=data_conn)
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'0123456789')
+        try:
+            with open(f.name, 'rb') as fp:
+                fp.seek(4)
+                client.storbinary('APPE remote.bin', fp)
+            data_conn.sendfile.assert_called_once()
+            self.assertEqual(data_conn.sendfile.call_args.args[1], 4)
+
+            chunks = iter([b'abc', b'de', b''])
+            def recv_into(buffer, nbytes=0):
+                chunk = next(chunks)
+                buffer[:len(chunk)] = chunk
+                return len(chunk)
+            data_conn.recv_into.side_effect = recv_into
+            client.transfer_tuning = make_transfer_tuning(block_size=16)
+            download_file(client, 'remote.bin', f.name)
+            with open(f.name, 'rb') as fp:
+                self.assertEqual(fp.read(), b'abcde')
+        finally:
+            os.unlink(f.name)
+
+    def test_sftp_download_prefetches_blocks(self):
+        """Test that SFTP downloads read every block through readv with the tuned request settings"""
+        import paramiko
+        client = Mock(spec=paramiko.SFTPClient)
+        client.transfer_tuning = make_transfer_tuning(block_size=4, sftp_request_size=2, sftp_prefetch_requests=8)
+        remote_file = MagicMock()
+        remote_file.__enter__.return_value = remote_file
+        remote_file.stat.return_value = Mock(st_size=10)
+        remote_file.readv.side_effect = lambda blocks, prefetch: [b'x' * length for start, length in blocks]
+        client.open.return_value = remote_file
+        progress = []
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            pass
+        try:
+            download_file(client, '/remote.bin', f.name, progress_callback=lambda done, total: progress.append(done))
+            with open(f.name, 'rb') as fp:
+                self.assertEqual(fp.read(), b'x' * 10)
+        finally:
+            os.unlink(f.name)
+        remote_file.readv.assert_called_once_with([(0, 4), (4, 4), (8, 2)], 8)
+        self.assertEqual(remote_file.MAX_REQUEST_SIZE, 2)
+        self.assertEqual(progress, [4, 8, 10])
+
+    def test_auto_tune_without_candidates_keeps_tuning(self):
+        """Test that auto-tuning with nothing to try leaves the current settings alone"""
+        client = Mock(spec=ftplib.FTP)
+        client.transfer_tuning = make_transfer_tuning(block_size=1024 * 1024)
+        tuning = auto_tune_transfer(client, candidates=())
+        self.assertEqual(tuning, make_transfer_tuning(block_size=1024 * 1024))
+
+    def test_auto_tune_probes_through_transfer_paths(self):
+        """Test that the probe goes through sendfile and recv_into under a temporary name that is always deleted"""
+        client = TunedFTP()
+        client.voidcmd = Mock()
+        client.voidresp = Mock(return_value='226 Done')
+        client.delete = Mock()
+        data_conn = MagicMock()
+        data_conn.__enter__.return_value = data_conn
+        data_conn.recv_into.return_value = 0
+        client.transfercmd = Mock(return_value=data_conn)
+        tuning = auto_tune_transfer(client, remote_dir='/incoming', probe_size=64, candidates=((16, None), (32, 65536)))
+
+        self.assertEqual(data_conn.sendfile.call_count, 2)
+        self.assertEqual(data_conn.recv_into.call_count, 2)
+        self.assertIn(tuning['block_size'], (16, 32))
+        stor, retr = client.transfercmd.call_args_list[0].args[0], client.transfercmd.call_args_list[1].args[0]
+        remote_path = stor.split(' ', 1)[1]
+        self.assertTrue(remote_path.startswith('/incoming/.qftpclient-tune-'))
+        self.assertEqual(retr, f'RETR {remote_path}')
+        client.delete.assert_called_once_with(remote_path)
+
+        client.delete.reset_mock()
+        client.pwd = Mock(return_value='/home/user')
+        data_conn.sendfile.side_effect = OSError("Connection reset")
+        tuning = auto_tune_transfer(client, probe_size=64, candidates=((1024, None),))
+        self.assertIn(tuning['block_size'], (16, 32)) # Unchanged
+        self.assertTrue(client.delete.call_args.args[0].startswith('/home/user/.qftpclient-tune-'))
+
+class TestVerificationPool(unittest.TestCase):
+    """Test background verification over a dedicated connection"""
+
+    def test_hash_requests_are_pipelined(self):
+        """Test that queued files are verified with pipelined requests and hashed locally only when needed"""
+        import hashlib
+        paths = []
+        for data in (b'first', b'second'):
+            with tempfile.NamedTemporaryFile(delete=False) as f:
+                f.write(data)
+            paths.append(f.name)
+        mock_ftp = Mock(spec=ftplib.FTP)
+        mock_ftp.hash_method = ('MD5', 'XMD5')
+        sent = []
+        mock_ftp.putcmd.side_effect = sent.append
+        replies = iter(['250 ' + hashlib.md5(b'first').hexdigest(), '250 ' + '0' * 32])
+        mock_ftp.getresp.side_effect = lambda: (self.assertEqual(len(sent), 2), next(replies))[1]
+
+        try:
+            both_queued = threading.Event()
+            connect = lambda **kwargs: both_queued.wait(5) and mock_ftp
+            with patch('ftp_client_core.connect_server', side_effect=connect):
+                verifier = VerificationPool({'host': 'localhost'})
+                first = verifier.submit(paths[0], '/a', local_digest=('MD5', hashlib.md5(b'first').hexdigest()))
+                second = verifier.submit(paths[1], '/b')
+                both_queued.set()
+                verifier.close()
+        finally:
+            for path in paths:
+                os.unlink(path)
+
+        self.assertEqual(sent, ['XMD5 /a', 'XMD5 /b'])
+        self.assertEqual(first.status, 'passed')
+        self.assertEqual(second.status, 'failed')
+        self.assertIsInstance(second.error, IntegrityCheckFailedError)
+
+class TestRateLimiter(unittest.TestCase):
+    """Test token-bucket bandwidth limits, schedules and priorities"""
+
+    def test_schedule_windows(self):
+        """Test time-of-day windows, including ones that wrap past midnight and weekday-only ones"""
+        import datetime
+        schedule = rate_limiter.RateSchedule([('22:00', '06:00', 0), ('08:00', '18:00', 1000, range(5))], default_rate=5000)
+        self.assertEqual(schedule.rate_at(datetime.datetime(2024, 1, 3, 23, 30)), 0) # Wednesday night
+        self.assertEqual(schedule.rate_at(datetime.datetime(2024, 1, 4, 5, 59)), 0)
+        self.assertEqual(schedule.rate_at(datetime.datetime(2024, 1, 4, 9, 0)), 1000)
+        self.assertEqual(schedule.rate_at(datetime.datetime(2024, 1, 6, 9, 0)), 5000) # Saturday
+        self.assertEqual(schedule.rate_at(datetime.datetime(2024, 1, 4, 18, 0)), 5000)
+
+    def test_bucket_holds_rate_and_serves_priorities(self):
+        """Test that consumers are held to the rate and that a waiting higher priority goes first"""
+        import time
+        bucket = rate_limiter.TokenBucket(rate=1000000, burst=100000)
+        started = time.monotonic()
+        for _ in range(5):
+            bucket.consume(100000)
+        self.assertGreater(time.monotonic() - started, 0.3) # The first block is covered by the burst
+
+        order = []
+        bucket.consume(200000) # Deep in debt, the next consumers have to wait
+        low = threading.Thread(target=lambda: (bucket.consume(1000, rate_limiter.PRIORITY_LOW), order.append('low')))
+        high = threading.Thread(target=lambda: (bucket.consume(1000, rate_limiter.PRIORITY_HIGH), order.append('high')))
+        low.start()
+        time.sleep(0.05)
+        high.start()
+        low.join(5)
+        high.join(5)
+        self.assertEqual(order, ['high', 'low'])
+
+    def test_throttled_upload_passes_every_block(self):
+        """Test that a limited throttle sees every uploaded block and an unlimited one keeps sendfile"""
+        client = TunedFTP()
+        client.transfer_tuning = make_transfer_tuning(block_size=4)
+        scheduler = rate_limiter.BandwidthScheduler()
+        scheduler.set_site_limit('site', 1024 * 1024)
+        consumed = []
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'0123456789')
+        try:
+            with patch('ftplib.FTP.storbinary') as mock_stor:
+                throttle = scheduler.throttle('site')
+                throttle.consume = consumed.append
+                upload_file(client, f.name, '/remote.bin', throttle=throttle)
+                callback = mock_stor.call_args.args[3] # (cmd, fp, blocksize, callback, rest)
+                for block in (b'0123', b'4567', b'89'):
+                    callback(block)
+            self.assertEqual(consumed, [4, 4, 2])
+
+            data_conn = MagicMock()
+            data_conn.__enter__.return_value = data_conn
+            client.voidcmd = Mock()
+            client.voidresp = Mock(return_value='226 Done')
+            client.transfercmd = Mock(return_value=data_conn)
+            upload_file(client, f.name, '/remote.bin', throttle=scheduler.throttle('other site'))
+            data_conn.sendfile.assert_called_once()
+        finally:
+            os.unlink(f.name)
+
+class TestJobStore(unittest.TestCase):
+    """Test the on-disk transfer queue"""
+
+    def test_queue_survives_restart(self):
+        """Test that a reopened store keeps unfinished folder files and puts running jobs back to pending"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'queue.sqlite3')
+            store = JobStore(path)
+            folder = store.add('upload', '/local/dir', '/remote/dir', is_dir=True)
+            first, second, third = store.add_children(folder, 'upload', [('/local/dir/a', '/remote/dir/a'),
+                                                                        ('/local/dir/b', '/remote/dir/b'),
+                                                                        ('/local/dir/c', '/remote/dir/c', 30)])
+            store.mark_running(folder)
+            store.mark_done(first)
+            store.mark_running(second)
+            store.mark_failed(third, IOError("timed out"))
+            store.close() # As if the application had crashed here
+
+            store = JobStore(path)
+            self.assertEqual(store.recover(), 1)
+            self.assertEqual([job['local_path'] for job in store.children(folder)], ['/local/dir/b', '/local/dir/c'])
+            self.assertEqual((store.get(third)['retries'], store.get(third)['error']), (1, 'timed out'))
+            self.assertEqual(store.get(folder)['status'], 'running') # Its files carry the work now
+            store.remove(folder)
+            self.assertEqual(store.counts(), {})
+            store.close()
+
+    def test_engine_records_job_outcomes(self):
+        """Test that the engine marks stored jobs done or failed"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = JobStore(os.path.join(temp_dir, 'queue.sqlite3'))
+            good = store.add('upload', '/tmp/good', '/remote/good')
+            bad = store.add('upload', '/tmp/bad', '/remote/bad')
+            def fake_upload(client, local_path, *args, **kwargs):
+                if local_path == '/tmp/bad':
+                    raise IOError("Upload failed")
+            with patch('transfer_engine.ftp_client_core.connect_server', return_value=Mock(spec=ftplib.FTP)), \
+                 patch('transfer_engine.ftp_client_core.upload_file', side_effect=fake_upload), \
+                 patch('transfer_engine.ftp_client_core.is_connection_alive', return_value=True), \
+                 patch('transfer_engine.ftp_client_core.disconnect_ftp'):
+                engine = TransferEngine({'host': 'test.example.com'}, max_connections=1, store=store)
+                engine.add_jobs([TransferJob('/tmp/good', '/remote/good', store_id=good),
+                                 TransferJob('/tmp/bad', '/remote/bad', store_id=bad)])
+                engine.run()
+            self.assertEqual(store.get(good)['status'], 'done')
+            self.assertEqual((store.get(bad)['status'], store.get(bad)['retries']), ('failed', 1))
+            store.close()
+
+    def test_plain_ftp_upload_saves_offsets(self):
+        """Test that a plain FTP upload reports its start offset and sendfile progress to the store"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = JobStore(os.path.join(temp_dir, 'queue.sqlite3'))
+            local_path = os.path.join(temp_dir, 'big.bin')
+            with open(local_path, 'wb') as f:
+                f.write(b'x' * 10)
+            job_id = store.add('upload', local_path, '/remote/big.bin')
+            client = TunedFTP()
+            client.voidcmd = Mock()
+            client.voidresp = Mock(return_value='226 Done')
+            data_conn = MagicMock()
+            data_conn.__enter__.return_value = data_conn
+            data_conn.sendfile.side_effect = [6, 4, 0]
+            client.transfercmd = Mock(return_value=data_conn)
+            saved = []
+            real_update = store.update_progress
+            store.update_progress = lambda *args: saved.append(args) or real_update(*args)
+
+            with patch('transfer_engine.ftp_client_core.connect_server', return_value=client), \
+                 patch('transfer_engine.ftp_client_core.disconnect_ftp'):
+                engine = TransferEngine({'host': 'test.example.com'}, max_connections=1, store=store)
+                engine.add_job(TransferJob(local_path, '/remote/big.bin', store_id=job_id))
+                engine.run()
+
+            self.assertEqual(saved[0], (job_id, 0, 10)) # Saved as soon as the job starts
+            self.assertEqual([call.args[1] for call in data_conn.sendfile.call_args_list], [0, 6, 10])
+            self.assertEqual(store.get(job_id)['status'], 'done')
+            store.close()
+
+class TestQueueModel(unittest.TestCase):
+    """Test the transfer queue's table model"""
+
+    def test_batched_changes(self):
+        """Test that entries are added, marked and removed in batches, one notification per contiguous range"""
+        model = TransferQueueModel()
+        entries = [QueueEntry(job_id, f'/local/f{job_id}', f'/remote/f{job_id}') for job_id in range(1, 11)]
+        inserted, removed, changed = [], [], []
+        model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+        model.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+        model.dataChanged.connect(lambda top_left, bottom_right: changed.append((top_left.row(), bottom_right.row())))
+        model.add_entries(entries)
+        self.assertEqual((inserted, model.rowCount()), ([(0, 9)], 10))
+
+        model.set_status([entries[2], entries[4]], FAILED, IOError("timed out"))
+        self.assertEqual(changed, [(2, 4)])
+        self.assertEqual(model.data(model.index(4, 2)), 'Upload Error')
+        self.assertEqual(model.data(model.index(4, 0), Qt.ToolTipRole), 'timed out')
+
+        model.remove_entries([entries[1], entries[2], entries[3], entries[7]])
+        self.assertEqual(removed, [(7, 7), (1, 3)]) # Last range first, so earlier rows keep their numbers
+        self.assertEqual([model.entry(row).job_id for row in range(model.rowCount())], [1, 5, 6, 7, 9, 10])
+        self.assertEqual((model.row_of(entries[8]), model.row_of(entries[2])), (4, -1))
+
+class TestFileListModel(unittest.TestCase):
+    """Test the file panes' listing model"""
+
+    def test_fetch_sort_and_filter(self):
+        """Test that rows are handed out in pages, folders sort first and filtering keeps the sort"""
+        model = FileListModel(join=lambda directory, name: f"{directory}/{name}")
+        model.clear('/remote')
+        model.add_entries([make_entry(f"f{i:04d}.log", 'file', i) for i in range(file_pane_model.FETCH_BATCH + 500)])
+        model.add_entries([make_entry('b-dir', 'dir'), make_entry('a-dir', 'dir')])
+        self.assertEqual((model.rowCount(), model.count()), (file_pane_model.FETCH_BATCH, file_pane_model.FETCH_BATCH + 502))
+        self.assertTrue(model.canFetchMore())
+        model.fetchMore()
+        self.assertFalse(model.canFetchMore())
+
+        model.sort(1, Qt.DescendingOrder)
+        self.assertEqual([model.name(row) for row in range(3)], ['b-dir', 'a-dir', 'f1499.log'])
+        model.set_filter('F00*')
+        self.assertEqual((model.count(), model.name(0), model.size(0)), (100, 'f0099.log', 99))
+        self.assertEqual(model.path(0), '/remote/f0099.log')
+        model.set_filter('dir')
+        self.assertEqual([model.is_dir(row) for row in range(model.count())], [True, True])
+
+    def test_incremental_changes(self):
+        """Test that watcher changes update and remove entries in place"""
+        model = FileListModel()
+        model.set_entries([make_entry('b.txt', 'file', 2), make_entry('c.txt', 'file', 3)], directory='/local')
+        model.sort(0)
+        model.update_entries([make_entry('c.txt', 'file', 30), make_entry('a.txt', 'file', 1)])
+        self.assertEqual([(model.name(row), model.size(row)) for row in range(model.count())],
+                         [('a.txt', 1), ('b.txt', 2), ('c.txt', 30)])
+        model.remove_names(['b.txt', 'missing.txt'])
+        self.assertEqual(([model.name(row) for row in range(model.count())], model.rowCount()), (['a.txt', 'c.txt'], 2))
+        self.assertTrue(model.summary().startswith('2 Files, 0 Folders'))
+
+    def test_remote_folder_tree_pages_folders(self):
+        """Test that the remote folder tree hands out subfolders in pages and resolves their paths"""
+        model = RemoteFolderModel("Site")
+        model.begin_listing('/pub/')
+        model.add_folders([f"d{i}" for i in range(file_pane_model.FETCH_BATCH + 10)])
+        top = model.top_index()
+        self.assertEqual((model.rowCount(), model.rowCount(top)), (1, file_pane_model.FETCH_BATCH))
+        self.assertTrue(model.canFetchMore(top))
+        model.fetchMore(top)
+        self.assertEqual(model.rowCount(top), file_pane_model.FETCH_BATCH + 11) # With ".."
+
+        self.assertEqual(model.path(top), '/pub/')
+        self.assertEqual(model.path(model.index(0, 0, top)), '/') # ".."
+        self.assertEqual(model.path(model.index(1, 0, top)), '/pub/d0/')
+        self.assertEqual(model.parent(model.index(1, 0, top)), top)
+        model.clear("Site (Disconnected)")
+        self.assertEqual((model.rowCount(), model.headerData(0, Qt.Horizontal)), (0, "Site (Disconnected)"))
+
+class TestFolderWatcher(unittest.TestCase):
+    """Test turning filesystem notifications into change events"""
+
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def test_reports_added_modified_and_removed(self):
+        """Test that a recursive watch reports changes against its snapshot and follows new folders"""
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "sub"))
+            for name in ("keep.txt", "gone.txt"):
+                with open(os.path.join(root, name), "w") as f:
+                    f.write("1")
+            watcher = FolderWatcher(recursive=True)
+            watcher.watch(root)
+            with open(os.path.join(root, "keep.txt"), "w") as f:
+                f.write("longer")
+            os.remove(os.path.join(root, "gone.txt"))
+            os.makedirs(os.path.join(root, "new", "deeper"))
+            watcher._touched_directory(root) # As the backend would; compared when flushed
+            changes = watcher.flush()
+            self.assertEqual(sorted((kind, os.path.relpath(path, root)) for kind, path, entry in changes),
+                             [(ADDED, "new"), (MODIFIED, "keep.txt"), (REMOVED, "gone.txt")])
+
+            with open(os.path.join(root, "new", "deeper", "f.txt"), "w") as f:
+                f.write("x")
+            watcher._touched(os.path.join(root, "new", "deeper"), "f.txt")
+            self.assertEqual([(kind, entry['size']) for kind, path, entry in watcher.flush()], [(ADDED, 1)])
+            watcher.stop()
+
+
 class TestGUIIntegration(unittest.TestCase):
     """Integration tests for GUI components"""
     
@@ -0,0 +1,219 @@
+# Parallel Transfer Engine
+# Runs queued transfers over a pool of worker connections to the same site,
+# so many small files move concurrently instead of one round trip at a time.
+
+import queue
+import threading
+import time
+
+import ftp_client_core
+import rate_limiter
+from verification import VerificationPool
+
+DEFAULT_MAX_CONNECTIONS = 4
+PROGRESS_SAVE_INTERVAL = 2 # Seconds between saving a running job's byte count to the job store
+
+
+class TransferJob:
+    """A single file transfer in the engine's queue."""
+
+    def __init__(self, local_path, remote_path, direction='upload', tag=None, priority=None, rate_limit=None,
+                 store_id=None):
+        self.local_path = local_path
+        self.remote_path = remote_path
+        self.direction = direction # 'upload' or 'download'
+        self.tag = tag # Opaque caller data (e.g. the queue widget item)
+        self.priority = priority # rate_limiter priority class, None for the engine's
+        self.rate_limit = rate_limit # Bytes per second for this job alone, None for no limit of its own
+        self.store_id = store_id # Row of this job in the engine's JobStore, if it is kept there
+        self.status = 'pending' # 'pending', 'verifying', 'done', 'failed'
+        self.error = None
+
+    def __repr__(self):
+        return f"TransferJob({self.direction} {self.local_path!r} <-> {self.remote_path!r}, {self.status})"
+
+
+class TransferEngine:
+    """
+    Transfer engine with a pool of N worker connections per site.
+    Each worker gets its own connection (borrowed from a ConnectionPool when one is
+    given, otherwise opened via connect_server()) and pulls jobs from a shared queue
+    until it is empty.
+    With verify_integrity and parallel_verify, workers only hash files while moving them
+    and go straight on to the next job; a VerificationPool compares them with the server's
+    hashes meanwhile, and a job is reported finished once it has been verified. Its
+    connection is one of the max_connections, so one worker fewer runs; with a single
+    connection files are verified inline instead.
+    Every job draws its bandwidth from scheduler (the process-wide one by default): its own
+    rate_limit, the site's limit and the global limit, at the job's priority (or the engine's).
+    With a job_store.JobStore, jobs that have a store_id are marked running, done or failed
+    in it as they go, so an interrupted run can be picked up again.
+    """
+
+    def __init__(self, connect_kwargs, max_connections=DEFAULT_MAX_CONNECTIONS, verify_integrity=False,
+                 resume=False, journal=None, pool=None, parallel_verify=True, scheduler=None,
+                 priority=rate_limiter.PRIORITY_NORMAL, store=None):
+        self.connect_kwargs = dict(connect_kwargs) # Keyword arguments for ftp_client_core.connect_server
+        self.max_connections = max(1, int(max_connections or 1))
+        self.verify_integrity = verify_integrity
+        self.resume = resume # Continue partial files instead of re-sending them
+        self.journal = journal # Optional ftp_client_core.ResumeJournal shared by all workers
+        self.pool = pool # Optional ftp_client_core.ConnectionPool to reuse warm connections
+        self.parallel_verify = parallel_verify
+        self.scheduler = scheduler or rate_limiter.bandwidth_scheduler
+        self.priority = priority
+        self.store = store
+        self._verifier = None
+        self.jobs = []
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+
+    def add_job(self, job):
+        self.jobs.append(job)
+        self._queue.put(job)
+        return job
+
+    def add_jobs(self, jobs):
+        for job in jobs:
+            self.add_job(job)
+
+    def cancel(self):
+        """Stops workers after their current job. Jobs still queued stay 'pending'."""
+        self._cancelled.set()
+
+    def run(self, on_job_finished=None):
+        """
+        Runs all queued jobs and blocks until they are finished.
+        on_job_finished(job) is called from the worker threads after each job.
+        Returns the list of jobs.
+        """
+        self._cancelled.clear()
+        worker_count = self.max_connections
+        if self.verify_integrity and self.parallel_verify and self.max_connections > 1:
+            # Reserve a connection for it, so verifying overlaps the transfers instead of waiting on the site cap
+            worker_count -= 1
+            self._verifier = VerificationPool(self.connect_kwargs, pool=self.pool,
+                                              on_verified=lambda request: self._job_verified(request, on_job_finished))
+        worker_count = min(worker_count, max(1, self._queue.qsize()))
+        workers = []
+        for i in range(worker_count):
+            worker = threading.Thread(target=self._worker_loop, args=(on_job_finished,),
+                                      name=f"TransferWorker-{i + 1}", daemon=True)
+            workers.append(worker)
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if self._verifier:
+            self._verifier.close()
+            self._verifier = None
+
+        # If every worker failed to connect, whatever is left in the queue can't run
+        self._fail_remaining("No worker connection could be established.", on_job_finished)
+        return self.jobs
+
+    def _worker_loop(self, on_job_finished):
+        if self.pool:
+            client = self.pool.borrow(self.connect_kwargs)
+        else:
+            client = ftp_client_core.connect_server(**self.connect_kwargs)
+        if not client:
+            print(f"{threading.current_thread().name}: could not open a connection.")
+            return
+        healthy = True
+        try:
+            while not self._cancelled.is_set():
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._run_job(client, job)
+                if on_job_finished and job.status != 'verifying': # Verified jobs are reported by _job_verified
+                    on_job_finished(job)
+                if job.status == 'failed' and not isinstance(job.error, ftp_client_core.IntegrityCheckFailedError):
+                    # The failure may have left the connection broken, check before the next job
+                    healthy = ftp_client_core.is_connection_alive(client)
+                    if not healthy:
+                        break
+        finally:
+            if self.pool:
+                self.pool.give_back(client, discard=not healthy)
+            else:
+                ftp_client_core.disconnect_ftp(client)
+
+    def _run_job(self, client, job):
+        deferred = self._verifier is not None
+        throttle = self.scheduler.throttle(ftp_client_core.ConnectionPool.site_key(self.connect_kwargs),
+                                           job.rate_limit, priority=self.priority if job.priority is None else job.priority)
+        progress = self._progress_saver(job)
+        if progress:
+            self.store.mark_running(job.store_id)
+        try:
+            if job.direction == 'upload':
+                digest = ftp_client_core.upload_file(client, job.local_path, job.remote_path,
+                                                     verify_integrity=self.verify_integrity and not deferred,
+                                                     resume=self.resume, journal=self.journal, hash_inline=deferred,
+                                                     throttle=throttle, progress_callback=progress)
+            elif job.direction == 'download':
+                digest = ftp_client_core.download_file(client, job.remote_path, job.local_path,
+                                                       verify_integrity=self.verify_integrity and not deferred,
+                                                       resume=self.resume, journal=self.journal, hash_inline=deferred,
+                                                       throttle=throttle, progress_callback=progress)
+            else:
+                raise ValueError(f"Unknown transfer direction: {job.direction}")
+            job.status = 'done'
+        except Exception as e: # IntegrityCheckFailedError included, caller inspects job.error
+            job.status = 'failed'
+            job.error = e
+        if deferred and job.status == 'done':
+            job.status = 'verifying'
+            self._verifier.submit(job.local_path, job.remote_path, digest, tag=job)
+        else:
+            self._save_outcome(job)
+
+    def _progress_saver(self, job):
+        """
+        progress_callback for a stored job that saves its byte count every PROGRESS_SAVE_INTERVAL
+        seconds. The first report, the offset the transfer starts (or resumes) from, is saved at once.
+        """
+        if not self.store or job.store_id is None:
+            return None
+        last_saved = [None]
+        def save_progress(bytes_done, total_size):
+            now = time.monotonic()
+            if last_saved[0] is None or now - last_saved[0] >= PROGRESS_SAVE_INTERVAL:
+                last_saved[0] = now
+                self.store.update_progress(job.store_id, bytes_done, total_size)
+        return save_progress
+
+    def _save_outcome(self, job):
+        if not self.store or job.store_id is None:
+            return
+        if job.status == 'done':
+            self.store.mark_done(job.store_id)
+        elif job.status == 'failed':
+            self.store.mark_failed(job.store_id, job.error)
+
+    def _job_verified(self, request, on_job_finished):
+        job = request.tag
+        if request.status == 'failed' or isinstance(request.error, ConnectionError):
+            # An unverified file only counts as done when the server can't hash, not when it couldn't be asked
+            job.status = 'failed'
+            job.error = request.error
+        else: # 'unverified' counts as done, as with verify_integrity on a server that can't hash
+            job.status = 'done'
+        self._save_outcome(job)
+        if on_job_finished:
+            on_job_finished(job)
+
+    def _fail_remaining(self, reason, on_job_finished):
+        if self._cancelled.is_set():
+            return
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            job.status = 'failed'
+            job.error = ConnectionError(reason)
+            if on_job_finished:
+                on_job_finished(job)
@@ -0,0 +1,144 @@
+# Background Verification
+# Checks finished transfers against the server's hashes without holding up the transfer
+# connections: remote hashes are requested over a dedicated control connection, pipelined
+# in batches, and local files that weren't hashed during the transfer are hashed on a
+# thread pool (hashlib releases the GIL on large blocks, so the threads use every core).
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import ftp_client_core
+import hashing
+
+DEFAULT_HASH_WORKERS = min(8, os.cpu_count() or 2)
+
+
+class VerifyRequest:
+    """One local/remote file pair waiting to be compared."""
+
+    def __init__(self, local_path, remote_path, local_digest=None, tag=None):
+        self.local_path = local_path
+        self.remote_path = remote_path
+        self.local_digest = local_digest # (algorithm, hex digest) if hashed during the transfer
+        self.tag = tag # Opaque caller data (e.g. the TransferJob)
+        self.status = 'pending' # 'pending', 'passed', 'failed', 'unverified'
+        self.algorithm = None
+        self.error = None # With 'unverified', a ConnectionError if the server was never asked
+
+    def __repr__(self):
+        return f"VerifyRequest({self.local_path!r} <-> {self.remote_path!r}, {self.status})"
+
+
+class VerificationPool:
+    """
+    Verifies files submitted after their transfer finished, in the background.
+    One thread owns the verification connection (borrowed from pool when given, so it
+    counts towards the site's connection cap) and asks for the hashes of everything
+    queued since its last batch in one pipelined round. on_verified(request) is called
+    from the pool's threads once a request is settled.
+    """
+
+    def __init__(self, connect_kwargs, pool=None, hash_workers=DEFAULT_HASH_WORKERS, on_verified=None):
+        self.connect_kwargs = dict(connect_kwargs)
+        self.pool = pool
+        self.on_verified = on_verified
+        self.requests = []
+        self._queue = queue.Queue()
+        self._hash_pool = ThreadPoolExecutor(max_workers=max(1, hash_workers), thread_name_prefix="HashWorker")
+        self._thread = threading.Thread(target=self._remote_loop, name="VerifyConnection", daemon=True)
+        self._thread.start()
+
+    def submit(self, local_path, remote_path, local_digest=None, tag=None):
+        request = VerifyRequest(local_path, remote_path, local_digest, tag)
+        self.requests.append(request)
+        self._queue.put(request)
+        return request
+
+    def close(self):
+        """Waits for every submitted request to be settled and releases the connection. Returns the requests."""
+        self._queue.put(None)
+        self._thread.join()
+        self._hash_pool.shutdown(wait=True)
+        return self.requests
+
+    def _remote_loop(self):
+        client = None
+        done = False
+        try:
+            while not done:
+                request = self._queue.get()
+                if request is None:
+                    break
+                if client is None:
+                    client = self._connect() # Whatever is queued while connecting joins the first batch
+                batch = [request]
+                while len(batch) < ftp_client_core.PIPELINE_DEPTH:
+                    try:
+                        request = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if request is None:
+                        done = True
+                        break
+                    batch.append(request)
+                if not self._verify_batch(client, batch) and client:
+                    self._disconnect(client, discard=True) # Reconnect for the next batch
+                    client = None
+        finally:
+            if client:
+                self._disconnect(client)
+
+    def _connect(self):
+        if self.pool:
+            return self.pool.borrow(self.connect_kwargs)
+        return ftp_client_core.connect_server(**self.connect_kwargs)
+
+    def _disconnect(self, client, discard=False):
+        if self.pool:
+            self.pool.give_back(client, discard=discard)
+        else:
+            ftp_client_core.disconnect_ftp(client)
+
+    def _verify_batch(self, client, batch):
+        """Settles (or hands to the hash pool) every request in batch. Returns False if the connection broke."""
+        if not client:
+            for request in batch:
+                self._settle(request, 'unverified', ConnectionError("No verification connection could be established."))
+            return False
+        try:
+            remote_hashes = ftp_client_core.get_remote_hashes(client, [request.remote_path for request in batch])
+        except Exception as e: # Connection lost mid-batch; the files themselves may be fine
+            print(f"Verification: hash requests failed: {e}")
+            for request in batch:
+                self._settle(request, 'unverified', ConnectionError(f"Verification connection failed: {e}"))
+            return False
+        for request, (algorithm, remote_digest) in zip(batch, remote_hashes):
+            request.algorithm = algorithm
+            if not remote_digest:
+                print(f"Warning: Could not verify integrity for {request.remote_path}. Server offers no usable hash command.")
+                self._settle(request, 'unverified')
+            elif request.local_digest and request.local_digest[0] == algorithm:
+                self._compare(request, request.local_digest[1], remote_digest)
+            else:
+                self._hash_pool.submit(self._hash_and_compare, request, remote_digest)
+        return True
+
+    def _hash_and_compare(self, request, remote_digest):
+        self._compare(request, hashing.hash_local_file(request.local_path, request.algorithm), remote_digest)
+
+    def _compare(self, request, local_digest, remote_digest):
+        if local_digest == remote_digest:
+            print(f"Integrity check PASSED for {request.remote_path} ({request.algorithm}).")
+            self._settle(request, 'passed')
+        else:
+            self._settle(request, 'failed', ftp_client_core.IntegrityCheckFailedError(
+                f"Integrity check FAILED for {request.remote_path}. "
+                f"Local {request.algorithm}: {local_digest}, Remote {request.algorithm}: {remote_digest}"))
+
+    def _settle(self, request, status, error=None):
+        request.status = status
+        request.error = error
+        if self.on_verified:
+            self.on_verified(request)